@@ -10,27 +10,84 @@ Mappings:
     Solid, Twinkle, Swirl, Chase, Sparkle, Game, Spectrum (new multi-color wash)
     Spectrum scene: top-half pads set the primary hue, bottom-half pads set the secondary hue.
       Faders 5–8 tweak spread, brightness/value, saturation, and contrast for that wash.
+  Scene button 0x77: capture a stack-sampling profile of the render and input threads
+    (also on SIGUSR1); the button blinks while sampling, output goes to profiles/.
+  Track buttons (notes 0x64–0x66): more modes
+    Snow (accent flakes drift down), Embers (accent sparks rise), Blips (accent flashes)
+    Fader 5 sets how many particles spawn.
+  Track button 0x67: Palette (cosine palette wash); each pad column picks a preset
+    (pal1–pal7, blue), speed fader scrolls it.
+  Track button 0x68: Audio (needs --audio): frequency bands stacked up the tree from
+    base to accent, flashing on detected beats.
+  Track button 0x69: Video (needs --video): the clip projected onto the LEDs' positions.
+  Track button 0x6A: Fire (accent heat rising through neighbouring LEDs, base at the tips).
+  Track button 0x6B: Ripples (accent drops spreading over the tree as waves).
+    Both spread over the LEDs' physical neighbours (led_graph.py), not strip order;
+    fader 5 sets how often sparks/drops land.
   Faders 1–9 (CC 48–56):
     1 base/spectrum primary color, 2 accent/spectrum secondary, 3 brightness,
     4 speed, 5 twinkle density / spectrum spread, 6 chase length / spectrum value,
     7 sparkle chance / spectrum saturation, 8 swirl phase / spectrum contrast,
     9 master dimmer
+
+The looks live in effects.py, which is watched while running: save a change and it is
+swapped in between frames once every mode renders with it, without touching OPC, MIDI
+or the current settings. If it fails to load or render, the old version keeps running.
+
+The OPC send rate adapts between 10 and FPS depending on how fast the look is changing
+(Fadecandy interpolation keeps slow content smooth); --fixed-fps sends at FPS always.
+
+Run with --audio song.wav, --audio - (s16le mono PCM on stdin) or --audio capture[:device]
+to feed the audio mode; analysis cost and audio-to-light latency are printed every 10 s.
+Run with --preview 8080 to watch the output live in a browser at http://<host>:8080/
+(estimated supply current and frame rate at /metrics.json).
+Run with --remote pi:7891 to render here and send timestamped frames to remote.py on the Pi.
+With several trees, run one controller with --sync-master and the rest with --sync-follow:
+followers take the master's look and effect clock so every tree shows the same phase.
+All control input runs on one asyncio loop (input_hub.py), so other controllers can drive
+the same faders and pads alongside the APC: --midi NAME for another MIDI controller,
+--osc [:9000] for OSC from phones/tablets (/tree/brightness 0.8, /tree/mode 3, /tree/cc/51 0.5)
+and --control-socket PATH for the same commands as text lines ("speed 0.3").
 """
 
+import argparse
+import asyncio
 import math
 import random
+import signal
 import threading
 import time
 
-import mido
+import numpy as np
 from mido import Message
 
+import audio
+import checkpoint
+import effect_compiler
+import frame_cache
+import geometry
+import hot_reload
+import input_hub
+import led_graph
 import opc
+import palettes
+import particles
+import preview
+import profiler
+import rate_control
+import remote
+import sync
+import topology
+import twinkle
+import video
 
 PORT_IN = "APC MINI"
 PORT_OUT = "APC MINI"
+# Fader names (CC 48..56) for OSC /tree/<name> and the control socket.
+FADER_NAMES = ("base", "accent", "brightness", "speed", "density", "length", "sparkle", "phase", "master")
 OPC_ADDRESS = "treeled.local:7890"
-LED_COUNT = 512
+TOPOLOGY = topology.load()  # strips/controllers/channels from topology.json
+LED_COUNT = TOPOLOGY.led_count
 FPS = 50
 
 # Simple palette; adjust to taste
@@ -57,6 +114,10 @@ LED_COLOR_TABLE = [
     3,    # white (#FFFFFF)
 ]
 
+# Spare scene button that triggers a profile capture.
+PROFILE_NOTE = 0x77
+PROFILE_SECONDS = 5.0
+
 # MIDI channel for pad LED feedback: 6 == solid at 100% brightness per protocol table.
 LED_FEEDBACK_CHANNEL = 6
 
@@ -67,10 +128,20 @@ MODE_CHASE = 3
 MODE_SPARKLE = 4
 MODE_GAME = 5
 MODE_SPECTRUM = 6
-NUM_MODES = MODE_SPECTRUM + 1
+MODE_SNOW = 7
+MODE_EMBERS = 8
+MODE_BLIPS = 9
+MODE_PALETTE = 10
+MODE_AUDIO = 11
+MODE_VIDEO = 12
+MODE_FIRE = 13
+MODE_RIPPLES = 14
+NUM_MODES = MODE_RIPPLES + 1
+
+SCENE_MODES = MODE_SPECTRUM + 1  # modes 0..6 live on scene buttons 0x70.., the rest on track buttons 0x64..
 
 STATE = {
-    "mode": MODE_SOLID,   # 0 solid, 1 twinkle, 2 swirl, 3 chase, 4 sparkle, 5 game, 6 spectrum
+    "mode": MODE_SOLID,   # 0 solid, 1 twinkle, 2 swirl, 3 chase, 4 sparkle, 5 game, 6 spectrum, 7 snow, 8 embers, 9 blips, 10 palette, 11 audio, 12 video, 13 fire, 14 ripples
     "base_color": 1,
     "accent_color": 2,
     "brightness": 1.0,
@@ -87,10 +158,34 @@ STATE = {
     "spectrum_contrast": 0.8,
     "spectrum_primary_note": 0,     # top half grid controls primary hue
     "spectrum_secondary_note": 40,  # bottom half grid controls secondary hue
+    "palette": "pal6",    # name from palettes.PRESETS
 }
 
 OPC_CLIENT = opc.Client(OPC_ADDRESS)
-TWINKLE_CACHE = {"next_refresh": 0.0, "frame": [(0, 0, 0)] * LED_COUNT}
+MIDI_OUT = {"port": None}  # current APC output port, None while reconnecting
+STATE_FILE = "treeled_state.json"
+CHECKPOINT = None  # checkpoint.Checkpointer, set up in main()
+PREVIEW = None  # preview.PreviewServer when --preview is given
+REMOTE = None  # remote.RemoteSender when --remote is given; frames go to the Pi relay instead of OPC
+SYNC = None  # sync.SyncMaster / SyncFollower with --sync-master / --sync-follow
+RATE = rate_control.RateController(max_fps=FPS)  # None with --fixed-fps
+FRAME_CACHE = frame_cache.FrameCache(TOPOLOGY)  # encoded frames for the static/periodic looks
+WAKE = threading.Event()  # set on control input so the next frame goes out immediately
+PROFILER = profiler.SamplingProfiler("profiles")
+TWINKLE = twinkle.TwinkleField(LED_COUNT, envelope=twinkle.smooth_envelope, peak_range=(0.3, 1.0))
+SPARKLE = twinkle.TwinkleField(LED_COUNT, envelope=twinkle.flash_envelope, peak_range=(0.8, 1.0))
+LED_XYZ = geometry.load_xyz(n=LED_COUNT)
+SNOW = particles.ParticleSystem(256, dims=3)
+EMBERS = particles.ParticleSystem(256, dims=3)
+BLIPS = particles.ParticleSystem(LED_COUNT, dims=1)
+LED_GRAPH = led_graph.load(LED_XYZ, TOPOLOGY.strips)  # cached in led_graph.npz
+FIRE = led_graph.FireField(LED_GRAPH)
+RIPPLES = led_graph.WaveField(LED_GRAPH)
+LED_INDEX = np.arange(LED_COUNT)
+# Audio mode: band per LED by height, bass at the bottom.
+LED_BAND = np.minimum(audio.NUM_BANDS - 1, (LED_XYZ[:, 2] * audio.NUM_BANDS).astype(int))
+AUDIO = {"analyzer": None, "flash": 0.0, "last_t": 0.0, "next_report": 0.0}
+VIDEO = None  # video.VideoPlayer when --video is given
 GAME_LEVELS = [
     {"size": 4, "speed": 2.0},
     {"size": 3, "speed": 2.5},
@@ -109,136 +204,183 @@ GAME_FLASH_TIMER = 0.0
 LAST_DT = 0.02
 
 
-def clamp01(x):
-    return max(0.0, min(1.0, x))
-
-
-def lerp(a, b, t):
-    return a + (b - a) * t
-
-
-def hsv_to_rgb(h, s, v):
-    h = h % 1.0
-    s = clamp01(s)
-    v = clamp01(v)
-    i = int(h * 6)
-    f = h * 6 - i
-    p = v * (1 - s)
-    q = v * (1 - f * s)
-    t = v * (1 - (1 - f) * s)
-    i = i % 6
-    if i == 0:
-        r, g, b = v, t, p
-    elif i == 1:
-        r, g, b = q, v, p
-    elif i == 2:
-        r, g, b = p, v, t
-    elif i == 3:
-        r, g, b = p, q, v
-    elif i == 4:
-        r, g, b = t, p, v
-    else:
-        r, g, b = v, p, q
-    return (int(r * 255), int(g * 255), int(b * 255))
-
-
-def mix(color, factor, brightness):
-    return tuple(int(channel * factor * brightness) for channel in color)
-
-
-def apply_animation(t):
-    global TWINKLE_CACHE, GAME_FLASH_TIMER
-    n = LED_COUNT
-    base = PALETTE[STATE["base_color"]]
-    accent = PALETTE[STATE["accent_color"]]
-    brightness = STATE["brightness"]
-    speed = max(0.05, STATE["speed"]) * 1.0
-    buf = []
-
-    if STATE["mode"] == MODE_SOLID:  # solid
-        buf = [mix(base, 1.0, brightness)] * n
-    elif STATE["mode"] == MODE_TWINKLE:  # twinkle (slower refresh)
-        if t >= TWINKLE_CACHE["next_refresh"]:
-            period = 0.1 + 0.5 * (1 - STATE["speed"])  # slower when speed fader is down
-            TWINKLE_CACHE["next_refresh"] = t + period
-            new_frame = []
-            for _ in range(n):
-                if random.random() > STATE["twinkle_density"]:
-                    new_frame.append(mix(base, 0.4, brightness))
-                else:
-                    new_frame.append(mix(accent, random.random(), brightness))
-            TWINKLE_CACHE["frame"] = new_frame
-        buf = TWINKLE_CACHE["frame"]
-    elif STATE["mode"] == MODE_SWIRL:  # swirl (sin wave) with base as background
-        phase = t * speed + STATE["swirl_phase"]
-        for i in range(n):
-            v = (math.sin((i / n) * math.tau + phase) + 1) / 2
-            accent_mix = 0.2 + 0.8 * v
-            # Blend base as a floor, accent rides on top.
-            base_component = mix(base, 0.2, brightness)
-            accent_component = mix(accent, accent_mix, brightness)
-            buf.append(tuple(min(255, b + a) for b, a in zip(base_component, accent_component)))
-    elif STATE["mode"] == MODE_CHASE:  # chase
-        phase = int((t * speed * n)) % n
-        length = max(1, int(STATE["chase_length"] * n))
-        for i in range(n):
-            dist = (i - phase) % n
-            falloff = max(0, 1 - dist / length)
-            buf.append(mix(accent, falloff, brightness))
-    elif STATE["mode"] == MODE_SPARKLE:  # sparkle on base
-        buf = [mix(base, 0.3, brightness)] * n
-        for i in range(n):
-            if random.random() < STATE["sparkle_chance"]:
-                buf[i] = mix(accent, 1.0, brightness)
-    elif STATE["mode"] == MODE_SPECTRUM:  # multi-color wash between two user hues
-        spread = max(0.05, STATE["spectrum_spread"])
-        contrast = clamp01(STATE["spectrum_contrast"])
-        sat = clamp01(STATE["spectrum_saturation"])
-        val = clamp01(STATE["spectrum_value"])
-        scroll = (t * (0.5 + STATE["speed"] * 2.5)) / spread
-        for i in range(n):
-            pos = (i / n) + scroll
-            wave = (math.sin(pos * math.tau) + 1) / 2
-            blended = lerp(0.5, wave, contrast)  # pull extremes down when contrast < 1
-            hue = lerp(STATE["spectrum_primary_hue"], STATE["spectrum_secondary_hue"], blended) % 1.0
-            rgb = hsv_to_rgb(hue, sat, val)
-            buf.append(mix(rgb, 1.0, brightness))
-    elif STATE["mode"] == MODE_GAME:
-        # Base glow with accent pulse; flash boost when the player hits the square.
-        flash_boost = 1.0 + 0.8 * max(0.0, GAME_FLASH_TIMER)
-        phase = t * (1.0 + GAME_STATE["level"] * 0.5)
-        for i in range(n):
-            v = (math.sin((i / n) * math.tau + phase) + 1) / 2
-            accent_mix = 0.2 + 0.6 * v
-            base_component = mix(base, 0.2, brightness)
-            accent_component = mix(accent, accent_mix * flash_boost, brightness)
-            buf.append(tuple(min(255, b + a) for b, a in zip(base_component, accent_component)))
-    return buf
+def effect_context(brightness=None):
+    """Everything the effects module needs for one frame, including state that outlives a reload.
+
+    brightness overrides STATE["brightness"], e.g. with the quantized value a cache key holds.
+    """
+    return {
+        "n": LED_COUNT,
+        "index": LED_INDEX,
+        "xyz": LED_XYZ,
+        "base": PALETTE[STATE["base_color"]],
+        "accent": PALETTE[STATE["accent_color"]],
+        "brightness": STATE["brightness"] if brightness is None else brightness,
+        "speed": max(0.05, STATE["speed"]) * 1.0,
+        "twinkle": TWINKLE,
+        "sparkle": SPARKLE,
+        "snow": SNOW,
+        "embers": EMBERS,
+        "blips": BLIPS,
+        "fire": FIRE,
+        "ripples": RIPPLES,
+        "flash_timer": GAME_FLASH_TIMER,
+        "game_level": GAME_STATE["level"],
+        "audio": render_audio,
+        "video": VIDEO,
+    }
+
+
+def apply_animation(t, brightness=None):
+    return EFFECTS.module.MODES[STATE["mode"]](t, STATE, effect_context(brightness))
+
+
+def check_effects(module):
+    """Render every mode once with a new effects module, on throwaway state, before it goes live."""
+    if len(module.MODES) != NUM_MODES:
+        raise ValueError(f"effects has {len(module.MODES)} modes, expected {NUM_MODES}")
+    ctx = dict(effect_context(),
+               twinkle=twinkle.TwinkleField(LED_COUNT, envelope=twinkle.smooth_envelope),
+               sparkle=twinkle.TwinkleField(LED_COUNT, envelope=twinkle.flash_envelope),
+               snow=particles.ParticleSystem(256, dims=3),
+               embers=particles.ParticleSystem(256, dims=3),
+               blips=particles.ParticleSystem(LED_COUNT, dims=1),
+               fire=led_graph.FireField(LED_GRAPH),
+               ripples=led_graph.WaveField(LED_GRAPH),
+               audio=lambda t, base, accent: np.zeros((LED_COUNT, 3)),
+               video=None)
+    state = dict(STATE)
+    for mode, render in enumerate(module.MODES):
+        state["mode"] = mode
+        for t in (1.0, 1.1):
+            frame = np.asarray(render(t, state, ctx), dtype=float)
+            if frame.shape != (LED_COUNT, 3) or not np.all(np.isfinite(frame)):
+                raise ValueError(f"{render.__name__} rendered a {frame.shape} frame with bad values")
+
+
+EFFECTS = hot_reload.HotModule("effects", check=check_effects)  # watched once main() starts it
+
+
+def look_key(t):
+    """FRAME_CACHE key for looks fully determined by a few settings (and a phase), else None."""
+    brightness = frame_cache.quantize(STATE["brightness"])
+    if STATE["mode"] == MODE_SOLID:
+        return (MODE_SOLID, STATE["base_color"], brightness)
+    if STATE["mode"] == MODE_PALETTE:
+        pal = palettes.PRESETS[STATE["palette"]]
+        return (MODE_PALETTE, STATE["palette"], brightness, EFFECTS.module.palette_step(t, pal, STATE["speed"]))
+    return None
+
+
+def render_audio(t, base, accent):
+    analyzer = AUDIO["analyzer"]
+    if analyzer is None:
+        return np.outer(np.ones(LED_COUNT), base) * 0.1
+    features = analyzer.analyze()
+    dt = max(0.0, t - AUDIO["last_t"])
+    AUDIO["last_t"] = t
+    AUDIO["flash"] = 1.0 if features["onset"] else max(0.0, AUDIO["flash"] - dt * 4.0)
+    level = features["bands"][LED_BAND]
+    frame = np.outer(1.0 - level, base) * 0.2 + np.outer(level, accent)
+    frame += AUDIO["flash"] * 0.5 * np.asarray(accent, dtype=float)
+    return frame
+
+
+def audio_frame_sent(now):
+    analyzer = AUDIO["analyzer"]
+    if analyzer is None or STATE["mode"] != MODE_AUDIO:
+        return
+    analyzer.frame_sent()
+    if now >= AUDIO["next_report"]:
+        AUDIO["next_report"] = now + 10.0
+        print(analyzer.report())
 
 
 def send_to_tree(pixels):
-    # Reorder RGB -> GRB for LED strip wiring.
-    pixels = [(g, r, b) for (r, g, b) in pixels]
-    if len(pixels) < LED_COUNT:
-        pixels = pixels + [(0, 0, 0)] * (LED_COUNT - len(pixels))
-    elif len(pixels) > LED_COUNT:
-        pixels = pixels[:LED_COUNT]
-    return OPC_CLIENT.put_pixels(pixels)
+    # Topology.encode pads or truncates to led_count; colour order and strip remapping are
+    # compiled into its output maps.
+    tap = PREVIEW.tap if PREVIEW else None
+    if REMOTE is not None:
+        parts = TOPOLOGY.encode(pixels)
+        if tap:
+            for channel, data in parts:
+                tap(channel, data)
+        return REMOTE.send_frame(parts)
+    return TOPOLOGY.put_pixels(OPC_CLIENT, pixels, tap=tap)
+
+
+def render_and_send(t):
+    """Render the frame for time t and send it, from FRAME_CACHE when the look allows."""
+    key = look_key(t)
+    if key is None:
+        frame = apply_animation(t)
+        send_to_tree(frame)
+        return frame
+    tap = PREVIEW.tap if PREVIEW else None
+    # Render from the brightness the key holds, so a key always means the same frame.
+    brightness = frame_cache.snap(STATE["brightness"])
+    if REMOTE is not None:
+        entry = FRAME_CACHE.get(key, lambda: apply_animation(t, brightness))
+        if tap:
+            for channel, data in entry.parts:
+                tap(channel, data)
+        REMOTE.send_frame(entry.parts)
+    else:
+        entry = FRAME_CACHE.put_pixels(OPC_CLIENT, key, lambda: apply_animation(t, brightness), tap=tap)
+    return entry.frame
+
+
+def output_metrics():
+    return {
+        "fps": RATE.fps if RATE is not None else FPS,
+        "changed_leds": RATE.changed if RATE is not None else None,
+        "power": TOPOLOGY.power.metrics() if TOPOLOGY.power is not None else None,
+    }
 
 
-def runner(stop_event, outport):
+def effect_time(now, t0):
+    # Followers render at the master's effect time once they've heard from it.
+    if SYNC is not None:
+        t = SYNC.clock(now)
+        if t is not None:
+            return t
+    return now - t0
+
+
+def runner(stop_event):
+    # Ticks at FPS for the game and pad feedback; frames go out at the (possibly lower)
+    # adaptive send rate, or at once after control input.
     global LAST_DT
+    PROFILER.watch_current("render")
+    if RATE is not None and REMOTE is None:
+        # Let the Fadecandy smooth between our (possibly sparse) frames.
+        OPC_CLIENT.set_interpolation(True)
     t0 = time.time()
     last = t0
+    next_send = t0
+    woken = False
     while not stop_event.is_set():
         now = time.time()
         dt = now - last
         LAST_DT = dt
         last = now
-        update_game(outport, dt)
-        frame = apply_animation(now - t0)
-        send_to_tree(frame)
-        time.sleep(max(0.0, (1.0 / FPS) - (time.time() - now)))
+        try:
+            update_game(MIDI_OUT["port"], dt)
+        except Exception as exc:
+            # Pad feedback can fail mid-reconnect; keep the lights going regardless.
+            print(f"Pad update failed: {exc}")
+        if woken or now >= next_send:
+            if EFFECTS.swap():
+                FRAME_CACHE.clear()  # those frames came from the old effects
+                effect_compiler.clear_cache()  # and these vectorized its functions
+            frame = render_and_send(effect_time(now, t0))
+            audio_frame_sent(time.time())
+            fps = FPS
+            if RATE is not None and STATE["mode"] != MODE_AUDIO:
+                fps = RATE.update(frame, time.time() - now, now)
+            next_send = now + 1.0 / fps
+        woken = WAKE.wait(max(0.0, min(next_send, now + 1.0 / FPS) - time.time()))
+        WAKE.clear()
 
 
 def set_pad_led(outport, note, color_idx, channel=LED_FEEDBACK_CHANNEL):
@@ -251,11 +393,24 @@ def set_single_led(outport, note, on=True, blink=False):
     outport.send(Message("note_on", channel=0, note=note, velocity=velocity))
 
 
+def mode_note(mode):
+    # Scene launch buttons first, then the track buttons along the bottom.
+    if mode < SCENE_MODES:
+        return 0x70 + mode
+    return 0x64 + mode - SCENE_MODES
+
+
+def note_mode(note):
+    if 0x70 <= note < 0x70 + SCENE_MODES:
+        return note - 0x70
+    if 0x64 <= note < 0x64 + NUM_MODES - SCENE_MODES:
+        return note - 0x64 + SCENE_MODES
+    return None
+
+
 def light_mode_buttons(outport):
-    base_note = 0x70  # Scene launch buttons
     for i in range(NUM_MODES):
-        note = base_note + i
-        set_single_led(outport, note, on=(i == STATE["mode"]), blink=False)
+        set_single_led(outport, mode_note(i), on=(i == STATE["mode"]), blink=False)
 
 
 def draw_palette_grid(outport):
@@ -302,7 +457,7 @@ def draw_spectrum_grid(outport):
         within_band = row % 4
         sat = 0.55 + 0.45 * (1 - within_band / 3)
         val = 0.65 + 0.35 * (1 - within_band / 3)
-        rgb = hsv_to_rgb(hue, sat, val)
+        rgb = EFFECTS.module.hsv_to_rgb(hue, sat, val)
         velocity = apc_color_index_from_rgb(rgb)
         # Highlight the last picked pad for each hue band by boosting velocity.
         if note in (STATE["spectrum_primary_note"], STATE["spectrum_secondary_note"]):
@@ -310,11 +465,24 @@ def draw_spectrum_grid(outport):
         set_pad_led(outport, note, velocity)
 
 
+def draw_palette_preset_grid(outport):
+    # One column per preset, its colours sampled down the rows.
+    for col, name in enumerate(palettes.PRESET_NAMES[:8]):
+        pal = palettes.PRESETS[name]
+        for row in range(8):
+            velocity = apc_color_index_from_rgb(pal.lookup(row / 8))
+            if name == STATE["palette"] and row == 0:
+                velocity = min(127, velocity + 8)
+            set_pad_led(outport, row * 8 + col, velocity)
+
+
 def refresh_grid(outport):
     if STATE["mode"] == MODE_GAME:
         draw_game_grid(outport)
     elif STATE["mode"] == MODE_SPECTRUM:
         draw_spectrum_grid(outport)
+    elif STATE["mode"] == MODE_PALETTE:
+        draw_palette_preset_grid(outport)
     else:
         draw_palette_grid(outport)
 
@@ -376,12 +544,18 @@ def handle_note(msg, outport):
             else:
                 STATE["spectrum_secondary_hue"] = hue
                 STATE["spectrum_secondary_note"] = note
+        elif STATE["mode"] == MODE_PALETTE and 0 <= note <= 63:
+            col = note % 8
+            if col < len(palettes.PRESET_NAMES):
+                STATE["palette"] = palettes.PRESET_NAMES[col]
         elif 0 <= note <= 7:
             STATE["base_color"] = note
         elif 8 <= note <= 15:
             STATE["accent_color"] = note - 8
-        elif 0x70 <= note <= 0x76:
-            STATE["mode"] = min(MODE_SPECTRUM, note - 0x70)
+        elif note == PROFILE_NOTE:
+            PROFILER.trigger(PROFILE_SECONDS)
+        elif note_mode(note) is not None:
+            STATE["mode"] = note_mode(note)
             print(f"Mode changed to {STATE['mode']} via note {note}")
             if STATE["mode"] == MODE_GAME:
                 reset_game()
@@ -391,11 +565,91 @@ def handle_note(msg, outport):
     return False
 
 
-def find_port(substring, ports):
-    for name in ports:
-        if substring.lower() in name.lower():
-            return name
-    raise RuntimeError(f'Port containing "{substring}" not found. Available: {ports}')
+def handle_message(msg, outport):
+    """Dispatch one incoming APC message; returns True if it changed the look."""
+    changed = False
+    if msg.type == "control_change":
+        changed = handle_cc(msg)
+    elif msg.type in ("note_on", "note_off"):
+        changed = handle_note(msg, outport)
+    if changed:
+        if CHECKPOINT is not None:
+            CHECKPOINT.mark_dirty()
+        if isinstance(SYNC, sync.SyncMaster):
+            SYNC.notify()
+        WAKE.set()
+    return changed
+
+
+def snapshot_state():
+    return {"state": dict(STATE), "game_state": {k: v for k, v in GAME_STATE.items()}}
+
+
+def restore_state(saved):
+    if not saved:
+        return
+    merge_state(saved)
+    print(f"Resumed state from {STATE_FILE} (mode {STATE['mode']})")
+
+
+def merge_state(saved):
+    # Only take keys we still know about, so an old file (or another node) can't add junk or break a mode.
+    for key, value in saved.get("state", {}).items():
+        if key in STATE and type(value) is type(STATE[key]):
+            STATE[key] = value
+    for key, value in saved.get("game_state", {}).items():
+        if key in GAME_STATE and type(value) is type(GAME_STATE[key]):
+            GAME_STATE[key] = value
+    if not 0 <= STATE["mode"] < NUM_MODES:
+        STATE["mode"] = MODE_SOLID
+    if STATE["palette"] not in palettes.PRESETS:
+        STATE["palette"] = "pal6"
+    STATE["base_color"] %= len(PALETTE)
+    STATE["accent_color"] %= len(PALETTE)
+    GAME_STATE["level"] = min(max(0, GAME_STATE["level"]), len(GAME_LEVELS) - 1)
+
+
+def apply_synced_state(saved):
+    if saved:
+        merge_state(saved)
+        WAKE.set()
+
+
+def handle_input(msg, source):
+    """InputHub callback: every controller drives the same faders/pads; feedback goes to the APC."""
+    handle_message(msg, MIDI_OUT["port"] or input_hub.NullPort())
+
+
+def control_names():
+    """Named commands for OSC (/tree/<name>) and the control socket, on top of cc/note."""
+    names = {name: ("cc", cc) for cc, name in enumerate(FADER_NAMES, start=48)}
+    # These take indices (mode 3, base_color 5), not 0..1 fader values.
+    index = input_hub.parse_index
+    names["mode"] = lambda value: Message(
+        "note_on", note=mode_note(index(value, "mode") % NUM_MODES), velocity=127)
+    names["base_color"] = lambda value: Message(
+        "note_on", note=index(value, "base_color") % len(PALETTE), velocity=127)
+    names["accent_color"] = lambda value: Message(
+        "note_on", note=8 + index(value, "accent_color") % len(PALETTE), velocity=127)
+    return names
+
+
+def apc_connected(outp):
+    PROFILER.on_start = lambda: set_single_led(outp, PROFILE_NOTE, blink=True)
+    PROFILER.on_done = lambda path: set_single_led(outp, PROFILE_NOTE, on=False)
+    light_mode_buttons(outp)
+    refresh_grid(outp)
+    MIDI_OUT["port"] = outp
+
+
+def apc_disconnected(outp):
+    # Also runs on exit, so leave the pads dark; harmless if the APC was unplugged.
+    MIDI_OUT["port"] = None
+    PROFILER.on_start = PROFILER.on_done = None  # the port is about to be closed
+    for note in range(0, 64):
+        set_pad_led(outp, note, 0)
+    for note in list(range(0x64, 0x6C)) + list(range(0x70, 0x78)):
+        set_single_led(outp, note, on=False)
 
 
 def reset_game():
@@ -420,7 +674,8 @@ def update_game(outport, dt):
         return
     if not GAME_STATE["active"]:
         reset_game()
-        refresh_grid(outport)
+        if outport is not None:
+            refresh_grid(outport)
         return
 
     cfg = GAME_LEVELS[GAME_STATE["level"]]
@@ -447,7 +702,8 @@ def update_game(outport, dt):
 
     GAME_STATE["pos"] = [px, py]
     GAME_STATE["vel"] = [vx, vy]
-    refresh_grid(outport)
+    if outport is not None:
+        refresh_grid(outport)
 
     GAME_FLASH_TIMER = max(0.0, GAME_FLASH_TIMER - dt)
 
@@ -472,48 +728,91 @@ def handle_game_hit(outport):
 
 
 def main():
-    random.seed()
-    print(f"Sending OPC to {OPC_ADDRESS} for {LED_COUNT} LEDs")
+    global PROFILE_SECONDS, STATE_FILE, CHECKPOINT, PREVIEW, REMOTE, RATE, SYNC, VIDEO
+    parser = argparse.ArgumentParser(description="Drive the LED tree from an APC Mini Mk2")
+    parser.add_argument("--audio", help='audio source for audio mode: file.wav, "-" for stdin PCM, or capture[:device]')
+    parser.add_argument("--video", help="video file for video mode (needs OpenCV)")
+    parser.add_argument("--video-view", choices=video.VIEWS, default="front",
+                        help="how LED positions are projected onto the video frame")
+    parser.add_argument("--profile-seconds", type=float, default=PROFILE_SECONDS,
+                        help="how long a SIGUSR1 / button 0x77 profile capture samples for")
+    parser.add_argument("--profile-format", choices=profiler.FORMATS, default="collapsed")
+    parser.add_argument("--state-file", default=STATE_FILE,
+                        help="where controller state is checkpointed and resumed from")
+    parser.add_argument("--preview", type=int, metavar="PORT", help="serve a live browser preview on this port")
+    parser.add_argument("--remote", metavar="HOST:PORT", help="send frames to a remote.py relay instead of OPC")
+    parser.add_argument("--fixed-fps", action="store_true", help=f"always send at {FPS} fps")
+    parser.add_argument("--midi", action="append", default=[], metavar="NAME",
+                        help="another MIDI controller (port name substring) sending the APC's CCs/notes")
+    parser.add_argument("--osc", nargs="?", const=f":{input_hub.DEFAULT_OSC_PORT}", metavar="[HOST]:PORT",
+                        help="accept OSC control (/tree/cc/48 0.5, /tree/brightness 0.8, /tree/mode 3, ...)")
+    parser.add_argument("--control-socket", metavar="PATH",
+                        help='accept text commands ("brightness 0.8", "mode 3", "cc 51 64") on a Unix socket')
+    sync_group = parser.add_mutually_exclusive_group()
+    sync_group.add_argument("--sync-master", nargs="?", const=f"<broadcast>:{sync.DEFAULT_PORT}", metavar="HOST:PORT",
+                            help="broadcast the effect clock and look to --sync-follow nodes")
+    sync_group.add_argument("--sync-follow", nargs="?", const=f":{sync.DEFAULT_PORT}", metavar=":PORT",
+                            help="render at a --sync-master node's clock and look")
+    args = parser.parse_args()
 
-    while True:
-        try:
-            in_name = find_port(PORT_IN, mido.get_input_names())
-            out_name = find_port(PORT_OUT, mido.get_output_names())
-            print(f"Using MIDI ports: {in_name} / {out_name}")
-
-            stop_event = threading.Event()
-            runner_thread = None
-
-            with mido.open_input(in_name) as inp, mido.open_output(out_name) as outp:
-                light_mode_buttons(outp)
-                refresh_grid(outp)
-                runner_thread = threading.Thread(target=runner, args=(stop_event, outp), daemon=True)
-                runner_thread.start()
-                try:
-                    for msg in inp:
-                        if msg.type == "control_change":
-                            handle_cc(msg)
-                        elif msg.type in ("note_on", "note_off"):
-                            handle_note(msg, outp)
-                except KeyboardInterrupt:
-                    raise
-                finally:
-                    stop_event.set()
-                    if runner_thread:
-                        runner_thread.join()
-                    send_to_tree([(0, 0, 0)] * LED_COUNT)
-                    for note in range(0, 64):
-                        set_pad_led(outp, note, 0)
-                    for note in range(0x70, 0x78):
-                        set_single_led(outp, note, on=False)
-
-        except KeyboardInterrupt:
-            print("Exiting on user request.")
-            break
-        except Exception as exc:
-            # Catch ALSA/port errors, log, and retry.
-            print(f"MIDI error: {exc}. Retrying in 2s...")
-            time.sleep(2)
+    random.seed()
+    if args.fixed_fps:
+        RATE = None
+    if args.remote:
+        REMOTE = remote.RemoteSender(args.remote)
+        print(f"Sending timestamped frames to relay at {args.remote} for {LED_COUNT} LEDs")
+    else:
+        print(f"Sending OPC to {OPC_ADDRESS} for {LED_COUNT} LEDs")
+    if args.audio:
+        source = audio.open_source(args.audio).start()
+        AUDIO["analyzer"] = audio.Analyzer(source.ring)
+        print(f"Audio mode listening to {args.audio}")
+    if args.video:
+        VIDEO = video.VideoPlayer(args.video, LED_XYZ, view=args.video_view).start()
+        print(f"Video mode playing {args.video} ({VIDEO.fps:g} fps)")
+
+    if args.preview:
+        PREVIEW = preview.PreviewServer(args.preview, TOPOLOGY, LED_XYZ, metrics=output_metrics).start()
+
+    PROFILE_SECONDS = args.profile_seconds
+    STATE_FILE = args.state_file
+    PROFILER.fmt = args.profile_format
+    PROFILER.watch_current("input")
+    signal.signal(signal.SIGUSR1, lambda signum, frame: PROFILER.trigger(PROFILE_SECONDS))
+
+    # Resume the last look and get frames flowing before touching MIDI at all.
+    restore_state(checkpoint.load(STATE_FILE))
+    CHECKPOINT = checkpoint.Checkpointer(STATE_FILE, snapshot_state).start()
+    EFFECTS.start()
+    if args.sync_master:
+        SYNC = sync.SyncMaster(args.sync_master, snapshot_state).start()
+    elif args.sync_follow:
+        SYNC = sync.SyncFollower(args.sync_follow, apply_synced_state).start()
+    stop_event = threading.Event()
+    runner_thread = threading.Thread(target=runner, args=(stop_event,), daemon=True)
+    runner_thread.start()
+
+    hub = input_hub.InputHub(handle_input, names=control_names())
+    hub.add_midi(PORT_IN, out_port=PORT_OUT, on_connect=apc_connected, on_disconnect=apc_disconnected)
+    for name in args.midi:
+        hub.add_midi(name)
+    if args.osc:
+        hub.add_osc(args.osc)
+    if args.control_socket:
+        hub.add_socket(args.control_socket)
+    try:
+        asyncio.run(hub.run())
+    except KeyboardInterrupt:
+        print("Exiting on user request.")
+    finally:
+        stop_event.set()
+        runner_thread.join()
+        CHECKPOINT.flush()
+        print(hub.report())
+        print(FRAME_CACHE.report())
+        if TOPOLOGY.power is not None:
+            print(TOPOLOGY.power.report())
+        send_to_tree([(0, 0, 0)] * LED_COUNT)
 
 
 if __name__ == "__main__":
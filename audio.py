@@ -0,0 +1,273 @@
+"""
+Streaming audio analysis for audio-reactive effects.
+
+A source thread pushes mono float samples into a RingBuffer as they arrive
+(a WAV file played back at real-time pace, raw PCM on stdin, or a capture
+device via the optional sounddevice package). Once per render tick the
+Analyzer takes the newest window, runs one Hann-windowed rfft, sums it into
+log-spaced bands and does spectral-flux onset detection. Nothing blocks the
+render loop; it always sees the latest audio.
+
+    source = audio.open_source("song.wav")     # or "-" / "capture" / "capture:2"
+    analyzer = audio.Analyzer(source.ring)
+    source.start()
+    ...
+    features = analyzer.analyze()               # per tick
+    ...render and send...
+    analyzer.frame_sent()                       # records audio-to-light latency
+
+Spec strings: "file.wav", "-" (s16le mono PCM on stdin at 44100 Hz, or
+"-:<rate>"), "capture" / "capture:<device>".
+"""
+
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+try:
+    import sounddevice
+except ImportError:  # only needed for live capture
+    sounddevice = None
+
+SAMPLE_RATE = 44100
+BLOCK = 512          # samples per source chunk (~11.6 ms at 44.1 kHz)
+WINDOW = 1024        # FFT window (~23 ms at 44.1 kHz)
+NUM_BANDS = 8
+MIN_FREQ = 40.0
+
+
+class RingBuffer(object):
+    """Fixed-size float32 sample ring, one writer thread, any number of readers."""
+
+    def __init__(self, capacity, sample_rate=SAMPLE_RATE):
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.data = np.zeros(capacity, dtype=np.float32)
+        self.written = 0           # total samples ever written
+        self.written_at = 0.0      # wall time the newest sample arrived
+        self._lock = threading.Lock()
+
+    def write(self, samples, at=None):
+        samples = np.asarray(samples, dtype=np.float32)[-self.capacity:]
+        k = len(samples)
+        with self._lock:
+            start = self.written % self.capacity
+            first = min(k, self.capacity - start)
+            self.data[start:start + first] = samples[:first]
+            self.data[:k - first] = samples[first:]
+            self.written += k
+            self.written_at = time.time() if at is None else at
+
+    def latest(self, n, out=None):
+        """Copy the newest n samples (oldest first) into out; returns (out, written_at)."""
+        if out is None:
+            out = np.empty(n, dtype=np.float32)
+        with self._lock:
+            end = self.written % self.capacity
+            start = end - n
+            if start >= 0:
+                out[:] = self.data[start:end]
+            else:
+                out[:-start] = self.data[start:]
+                out[-start:] = self.data[:end]
+            return out, self.written_at
+
+
+class _Source(object):
+    # Shared ring/thread plumbing; each source defines run() to feed the ring.
+
+    def __init__(self, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.ring = RingBuffer(sample_rate * 2, sample_rate)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class WavSource(_Source):
+    """Play a WAV file into the ring at real-time pace, looping at the end."""
+
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+        with wave.open(path, "rb") as w:
+            rate = w.getframerate()
+        super().__init__(rate)
+
+    def run(self):
+        period = BLOCK / self.sample_rate
+        next_t = time.time()
+        while not self.stop_event.is_set():
+            with wave.open(self.path, "rb") as w:
+                channels, width = w.getnchannels(), w.getsampwidth()
+                while not self.stop_event.is_set():
+                    raw = w.readframes(BLOCK)
+                    if not raw:
+                        break
+                    self.ring.write(_decode(raw, width, channels))
+                    next_t += period
+                    time.sleep(max(0.0, next_t - time.time()))
+            if not self.loop:
+                break
+
+
+class StdinSource(_Source):
+    """Read signed 16-bit mono PCM from stdin, e.g. `arecord -f S16_LE -c1 -r44100 | ...`."""
+
+    def run(self):
+        stream = sys.stdin.buffer
+        while not self.stop_event.is_set():
+            raw = stream.read(BLOCK * 2)
+            if not raw:
+                break
+            self.ring.write(_decode(raw[:len(raw) // 2 * 2], 2, 1))
+
+
+class CaptureSource(_Source):
+    """Live capture through the sounddevice package (PortAudio)."""
+
+    def __init__(self, device=None, sample_rate=SAMPLE_RATE):
+        if sounddevice is None:
+            raise RuntimeError("audio capture needs the sounddevice package (pip install sounddevice)")
+        self.device = device
+        super().__init__(sample_rate)
+
+    def run(self):
+        def callback(indata, frames, time_info, status):
+            self.ring.write(indata[:, 0])
+
+        with sounddevice.InputStream(device=self.device, channels=1, samplerate=self.sample_rate,
+                                     blocksize=BLOCK, dtype="float32", latency="low", callback=callback):
+            self.stop_event.wait()
+
+
+def _decode(raw, width, channels):
+    if width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported sample width {width}")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def open_source(spec):
+    if spec == "-" or spec.startswith("-:"):
+        rate = int(spec[2:]) if spec.startswith("-:") else SAMPLE_RATE
+        return StdinSource(rate)
+    if spec == "capture" or spec.startswith("capture:"):
+        device = spec.split(":", 1)[1] if ":" in spec else None
+        if device is not None and device.isdigit():
+            device = int(device)
+        return CaptureSource(device)
+    return WavSource(spec)
+
+
+class LatencyStats(object):
+    """Rolling window of latency samples (seconds) with percentile reporting."""
+
+    def __init__(self, size=500):
+        self.samples = np.zeros(size)
+        self.count = 0
+
+    def add(self, value):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+
+    def percentiles(self, qs=(50, 95, 99)):
+        if not self.count:
+            return [0.0 for _ in qs]
+        return list(np.percentile(self.samples[:min(self.count, len(self.samples))], qs))
+
+
+class Analyzer(object):
+
+    def __init__(self, ring, window=WINDOW, num_bands=NUM_BANDS, onset_threshold=1.5, refractory=0.12):
+        self.ring = ring
+        self.window = window
+        self.hann = np.hanning(window).astype(np.float32)
+        self._buf = np.empty(window, dtype=np.float32)
+
+        # Log-spaced band edges over rfft bins, computed once.
+        freqs = np.fft.rfftfreq(window, 1.0 / ring.sample_rate)
+        edges = np.geomspace(MIN_FREQ, ring.sample_rate / 2, num_bands + 1)
+        starts = np.searchsorted(freqs, edges[:-1])
+        self.band_starts = np.maximum.accumulate(np.minimum(starts, len(freqs) - 1))
+        self.band_widths = np.maximum(1, np.diff(np.append(self.band_starts, len(freqs))))
+
+        self.num_bands = num_bands
+        # The window is centred half a window behind its newest sample.
+        self.window_delay = window / 2.0 / ring.sample_rate
+        self.peak = np.full(num_bands, 1e-6)    # slow-decay AGC per band
+        self.prev = np.zeros(num_bands)
+        self.flux_mean = 0.0
+        self.flux_var = 0.0
+        self.onset_threshold = onset_threshold
+        self.refractory = refractory
+        self.last_onset = 0.0
+        self.last_written = -1
+        self.features = {"bands": np.zeros(num_bands), "level": 0.0, "onset": False,
+                         "flux": 0.0, "captured_at": 0.0}
+        self.analysis_time = LatencyStats()
+        self.latency = LatencyStats()
+
+    def analyze(self, now=None):
+        """Analyse the newest window; returns a dict of bands (0..1), level, onset, flux, captured_at."""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        if self.ring.written == self.last_written:
+            self.features["onset"] = False
+            return self.features
+        self.last_written = self.ring.written
+
+        samples, captured_at = self.ring.latest(self.window, self._buf)
+        spectrum = np.abs(np.fft.rfft(samples * self.hann))
+        energy = np.add.reduceat(spectrum * spectrum, self.band_starts) / self.band_widths
+        energy = np.log1p(energy)
+
+        # AGC: follow peaks up instantly, let them fall back slowly.
+        self.peak = np.maximum(energy, self.peak * 0.995)
+        bands = energy / np.maximum(self.peak, 1e-6)
+
+        # Spectral flux onset detection against a running mean/variance.
+        flux = float(np.clip(energy - self.prev, 0.0, None).sum())
+        self.prev = energy
+        diff = flux - self.flux_mean
+        onset = (diff > self.onset_threshold * np.sqrt(self.flux_var) + 1e-3
+                 and now - self.last_onset > self.refractory)
+        self.flux_mean += 0.05 * diff
+        self.flux_var = 0.95 * (self.flux_var + 0.05 * diff * diff)
+        if onset:
+            self.last_onset = now
+
+        self.features = {"bands": bands, "level": float(bands.mean()), "onset": onset,
+                         "flux": flux, "captured_at": captured_at}
+        self.analysis_time.add(time.perf_counter() - started)
+        return self.features
+
+    def frame_sent(self, at=None):
+        """Call once the frame built from the latest features has gone out."""
+        captured_at = self.features["captured_at"]
+        if captured_at:
+            at = time.time() if at is None else at
+            self.latency.add(at - captured_at + self.window_delay)
+
+    def report(self):
+        a50, a99 = self.analysis_time.percentiles((50, 99))
+        l50, l95, l99 = self.latency.percentiles()
+        return (f"audio: analysis p50 {a50 * 1e3:.2f} ms p99 {a99 * 1e3:.2f} ms, "
+                f"audio->light p50 {l50 * 1e3:.1f} ms p95 {l95 * 1e3:.1f} ms p99 {l99 * 1e3:.1f} ms")
@@ -1,13 +1,22 @@
 #!/usr/bin/env python3
 
+import argparse
+import asyncio
 import curses
 import opc
-import time
+import sys
 
+import frame_cache
+import input_hub
+import topology
 
-NUM_LEDS = 512
+
+TREE = topology.load()
+NUM_LEDS = TREE.led_count
 HOST = "127.0.0.1:7890"
+CACHE = frame_cache.FrameCache(TREE)
 STEP = 0.05  # 5% increments
+BRIGHTNESS_CC = 50  # the APC's brightness fader
 
 
 def clamp(value: float, min_value: float = 0.0, max_value: float = 1.0) -> float:
@@ -17,48 +26,88 @@ def clamp(value: float, min_value: float = 0.0, max_value: float = 1.0) -> float
 def render_level(client: opc.Client, brightness: float) -> None:
     """Send a uniform brightness level to all LEDs."""
     level = int(255 * brightness)
-    pixels = [(level, level, level)] * NUM_LEDS
-    client.put_pixels(pixels)
+    CACHE.put_pixels(client, level, lambda: [(level, level, level)] * NUM_LEDS)
 
 
-def draw_status(screen, brightness: float) -> None:
+def draw_status(screen, brightness: float, status: str = "") -> None:
     screen.clear()
     screen.addstr(0, 0, "Brightness test")
-    screen.addstr(1, 0, "Arrow Up/Down or +/- to adjust in 5% steps; q to quit.")
+    screen.addstr(1, 0, "Arrow Up/Down or +/- to adjust in 5% steps (or the brightness fader); q to quit.")
     screen.addstr(3, 0, f"Current brightness: {brightness * 100:5.1f}%")
+    if status:
+        # Last line only (tracebacks end with the error), cut to the screen width.
+        screen.addstr(5, 0, status.splitlines()[-1][:screen.getmaxyx()[1] - 1])
     screen.refresh()
 
 
-def main(stdscr) -> None:
+async def run(stdscr, args: argparse.Namespace) -> None:
     curses.curs_set(0)
     stdscr.nodelay(True)
     stdscr.keypad(True)
 
     client = opc.Client(HOST)
-
-    brightness = 0.5
-    last_sent = None
-    draw_status(stdscr, brightness)
-    render_level(client, brightness)
-    last_sent = brightness
-
-    while True:
-        key = stdscr.getch()
-
-        if key in (ord("q"), ord("Q")):
-            break
-        elif key in (curses.KEY_UP, ord("+")):
-            brightness = clamp(brightness + STEP)
-        elif key in (curses.KEY_DOWN, ord("-")):
-            brightness = clamp(brightness - STEP)
-
-        if brightness != last_sent:
-            draw_status(stdscr, brightness)
-            render_level(client, brightness)
-            last_sent = brightness
-
-        time.sleep(0.05)
+    loop = asyncio.get_running_loop()
+    done = asyncio.Event()
+    current = {"brightness": 0.5, "status": ""}
+
+    def set_brightness(value: float) -> None:
+        value = clamp(value)
+        if value != current["brightness"]:
+            current["brightness"] = value
+            draw_status(stdscr, value, current["status"])
+            render_level(client, value)
+
+    def on_keys() -> None:
+        # stdin is readable: drain every key curses has, no polling.
+        while True:
+            key = stdscr.getch()
+            if key == -1:
+                return
+            if key in (ord("q"), ord("Q")):
+                done.set()
+            elif key in (curses.KEY_UP, ord("+")):
+                set_brightness(current["brightness"] + STEP)
+            elif key in (curses.KEY_DOWN, ord("-")):
+                set_brightness(current["brightness"] - STEP)
+
+    def on_input(msg, source: str) -> None:
+        if msg.type == "control_change" and msg.control == BRIGHTNESS_CC:
+            set_brightness(msg.value / 127)
+
+    def log(text: str) -> None:
+        # Hub messages go on a status line; printing would garble the curses screen.
+        current["status"] = text
+        draw_status(stdscr, current["brightness"], text)
+
+    hub = input_hub.InputHub(on_input, names={"brightness": ("cc", BRIGHTNESS_CC)}, log=log)
+    for name in args.midi:
+        hub.add_midi(name)
+    if args.osc:
+        hub.add_osc(args.osc)
+    if args.control_socket:
+        hub.add_socket(args.control_socket)
+
+    draw_status(stdscr, current["brightness"], current["status"])
+    render_level(client, current["brightness"])
+    loop.add_reader(sys.stdin.fileno(), on_keys)
+    inputs = asyncio.ensure_future(hub.run())
+    try:
+        await done.wait()
+    finally:
+        loop.remove_reader(sys.stdin.fileno())
+        inputs.cancel()
+        await asyncio.gather(inputs, return_exceptions=True)
+
+
+def main(stdscr, args: argparse.Namespace) -> None:
+    asyncio.run(run(stdscr, args))
 
 
 if __name__ == "__main__":
-    curses.wrapper(main)
+    parser = argparse.ArgumentParser(description="Step the whole tree through brightness levels")
+    parser.add_argument("--midi", action="append", default=[], metavar="NAME",
+                        help=f"MIDI controller (port name substring) whose CC {BRIGHTNESS_CC} sets the level")
+    parser.add_argument("--osc", nargs="?", const=f":{input_hub.DEFAULT_OSC_PORT}", metavar="[HOST]:PORT",
+                        help="accept /tree/brightness 0..1 over OSC")
+    parser.add_argument("--control-socket", metavar="PATH", help='accept "brightness 0.8" lines on a Unix socket')
+    curses.wrapper(main, parser.parse_args())
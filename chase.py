@@ -4,13 +4,15 @@
 # so it's clear when there's a problem.
 
 import opc, time
+import topology
 
-numLEDs = 512
+tree = topology.load()
+numLEDs = tree.led_count
 client = opc.Client('treeled.local:7890')
 
 while True:
 	for i in range(numLEDs):
 		pixels = [ (0,0,0) ] * numLEDs
 		pixels[i] = (255, 255, 255)
-		client.put_pixels(pixels)
+		tree.put_pixels(client, pixels)
 		time.sleep(0.1)
@@ -0,0 +1,91 @@
+"""
+Debounced, atomic JSON checkpoints of controller state.
+
+mark_dirty() is cheap and can be called on every fader tick; a background
+thread waits until things have been quiet for `debounce` seconds and then
+writes the snapshot to a temp file, fsyncs it and renames it over the real
+file, so a crash or power cut leaves either the old or the new state on disk,
+never half of one.
+
+    CHECKPOINT = checkpoint.Checkpointer("treeled_state.json", lambda: {"state": STATE})
+    saved = checkpoint.load("treeled_state.json")
+    CHECKPOINT.start()
+    ...
+    CHECKPOINT.mark_dirty()
+"""
+
+import json
+import os
+import threading
+import time
+
+
+def load(path):
+    """Return the last checkpoint as a dict, or None if there isn't a usable one."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        print(f"Ignoring unreadable checkpoint {path}: {exc}")
+        return None
+
+
+def write_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Checkpointer(object):
+
+    def __init__(self, path, snapshot, debounce=0.5):
+        """snapshot is called (from the writer thread) to get the dict to save."""
+        self.path = path
+        self.snapshot = snapshot
+        self.debounce = debounce
+        self._dirty_at = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="checkpoint", daemon=True)
+            self._thread.start()
+        return self
+
+    def mark_dirty(self):
+        self._dirty_at = time.monotonic()
+        self._wake.set()
+
+    def flush(self):
+        """Write now if anything changed since the last write."""
+        with self._lock:
+            if self._dirty_at is None:
+                return
+            self._dirty_at = None
+            try:
+                write_atomic(self.path, self.snapshot())
+            except OSError as exc:
+                print(f"Could not write checkpoint {self.path}: {exc}")
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            # Keep pushing the write back while changes are still streaming in.
+            while True:
+                with self._lock:
+                    dirty_at = self._dirty_at  # flush() may clear it at any time
+                if dirty_at is None:
+                    break
+                quiet = time.monotonic() - dirty_at
+                if quiet >= self.debounce:
+                    self.flush()
+                    break
+                time.sleep(self.debounce - quiet)
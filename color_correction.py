@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+"""
+Per-LED colour and brightness correction, measured from a video of the tree.
+
+fcserver's config.json only has one gamma and whitepoint for every LED, but
+individual LEDs differ visibly in brightness and tint. Calibrating is two
+steps:
+
+  1. `./color_correction.py flash` lights every LED in a fixed sequence while
+     you film the tree from where the LED positions were detected: a white
+     sync flash, then black, red, green, blue and white, each held for a few
+     seconds with black in between.
+
+  2. `./color_correction.py measure tree.mp4 led_positions.tsv` finds the
+     sync flash in the recording and averages a small box around each LED in
+     the middle of each hold. It then works out, per LED and per channel, how
+     much to scale the drive so every LED matches a dim reference LED (a low
+     percentile, so one weak LED doesn't darken the whole tree). The result is
+     written to color_correction.npz.
+
+led_positions.tsv has one line per logical LED, "x<TAB>y" in video pixels,
+with "nan" for LEDs the detection didn't find. Those LEDs, and any LED too
+dim to measure, are left uncorrected. To use the positions that
+location_from_video.py detected, save its output and pass that instead:
+
+    python location_from_video.py > detected.txt
+    ./color_correction.py measure tree.mp4 --positions-from detected.txt
+
+Its "frame (x, y)" lines are mapped to LEDs with --first-frame (the frame
+showing LED 0, default 1) and --frames-per-led; the median point is used when
+an LED spans several frames.
+
+To use the table, add it to topology.json:
+
+    "color_correction": "color_correction.npz"
+
+Topology.encode then multiplies every frame by the (N, 3) gain table before
+the power limiter: one vectorized multiply per frame. The gains are in the
+8-bit value domain, so a wanted change in light output k becomes a gain of
+k ** (1 / gamma), using the gamma from fcserver's config.json.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import opc
+
+try:
+    import cv2
+except ImportError:  # only needed to measure a recording
+    cv2 = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORRECTION_NPZ = os.path.join(HERE, "color_correction.npz")
+FCSERVER_JSON = os.path.join(HERE, "config.json")
+# Sync flash first, then the measured colours. Primaries give each channel's
+# response, black the ambient light, white a check of the result.
+SEQUENCE = [("sync", (1, 1, 1)), ("black", (0, 0, 0)), ("red", (1, 0, 0)),
+            ("green", (0, 1, 0)), ("blue", (0, 0, 1)), ("white", (1, 1, 1))]
+PRIMARIES = ("red", "green", "blue")
+HOLD = 2.0         # seconds each colour is shown
+GAP = 1.0          # seconds of black between colours
+LEVEL = 96         # drive level: low enough that the camera doesn't clip
+RADIUS = 3         # half-size in pixels of the box averaged round each LED
+REFERENCE_PERCENTILE = 5.0
+MIN_GAIN = 0.25    # never dim an LED's channel below this share of its light
+CAMERA_GAMMA = 2.2  # camera values -> linear light
+
+
+class ColorCorrection(object):
+
+    def __init__(self, gain):
+        self.gain = np.asarray(gain, dtype=np.float32)
+
+    def apply(self, frame):
+        """The (N, 3) frame with each LED's channels scaled by its gains."""
+        return np.asarray(frame, dtype=float) * self.gain
+
+    @classmethod
+    def load(cls, path, led_count=None):
+        with np.load(path) as table:
+            gain = table["gain"]
+        if led_count is not None and gain.shape != (led_count, 3):
+            raise ValueError(f"{path} has gains for {len(gain)} LEDs, the topology has {led_count}")
+        return cls(gain)
+
+    def save(self, path=CORRECTION_NPZ, **extra):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, gain=self.gain, **extra)
+        os.replace(tmp, path)
+
+
+def positions_from_detection(lines, led_count, first_frame=1, frames_per_led=1):
+    """(led_count, 2) positions from location_from_video.py's "frame (x, y)" lines; NaN where none."""
+    found = {}
+    for line in lines:
+        frame, _, point = line.strip().partition(" ")
+        if not frame.isdigit() or not point.startswith("("):
+            continue
+        led = (int(frame) - first_frame) // frames_per_led
+        if 0 <= led < led_count:
+            x, y = (float(v) for v in point.strip("()").split(","))
+            found.setdefault(led, []).append((x, y))
+    points = np.full((led_count, 2), np.nan)
+    for led, seen in found.items():
+        points[led] = np.median(seen, axis=0)
+    return points
+
+
+def fcserver_gamma(path=FCSERVER_JSON):
+    try:
+        with open(path) as f:
+            return float(json.load(f).get("color", {}).get("gamma", 1.0))
+    except (OSError, ValueError):
+        return 1.0
+
+
+def solve(levels, gamma=1.0, percentile=REFERENCE_PERCENTILE, min_gain=MIN_GAIN, noise=None):
+    """Gain table from measured linear camera levels.
+
+    levels: {"red": (N, 3), "green": ..., "blue": ...} with ambient already
+    subtracted, NaN for LEDs that weren't seen. Each LED's response to a
+    primary is read from the matching camera channel. Returns (N, 3) gains in
+    the value domain (1.0 = unchanged).
+    """
+    response = np.stack([levels[name][:, c] for c, name in enumerate(PRIMARIES)], axis=1)
+    if noise is None:
+        noise = 0.02 * np.nanmax(response)
+    measured = np.isfinite(response) & (response > noise)
+    reference = np.array([np.percentile(response[measured[:, c], c], percentile) if measured[:, c].any() else 1.0
+                          for c in range(3)])
+    light = np.ones_like(response)
+    light[measured] = (reference[None, :] / np.where(measured, response, 1.0))[measured]
+    light = np.clip(light, min_gain, 1.0)
+    return light ** (1.0 / gamma)
+
+
+def led_samples(frame, points, radius=RADIUS):
+    """Mean colour of the (2r+1)-pixel box round each point, via an integral image; NaN off-frame."""
+    h, w = frame.shape[:2]
+    integral = np.zeros((h + 1, w + 1, frame.shape[2]))
+    integral[1:, 1:] = frame.cumsum(axis=0).cumsum(axis=1)
+    out = np.full((len(points), frame.shape[2]), np.nan)
+    ok = np.all(np.isfinite(points), axis=1)
+    x, y = np.round(points[ok]).astype(int).T
+    x0, x1 = np.clip(x - radius, 0, w), np.clip(x + radius + 1, 0, w)
+    y0, y1 = np.clip(y - radius, 0, h), np.clip(y + radius + 1, 0, h)
+    area = (x1 - x0) * (y1 - y0)
+    total = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[ok] = total / np.where(area > 0, area, 0)[:, None]
+    return out
+
+
+def read_samples(path, points, radius=RADIUS):
+    """Per-frame LED samples for a whole video: (times, (F, N, 3) linear RGB)."""
+    if cv2 is None:
+        raise RuntimeError("measuring needs OpenCV: pip install opencv-python-headless")
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"cannot open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    samples = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        rgb = (frame[:, :, ::-1].astype(np.float32) / 255.0) ** CAMERA_GAMMA
+        samples.append(led_samples(rgb, points, radius))
+    cap.release()
+    if not samples:
+        raise RuntimeError(f"no frames in {path}")
+    return np.arange(len(samples)) / fps, np.stack(samples)
+
+
+def measure(times, samples, hold=HOLD, gap=GAP):
+    """Average LED levels for each SEQUENCE colour, ambient subtracted.
+
+    The sync flash is the first frame where the tree's mean level crosses
+    halfway between its darkest and brightest; every colour's hold follows at
+    a fixed offset from there and only its middle half is used.
+    """
+    overall = np.nanmean(samples, axis=(1, 2))
+    threshold = (overall.min() + overall.max()) / 2
+    start = times[np.argmax(overall > threshold)]
+    levels = {}
+    for step, (name, _) in enumerate(SEQUENCE):
+        begin = start + step * (hold + gap)
+        window = (times >= begin + hold / 4) & (times <= begin + 3 * hold / 4)
+        if not window.any():
+            raise ValueError(f"the recording ends before the {name} hold")
+        levels[name] = samples[window].mean(axis=0)  # NaN stays NaN for unseen LEDs
+    black = levels["black"]
+    return {name: np.maximum(level - black, 0.0) for name, level in levels.items()}
+
+
+def spread(white):
+    """Coefficient of variation of the white level across measured LEDs."""
+    lum = white.sum(axis=1)
+    lum = lum[np.isfinite(lum) & (lum > 0)]
+    return float(lum.std() / lum.mean()) if len(lum) else float("nan")
+
+
+def flash(client, tree, level=LEVEL, hold=HOLD, gap=GAP):
+    tree.correction = None  # measure the raw LEDs
+    black = np.zeros((tree.led_count, 3))
+    tree.put_pixels(client, black)
+    time.sleep(2 * gap)
+    for name, color in SEQUENCE:
+        print(f"{name}...")
+        tree.put_pixels(client, np.tile(np.array(color, dtype=float) * level, (tree.led_count, 1)))
+        time.sleep(hold)
+        tree.put_pixels(client, black)
+        time.sleep(gap)
+    print("done")
+
+
+def main():
+    import topology  # topology imports this module for ColorCorrection
+
+    parser = argparse.ArgumentParser(description="Measure per-LED colour correction from a video")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("flash", help="show the calibration sequence on the tree while you film it")
+    p.add_argument("--opc", default="treeled.local:7890")
+    p.add_argument("--level", type=int, default=LEVEL)
+    p.add_argument("--hold", type=float, default=HOLD)
+    p.add_argument("--gap", type=float, default=GAP)
+    p = sub.add_parser("measure", help="build the correction table from a recording of the sequence")
+    p.add_argument("video")
+    p.add_argument("positions", nargs="?", help="x<TAB>y video pixel position per logical LED, nan if not found")
+    p.add_argument("--positions-from", metavar="LOG",
+                   help="read positions from location_from_video.py's output instead")
+    p.add_argument("--first-frame", type=int, default=1, help="frame of LED 0 in --positions-from")
+    p.add_argument("--frames-per-led", type=int, default=1, help="frames each LED is lit in --positions-from")
+    p.add_argument("--out", default=CORRECTION_NPZ)
+    p.add_argument("--radius", type=int, default=RADIUS)
+    p.add_argument("--hold", type=float, default=HOLD)
+    p.add_argument("--gap", type=float, default=GAP)
+    p.add_argument("--gamma", type=float, default=None, help="LED gamma (default: fcserver config.json)")
+    args = parser.parse_args()
+
+    tree = topology.load()
+    if args.command == "flash":
+        flash(opc.Client(args.opc), tree, args.level, args.hold, args.gap)
+        return
+
+    if args.positions_from:
+        with open(args.positions_from) as f:
+            points = positions_from_detection(f, tree.led_count, args.first_frame, args.frames_per_led)
+        print(f"{int(np.isfinite(points[:, 0]).sum())} of {tree.led_count} LED positions read from "
+              f"{args.positions_from}")
+    elif args.positions:
+        points = np.genfromtxt(args.positions, delimiter="\t", ndmin=2, dtype=float)[:, :2]
+        if len(points) != tree.led_count:
+            raise SystemExit(f"{args.positions} has {len(points)} positions, the topology has {tree.led_count} LEDs")
+    else:
+        parser.error("measure needs a positions file or --positions-from")
+    gamma = args.gamma if args.gamma is not None else fcserver_gamma()
+    times, samples = read_samples(args.video, points, args.radius)
+    levels = measure(times, samples, args.hold, args.gap)
+    gain = solve(levels, gamma)
+    ColorCorrection(gain).save(args.out, **{name: levels[name] for name in PRIMARIES + ("white",)})
+    predicted = levels["white"] * gain ** gamma
+    corrected = int(np.sum(np.any(gain < 1.0, axis=1)))
+    print(f"Wrote {args.out}: {corrected} of {tree.led_count} LEDs corrected, "
+          f"white spread {100 * spread(levels['white']):.0f}% -> {100 * spread(predicted):.0f}% (predicted)")
+
+
+if __name__ == "__main__":
+    main()
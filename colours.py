@@ -1,17 +1,21 @@
 
 def load_colours():
+    # The colours file is written in the strips' GRB order; hand back RGB so
+    # callers can send through the topology like everything else.
     colours = []
     with open('colours') as f:
         for line in f:
             name, colour = line.split(" ")
             g, r, b = colour.strip()[1:-1].split(",")
-            colours.append((int(g), int(r), int(b)))
+            colours.append((int(r), int(g), int(b)))
     return colours
 
 if __name__ == "__main__":
     import opc
+    import topology
 
-    numLEDs = 512
+    tree = topology.load()
+    numLEDs = tree.led_count
     client = opc.Client('treeled.local:7890')
 
     colours = load_colours()
@@ -33,4 +37,4 @@ if __name__ == "__main__":
 
             for i in range(numLEDs):
                 pixels[i] = colours[c%len(colours)]
-        client.put_pixels(pixels)
+        tree.put_pixels(client, pixels)
@@ -0,0 +1,423 @@
+"""
+Turn scalar per-pixel effect functions into whole-frame numpy evaluations.
+
+Effects are nicest to write one pixel at a time:
+
+    def get_colour(height, time, pixel):
+        if height > 200:
+            return pal6(time / 100 + pixel / 50)
+        return (0, 0, int(255 * (pixel % 8) / 8))
+
+compile_effect() reads the function's source and rewrites it so every
+argument can be an array:
+
+  * math.sin/cos/... become numpy ufuncs, min/max/abs/int/round their numpy
+    equivalents, `a if c else b` becomes np.where, and/or/not are elementwise.
+  * if/elif/else blocks are predicated: both sides run over all pixels and
+    each assignment or return only takes effect where its condition holds.
+  * plain Python helpers it calls (e.g. hsv_to_rgb) are rewritten the same way.
+
+Arguments are passed by name. Arrays (pixel index, height, x/y/z, ...) are
+per-LED; anything else (t, params dicts, colours) is shared by every pixel:
+
+    effect = compile_effect(get_colour)
+    frame = effect(height=heights, time=t, pixel=np.arange(512))   # (512, 3)
+
+The first call checks the vectorized result against the plain scalar function
+on a handful of pixels. Anything that can't be rewritten (loops,
+comprehensions, per-pixel random(), list lookups by pixel, ...) or that
+doesn't match falls back to calling the original function once per pixel,
+and says so once on the console. effect.vectorized / effect.reason tell you
+which path is in use.
+"""
+
+import ast
+import inspect
+import math
+import textwrap
+import types
+
+import numpy as np
+
+CHECK_PIXELS = 16
+
+MATH_FUNCS = {
+    "sin": "sin", "cos": "cos", "tan": "tan", "asin": "arcsin", "acos": "arccos",
+    "atan": "arctan", "atan2": "arctan2", "sinh": "sinh", "cosh": "cosh", "tanh": "tanh",
+    "exp": "exp", "log": "log", "log2": "log2", "log10": "log10", "sqrt": "sqrt",
+    "floor": "floor", "ceil": "ceil", "fabs": "abs", "hypot": "hypot", "pow": "power",
+    "fmod": "fmod", "trunc": "trunc", "copysign": "copysign", "radians": "radians",
+    "degrees": "degrees", "isnan": "isnan", "isinf": "isinf",
+}
+BUILTINS = {"min": "_vmin", "max": "_vmax", "abs": "_np.abs", "int": "_vint",
+            "round": "_vround", "float": "_vfloat", "pow": "_np.power", "bool": "_vbool"}
+UNSUPPORTED = (ast.For, ast.AsyncFor, ast.While, ast.Try, ast.With, ast.AsyncWith, ast.Raise,
+               ast.Global, ast.Nonlocal, ast.Delete, ast.Lambda, ast.ListComp, ast.SetComp,
+               ast.DictComp, ast.GeneratorExp, ast.Yield, ast.YieldFrom, ast.Await, ast.Starred,
+               ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom)
+
+
+class CannotVectorize(Exception):
+    pass
+
+
+# Runtime helpers the rewritten code calls.
+
+def _vmin(*args):
+    out = args[0]
+    for a in args[1:]:
+        out = np.minimum(out, a)
+    return out
+
+
+def _vmax(*args):
+    out = args[0]
+    for a in args[1:]:
+        out = np.maximum(out, a)
+    return out
+
+
+def _vint(x):
+    return np.trunc(x).astype(np.int64) if isinstance(x, np.ndarray) else int(x)
+
+
+def _vround(x, ndigits=None):
+    return np.round(x, ndigits or 0) if ndigits is not None else np.round(x)
+
+
+def _vfloat(x):
+    return np.asarray(x, dtype=float) if isinstance(x, np.ndarray) else float(x)
+
+
+def _vbool(x):
+    return np.asarray(x, dtype=bool) if isinstance(x, np.ndarray) else bool(x)
+
+
+def _select(mask, new, old):
+    """new where mask holds, old elsewhere; understands tuples of channels."""
+    if mask is True:
+        return new
+    if old is None:
+        return new
+    if isinstance(new, (tuple, list)) or isinstance(old, (tuple, list)):
+        return tuple(_select(mask, a, b) for a, b in zip(_channels(new), _channels(old)))
+    mask = np.asarray(mask)
+    new = np.asarray(new)
+    old = np.asarray(old)
+    if mask.ndim and max(new.ndim, old.ndim) > mask.ndim:
+        mask = mask.reshape(mask.shape + (1,) * (max(new.ndim, old.ndim) - mask.ndim))
+    return np.where(mask, new, old)
+
+
+def _channels(value):
+    if isinstance(value, (tuple, list)):
+        return tuple(value)
+    value = np.asarray(value)
+    return tuple(value[..., k] for k in range(value.shape[-1]))
+
+
+def _and(a, b):
+    if a is True:
+        return b
+    return np.logical_and(a, b)
+
+
+def _not(a):
+    return np.logical_not(a)
+
+
+def _rgb(value, n):
+    """Shape whatever an effect returned into an (n, 3) float frame."""
+    if isinstance(value, (tuple, list)):
+        if len(value) != 3:
+            raise CannotVectorize(f"returned {len(value)} values, expected (r, g, b)")
+        return np.stack([np.broadcast_to(np.asarray(c, dtype=float), (n,)) for c in value], axis=1)
+    value = np.asarray(value, dtype=float)
+    return np.broadcast_to(value, (n, 3)).copy() if value.shape != (n, 3) else value
+
+
+class _Rewriter(ast.NodeTransformer):
+    """Expression-level rewrites: math/builtins to numpy, ternaries, boolean ops."""
+
+    def __init__(self, math_names):
+        self.math_names = math_names  # names bound to the math module in the function's globals
+
+    def generic_visit(self, node):
+        if isinstance(node, UNSUPPORTED):
+            raise CannotVectorize(f"line {getattr(node, 'lineno', '?')}: {type(node).__name__} can't be vectorized")
+        return super().generic_visit(node)
+
+    def visit_Attribute(self, node):
+        self.generic_visit(node)
+        if isinstance(node.value, ast.Name) and node.value.id in self.math_names and node.attr in MATH_FUNCS:
+            return _attr("_np", MATH_FUNCS[node.attr])
+        return node
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Name) and node.func.id in BUILTINS:
+            node.func = ast.parse(BUILTINS[node.func.id], mode="eval").body
+        elif isinstance(node.func, ast.Name) and node.func.id in ("tuple", "list") and len(node.args) == 1:
+            return node.args[0] if isinstance(node.args[0], (ast.Tuple, ast.List)) else node
+        return node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        return _call("_select", node.test, node.body, node.orelse)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        fn = "logical_and" if isinstance(node.op, ast.And) else "logical_or"
+        out = node.values[0]
+        for value in node.values[1:]:
+            out = _call(_attr("_np", fn), out, value)
+        return out
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return _call("_not", node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        # a < b < c  ->  (a < b) & (b < c)
+        parts = []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            parts.append(ast.Compare(left=left, ops=[op], comparators=[right]))
+            left = right
+        out = parts[0]
+        for part in parts[1:]:
+            out = _call(_attr("_np", "logical_and"), out, part)
+        return out
+
+
+def _attr(name, attr):
+    return ast.Attribute(value=ast.Name(id=name, ctx=ast.Load()), attr=attr, ctx=ast.Load())
+
+
+def _call(func, *args):
+    if isinstance(func, str):
+        func = ast.Name(id=func, ctx=ast.Load())
+    return ast.Call(func=func, args=list(args), keywords=[])
+
+
+def _name(id, store=False):
+    return ast.Name(id=id, ctx=ast.Store() if store else ast.Load())
+
+
+def _assign(target, value):
+    return ast.Assign(targets=[_name(target, store=True)], value=value, lineno=0)
+
+
+class _Lowerer(object):
+    """Statement-level predication of if/elif/else and early returns."""
+
+    def __init__(self, rewriter, params):
+        self.rewriter = rewriter
+        self.defined = set(params)
+        self.temps = 0
+        self.out = []
+
+    def temp(self):
+        self.temps += 1
+        return f"_c{self.temps}"
+
+    def lower(self, stmts, cond):
+        # cond is None for "every pixel", else the name of a mask variable.
+        for stmt in stmts:
+            if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant):
+                continue  # docstring
+            if isinstance(stmt, ast.Pass):
+                continue
+            if isinstance(stmt, ast.Assign):
+                value = self.rewriter.visit(stmt.value)
+                if len(stmt.targets) != 1:
+                    raise CannotVectorize(f"line {stmt.lineno}: chained assignment")
+                target = stmt.targets[0]
+                if isinstance(target, ast.Name):
+                    self.assign(target.id, value, cond)
+                elif isinstance(target, (ast.Tuple, ast.List)) and all(isinstance(e, ast.Name) for e in target.elts):
+                    tmp = self.temp()
+                    self.out.append(_assign(tmp, value))
+                    for k, elt in enumerate(target.elts):
+                        item = ast.Subscript(value=_name(tmp), slice=ast.Constant(k), ctx=ast.Load())
+                        self.assign(elt.id, item, cond)
+                else:
+                    raise CannotVectorize(f"line {stmt.lineno}: only plain names can be assigned")
+            elif isinstance(stmt, ast.AugAssign) and isinstance(stmt.target, ast.Name):
+                value = ast.BinOp(left=_name(stmt.target.id), op=stmt.op, right=self.rewriter.visit(stmt.value))
+                self.assign(stmt.target.id, value, cond)
+            elif isinstance(stmt, ast.If):
+                test = self.temp()
+                self.out.append(_assign(test, self.rewriter.visit(stmt.test)))
+                yes = self.temp()
+                no = self.temp()
+                parent = _name(cond) if cond else ast.Constant(True)
+                self.out.append(_assign(yes, _call("_and", parent, _name(test))))
+                self.out.append(_assign(no, _call("_and", parent, _call("_not", _name(test)))))
+                self.lower(stmt.body, yes)
+                self.lower(stmt.orelse, no)
+            elif isinstance(stmt, ast.Return):
+                value = self.rewriter.visit(stmt.value) if stmt.value is not None else ast.Constant(None)
+                live = _call("_and", _name(cond) if cond else ast.Constant(True), _call("_not", _name("_done")))
+                mask = self.temp()
+                self.out.append(_assign(mask, live))
+                self.out.append(_assign("_ret", _call("_select", _name(mask), value, _name("_ret"))))
+                self.out.append(_assign("_done", _call(_attr("_np", "logical_or"), _name("_done"), _name(mask))))
+            else:
+                raise CannotVectorize(f"line {getattr(stmt, 'lineno', '?')}: {type(stmt).__name__} can't be vectorized")
+
+    def assign(self, name, value, cond):
+        if cond is None or name not in self.defined:
+            # First definition: pixels outside cond get a value they never read.
+            self.out.append(_assign(name, value))
+        else:
+            self.out.append(_assign(name, _call("_select", _name(cond), value, _name(name))))
+        self.defined.add(name)
+
+
+_VECTORIZED = {}
+
+
+class _LiveGlobals(dict):
+    """Globals for a rewritten function: its own helpers, then the module's live globals.
+
+    Names are looked up in the original module on every call, so globals
+    rebound (or defined) after compile_effect() are seen just as the scalar
+    function sees them. Helpers called by name are rewritten too, so the
+    whole call tree takes arrays.
+    """
+
+    def __init__(self, module_globals, calls):
+        super().__init__()
+        self.module_globals = module_globals
+        self.calls = calls
+
+    def __missing__(self, name):
+        value = self.module_globals[name]  # KeyError falls through to builtins
+        if name in self.calls and isinstance(value, types.FunctionType):
+            return vectorize_function(value)
+        return value
+
+
+def clear_cache():
+    """Forget vectorized functions, e.g. once a reloaded module has replaced the originals."""
+    _VECTORIZED.clear()
+
+
+def vectorize_function(fn):
+    """Return an array-friendly rewrite of fn (cached). Raises CannotVectorize."""
+    if fn in _VECTORIZED:
+        return _VECTORIZED[fn]
+    if fn.__code__.co_freevars:
+        raise CannotVectorize(f"{fn.__name__} is a closure")
+    try:
+        source = textwrap.dedent(inspect.getsource(fn))
+    except (OSError, TypeError):
+        raise CannotVectorize(f"no source for {fn.__name__}")
+    tree = ast.parse(source)
+    func = tree.body[0]
+    if not isinstance(func, ast.FunctionDef) or func.name != fn.__name__:
+        raise CannotVectorize(f"{fn.__name__} is not a plain def")
+    args = func.args
+    if args.vararg or args.kwarg or args.kwonlyargs:
+        raise CannotVectorize(f"{fn.__name__} takes *args/**kwargs")
+    params = [a.arg for a in args.args]
+
+    math_names = {name for name, value in fn.__globals__.items() if value is math}
+    lowerer = _Lowerer(_Rewriter(math_names), params)
+    lowerer.out.append(_assign("_ret", ast.Constant(None)))
+    lowerer.out.append(_assign("_done", ast.Constant(False)))
+    lowerer.lower(func.body, None)
+    lowerer.out.append(ast.Return(value=_name("_ret")))
+
+    func.body = lowerer.out
+    func.decorator_list = []
+    func.name = f"_vectorized_{fn.__name__}"
+    module = ast.fix_missing_locations(ast.Module(body=[func], type_ignores=[]))
+
+    calls = {node.func.id for node in ast.walk(tree)
+             if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)}
+    namespace = _LiveGlobals(fn.__globals__, calls)
+    namespace.update({
+        "_np": np, "_select": _select, "_and": _and, "_not": _not, "_vmin": _vmin, "_vmax": _vmax,
+        "_vint": _vint, "_vround": _vround, "_vfloat": _vfloat, "_vbool": _vbool,
+    })
+    _VECTORIZED[fn] = None  # guard against recursion while helpers compile
+    try:
+        # Rewrite the helpers that exist now, so one that can't be vectorized
+        # shows up here rather than on the first frame.
+        for name in calls:
+            target = fn.__globals__.get(name)
+            if isinstance(target, types.FunctionType) and target is not fn:
+                vectorize_function(target)
+        exec(compile(module, inspect.getsourcefile(fn) or "<effect>", "exec"), namespace)
+    except Exception:
+        _VECTORIZED.pop(fn, None)
+        raise
+    vectorized = namespace[func.name]
+    vectorized.__defaults__ = fn.__defaults__
+    _VECTORIZED[fn] = vectorized
+    return vectorized
+
+
+class CompiledEffect(object):
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.name = fn.__name__
+        self.params = list(inspect.signature(fn).parameters)
+        self.vectorized = False
+        self.reason = None
+        self._checked_n = None
+        try:
+            self._vector = vectorize_function(fn)
+            self.vectorized = True
+        except (CannotVectorize, SyntaxError) as exc:
+            self._fall_back(str(exc))
+
+    def _fall_back(self, reason):
+        self.vectorized = False
+        self.reason = reason
+        print(f"effect {self.name}: using the scalar per-pixel path ({reason})")
+
+    def __call__(self, **kwargs):
+        """Evaluate for every pixel; array kwargs are per-pixel, the rest shared. Returns (n, 3)."""
+        n = max((len(v) for v in kwargs.values() if isinstance(v, np.ndarray) and v.ndim), default=1)
+        if self.vectorized:
+            try:
+                with np.errstate(all="ignore"):
+                    frame = _rgb(self._vector(**kwargs), n)
+                if self._checked_n != n:
+                    self._check(frame, kwargs, n)
+                    self._checked_n = n
+                return frame
+            except Exception as exc:
+                self._fall_back(f"{type(exc).__name__}: {exc}")
+        return self.scalar(n, kwargs)
+
+    def _check(self, frame, kwargs, n):
+        idx = np.unique(np.linspace(0, n - 1, min(n, CHECK_PIXELS)).astype(int))
+        for i in idx:
+            expected = np.asarray(self.fn(**_pixel_kwargs(kwargs, i)), dtype=float)
+            if expected.shape != (3,) or not np.allclose(frame[i], expected, rtol=1e-6, atol=1e-3):
+                raise CannotVectorize(f"pixel {i} gave {frame[i].tolist()} vectorized but "
+                                      f"{expected.tolist()} scalar")
+
+    def scalar(self, n, kwargs):
+        frame = np.empty((n, 3))
+        for i in range(n):
+            frame[i] = self.fn(**_pixel_kwargs(kwargs, i))
+        return frame
+
+
+def _pixel_kwargs(kwargs, i):
+    return {k: (v[i].item() if isinstance(v, np.ndarray) and v.ndim else v) for k, v in kwargs.items()}
+
+
+def compile_effect(fn):
+    return CompiledEffect(fn)
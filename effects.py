@@ -0,0 +1,233 @@
+"""
+The looks rendered by apc_tree_control, one function per mode.
+
+Every mode function takes (t, state, ctx) and returns an (N, 3) RGB frame:
+
+    t      effect time in seconds
+    state  the controller's STATE dict (faders, colours, mode settings)
+    ctx    per-frame context built by the controller: n, index, xyz, base,
+           accent, brightness, speed, the stateful twinkle/sparkle fields and
+           particle systems, the fire/ripples fields (led_graph.py), game
+           flash/level, audio (a render callable) and
+           video (a VideoPlayer or None)
+
+Anything that has to survive between frames lives in ctx, not in this
+module, because the controller watches this file and swaps in a fresh copy
+when it changes (see hot_reload.py). Edit and save it while the tree is
+running; a version that fails to import or render keeps the old one going.
+"""
+
+import math
+
+import numpy as np
+
+import effect_compiler
+import palettes
+import particles
+from frame_cache import phase_bucket
+
+PALETTE_PHASE_STEPS = 256  # palette scroll positions per palette unit (~0.2 LED each), so its frames repeat
+
+
+def clamp01(x):
+    return max(0.0, min(1.0, x))
+
+
+def lerp(a, b, t):
+    return a + (b - a) * t
+
+
+def hsv_to_rgb(h, s, v):
+    h = h % 1.0
+    s = clamp01(s)
+    v = clamp01(v)
+    i = int(h * 6)
+    f = h * 6 - i
+    p = v * (1 - s)
+    q = v * (1 - f * s)
+    t = v * (1 - (1 - f) * s)
+    i = i % 6
+    if i == 0:
+        r, g, b = v, t, p
+    elif i == 1:
+        r, g, b = q, v, p
+    elif i == 2:
+        r, g, b = p, v, t
+    elif i == 3:
+        r, g, b = p, q, v
+    elif i == 4:
+        r, g, b = t, p, v
+    else:
+        r, g, b = v, p, q
+    return (int(r * 255), int(g * 255), int(b * 255))
+
+
+def mix(color, factor, brightness):
+    return tuple(int(channel * factor * brightness) for channel in color)
+
+
+# Per-pixel effects, written for one LED at a time and compiled by effect_compiler
+# into whole-frame numpy expressions.
+
+def layer_pixel(base, base_mix, accent, accent_mix, brightness):
+    # mix() both colours and add them, as the original per-pixel loops did.
+    return (min(255, int(base[0] * base_mix * brightness) + int(accent[0] * accent_mix * brightness)),
+            min(255, int(base[1] * base_mix * brightness) + int(accent[1] * accent_mix * brightness)),
+            min(255, int(base[2] * base_mix * brightness) + int(accent[2] * accent_mix * brightness)))
+
+
+def swirl_pixel(pixel, n, phase, base, accent, brightness):
+    v = (math.sin((pixel / n) * math.tau + phase) + 1) / 2
+    # Blend base as a floor, accent rides on top.
+    return layer_pixel(base, 0.2, accent, 0.2 + 0.8 * v, brightness)
+
+
+def chase_pixel(pixel, n, phase, length, accent, brightness):
+    dist = (pixel - phase) % n
+    falloff = max(0, 1 - dist / length)
+    return (int(accent[0] * falloff * brightness),
+            int(accent[1] * falloff * brightness),
+            int(accent[2] * falloff * brightness))
+
+
+def spectrum_pixel(pixel, n, scroll, contrast, primary_hue, secondary_hue, sat, val, brightness):
+    pos = (pixel / n) + scroll
+    wave = (math.sin(pos * math.tau) + 1) / 2
+    blended = lerp(0.5, wave, contrast)  # pull extremes down when contrast < 1
+    hue = lerp(primary_hue, secondary_hue, blended) % 1.0
+    r, g, b = hsv_to_rgb(hue, sat, val)
+    return (int(r * brightness), int(g * brightness), int(b * brightness))
+
+
+def game_pixel(pixel, n, phase, flash_boost, base, accent, brightness):
+    v = (math.sin((pixel / n) * math.tau + phase) + 1) / 2
+    return layer_pixel(base, 0.2, accent, (0.2 + 0.6 * v) * flash_boost, brightness)
+
+
+SWIRL_EFFECT = effect_compiler.compile_effect(swirl_pixel)
+CHASE_EFFECT = effect_compiler.compile_effect(chase_pixel)
+SPECTRUM_EFFECT = effect_compiler.compile_effect(spectrum_pixel)
+GAME_EFFECT = effect_compiler.compile_effect(game_pixel)
+
+
+def palette_buckets(pal):
+    # Sized to the phase rather than the period, so long-period palettes scroll as finely as the rest.
+    return max(1, int(round(PALETTE_PHASE_STEPS * pal.period)))
+
+
+def palette_step(t, pal, speed):
+    """Which of palette_buckets(pal) scroll positions the palette wash is at (also a cache key)."""
+    return phase_bucket(t * max(0.05, speed) * 0.5, pal.period, palette_buckets(pal))
+
+
+# Mode renderers, in mode order.
+
+def solid(t, state, ctx):
+    return [mix(ctx["base"], 1.0, ctx["brightness"])] * ctx["n"]
+
+
+def twinkle(t, state, ctx):
+    # Accent fades in/out per LED over a dim base; slower when the speed fader is down.
+    rate = 0.3 + 2.0 * state["speed"]
+    level = ctx["twinkle"].advance(t, state["twinkle_density"], rate)
+    return (np.outer(0.4 * (1.0 - level), ctx["base"]) + np.outer(level, ctx["accent"])) * ctx["brightness"]
+
+
+def swirl(t, state, ctx):
+    # Sin wave with base as background.
+    phase = t * ctx["speed"] + state["swirl_phase"]
+    return SWIRL_EFFECT(pixel=ctx["index"], n=ctx["n"], phase=phase, base=ctx["base"], accent=ctx["accent"],
+                        brightness=ctx["brightness"])
+
+
+def chase(t, state, ctx):
+    n = ctx["n"]
+    phase = int((t * ctx["speed"] * n)) % n
+    length = max(1, int(state["chase_length"] * n))
+    return CHASE_EFFECT(pixel=ctx["index"], n=n, phase=phase, length=length, accent=ctx["accent"],
+                        brightness=ctx["brightness"])
+
+
+def sparkle(t, state, ctx):
+    # Short accent flashes on base.
+    rate = 4.0 + 12.0 * state["speed"]
+    level = ctx["sparkle"].advance(t, state["sparkle_chance"], rate)
+    return (np.outer(0.3 * (1.0 - level), ctx["base"]) + np.outer(level, ctx["accent"])) * ctx["brightness"]
+
+
+def game(t, state, ctx):
+    # Base glow with accent pulse; flash boost when the player hits the square.
+    flash_boost = 1.0 + 0.8 * max(0.0, ctx["flash_timer"])
+    phase = t * (1.0 + ctx["game_level"] * 0.5)
+    return GAME_EFFECT(pixel=ctx["index"], n=ctx["n"], phase=phase, flash_boost=flash_boost,
+                       base=ctx["base"], accent=ctx["accent"], brightness=ctx["brightness"])
+
+
+def spectrum(t, state, ctx):
+    # Multi-colour wash between two user hues.
+    spread = max(0.05, state["spectrum_spread"])
+    scroll = (t * (0.5 + state["speed"] * 2.5)) / spread
+    return SPECTRUM_EFFECT(pixel=ctx["index"], n=ctx["n"], scroll=scroll,
+                           contrast=clamp01(state["spectrum_contrast"]),
+                           primary_hue=state["spectrum_primary_hue"],
+                           secondary_hue=state["spectrum_secondary_hue"],
+                           sat=clamp01(state["spectrum_saturation"]), val=clamp01(state["spectrum_value"]),
+                           brightness=ctx["brightness"])
+
+
+def snow(t, state, ctx):
+    # Accent flakes falling over a dim base.
+    buf = np.outer(np.ones(ctx["n"]), ctx["base"]) * 0.15
+    particles.snow(ctx["snow"], ctx["xyz"], t, buf, rate=0.5 + 8 * state["twinkle_density"], color=ctx["accent"])
+    return buf * ctx["brightness"]
+
+
+def embers(t, state, ctx):
+    # Accent sparks rising from the base.
+    buf = np.outer(np.ones(ctx["n"]), ctx["base"]) * 0.1
+    particles.embers(ctx["embers"], ctx["xyz"], t, buf, rate=2 + 30 * state["twinkle_density"], color=ctx["accent"])
+    return buf * ctx["brightness"]
+
+
+def blips(t, state, ctx):
+    # Scattered accent flashes over base.
+    buf = np.outer(np.ones(ctx["n"]), ctx["base"]) * 0.3
+    particles.blips(ctx["blips"], t, buf, rate=5 + 300 * state["twinkle_density"], color=ctx["accent"])
+    return buf * ctx["brightness"]
+
+
+def palette(t, state, ctx):
+    # Cosine palette washing along the strip.
+    pal = palettes.PRESETS[state["palette"]]
+    phase = palette_step(t, pal, state["speed"]) * pal.period / palette_buckets(pal)
+    return pal.lookup(phase + ctx["index"] / 50) * ctx["brightness"]
+
+
+def fire(t, state, ctx):
+    # Heat climbs the tree: base colour at the tips of the flames, accent where it's hottest.
+    heat = np.clip(ctx["fire"].advance(t, 5 + 80 * state["twinkle_density"], 0.5 + state["speed"]), 0.0, 1.0)
+    glow = np.sqrt(heat)[:, None]
+    color = np.outer(1.0 - heat, ctx["base"]) + np.outer(heat, ctx["accent"])
+    return color * glow * ctx["brightness"]
+
+
+def ripples(t, state, ctx):
+    # Accent crests and troughs spreading out from random drops over a dim base.
+    wave = np.clip(np.abs(ctx["ripples"].advance(t, 0.5 + 10 * state["twinkle_density"],
+                                                   0.5 + state["speed"])), 0.0, 1.0)
+    return (np.outer(0.15 * (1.0 - wave), ctx["base"]) + np.outer(wave, ctx["accent"])) * ctx["brightness"]
+
+
+def audio(t, state, ctx):
+    return ctx["audio"](t, ctx["base"], ctx["accent"]) * ctx["brightness"]
+
+
+def video(t, state, ctx):
+    colors = ctx["video"].sample(t) if ctx["video"] is not None else None
+    if colors is None:
+        return np.outer(np.ones(ctx["n"]), ctx["base"]) * (0.1 * ctx["brightness"])
+    return colors * ctx["brightness"]
+
+
+MODES = [solid, twinkle, swirl, chase, sparkle, game, spectrum, snow, embers, blips, palette, audio, video,
+         fire, ripples]
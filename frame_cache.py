@@ -0,0 +1,112 @@
+"""
+Cache of fully encoded OPC frames for looks that repeat.
+
+Static and periodic content (solid colours, a palette scrolling round its
+period, test levels, hello.py's cycle) produces the same wire bytes over and
+over. FrameCache keys each frame on whatever determines it, typically
+(effect, quantized parameters, phase bucket), and keeps the finished OPC
+messages for every channel joined into one bytes object, so a hit costs a
+dict lookup and a single socket write. Entries are evicted least recently
+used first once the cache holds more than max_bytes.
+
+    CACHE = frame_cache.FrameCache(TOPOLOGY)
+    key = ("solid", color, frame_cache.quantize(brightness))
+    CACHE.put_pixels(client, key, lambda: render_solid(color, brightness))
+
+The render callable only runs on a miss and must return the logical frame
+for exactly that key, so quantize anything continuous (see quantize and
+phase_bucket) and render from the quantized value.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+import opc
+
+DEFAULT_MAX_BYTES = 4 << 20
+QUANTIZE_STEPS = 1024
+
+
+def quantize(value, steps=QUANTIZE_STEPS):
+    """Integer bucket for a 0..1 parameter, for use in cache keys."""
+    return int(round(value * steps))
+
+
+def snap(value, steps=QUANTIZE_STEPS):
+    """The value quantize() puts in the key, to render from on a miss."""
+    return quantize(value, steps) / steps
+
+
+def phase_bucket(t, period, buckets):
+    """Which of `buckets` equal slices of a repeating `period` time t falls in."""
+    return int((t % period) * buckets / period) % buckets
+
+
+class CachedFrame(object):
+
+    def __init__(self, topology, pixels):
+        # Logical frame kept as uint8 for anything that inspects what was sent
+        # (e.g. the rate controller), wire bytes as one message per channel.
+        self.frame = np.clip(np.asarray(pixels), 0, 255).astype(np.uint8)
+        # Limit power for this frame alone; easing state belongs to the live stream.
+        parts = topology.encode(self.frame, smooth=False)
+        self.power = topology.power.metrics() if topology.power is not None else None
+        self.message = b"".join(opc.pixel_message(data, channel) for channel, data in parts)
+        view = memoryview(self.message)
+        self.parts = []
+        offset = 0
+        for channel, data in parts:
+            self.parts.append((channel, view[offset + 4:offset + 4 + len(data)]))
+            offset += 4 + len(data)
+        self.size = len(self.message) + self.frame.nbytes
+
+
+class FrameCache(object):
+
+    def __init__(self, topology, max_bytes=DEFAULT_MAX_BYTES):
+        self.topology = topology
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        """The CachedFrame for key, calling render() for its logical frame on a miss."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            if entry.power is not None:
+                self.topology.power.record(entry.power)
+            return entry
+        self.misses += 1
+        entry = CachedFrame(self.topology, render())
+        self.entries[key] = entry
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.size
+        return entry
+
+    def put_pixels(self, client, key, render, tap=None):
+        """Send the frame for key (rendering it on a miss); returns the CachedFrame.
+
+        tap, as for Topology.put_pixels, is called with (channel, data) per channel.
+        """
+        entry = self.get(key, render)
+        client.put_message(entry.message)
+        if tap is not None:
+            for channel, data in entry.parts:
+                tap(channel, data)
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def report(self):
+        total = max(1, self.hits + self.misses)
+        return (f"frame cache: {len(self.entries)} frames / {self.bytes / 1e3:.0f} kB, "
+                f"hit rate {100.0 * self.hits / total:.0f}%")
@@ -0,0 +1,38 @@
+"""
+LED positions on the tree.
+
+pixels.csv has one tab-separated line per LED: height band, radius and angle
+(degrees), i.e. cylindrical coordinates around the trunk. Unmeasured LEDs
+just have radius/angle 0, which puts them on the trunk at their band height.
+"""
+
+import os
+
+import numpy as np
+
+PIXELS_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pixels.csv")
+
+
+def load_cylindrical(path=PIXELS_CSV):
+    """Return an (N, 3) array of (height, radius, angle_degrees) per LED."""
+    return np.loadtxt(path, delimiter="\t", ndmin=2, dtype=float)
+
+
+def load_xyz(path=PIXELS_CSV, n=None):
+    """Return (N, 3) cartesian LED positions, normalized so height spans 0..1.
+
+    x/y are scaled by the same factor as height so distances stay meaningful.
+    If n is given the array is padded (with LEDs at the origin) or truncated to n.
+    """
+    h, r, a = load_cylindrical(path).T
+    a = np.radians(a)
+    xyz = np.stack([r * np.cos(a), r * np.sin(a), h], axis=1)
+    xyz[:, 2] -= h.min()
+    span = xyz[:, 2].max()
+    if span > 0:
+        xyz /= span
+    if n is not None:
+        out = np.zeros((n, 3))
+        out[:min(n, len(xyz))] = xyz[:n]
+        xyz = out
+    return xyz
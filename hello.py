@@ -1,31 +1,37 @@
 #!/usr/bin/env python
 
 import opc, time
+import frame_cache
+import topology
 
-# colours are
-# GRB
+# colours are RGB; the topology's output maps swap them to the strips' GRB order
 
-numLEDs = 512
+tree = topology.load()
+numLEDs = tree.led_count
 client = opc.Client('treeled.local:7890')
+cache = frame_cache.FrameCache(tree)  # the 8 steps repeat, so encode each once
 pixels = [(0,0,0)] * numLEDs
 colors = [
-        (0,255,0),
-        (127,255,0),
-        (255,255,0),
         (255,0,0),
-        (150,0,150),
+        (255,127,0),
+        (255,255,0),
+        (0,255,0),
+        (0,150,150),
         (0,0,255),
-        (0,75,130),
+        (75,0,130),
         (100,100,100)
     ]
 
+def step(i):
+    for j, strip in enumerate(tree.strips):
+        for c in range(strip["logical_count"]):
+            if j % 3 == i % 3:
+                pixels[strip["logical_start"] + c] = colors[j % len(colors)]
+            else:
+                pixels[strip["logical_start"] + c] = colors[(i+1)%len(colors)]
+    return pixels
+
 while True:
     for i in range(8):
-        for j in range(8):
-            for c in range(64):
-                if j % 3 == i % 3:
-                    pixels[j*64 + c] = colors[j]
-                else:
-                    pixels[j*64 + c] = colors[(i+1)%len(colors)]
-        client.put_pixels(pixels)
+        cache.put_pixels(client, i, lambda: step(i))
         time.sleep(2)
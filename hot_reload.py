@@ -0,0 +1,96 @@
+"""
+Reload a module in place while the program using it keeps running.
+
+HotModule watches a module's source file. When the file changes, it
+imports a fresh copy under the same name in a background thread. The live
+module is not touched, so a syntax error or a half-saved file can't break
+it. The fresh copy is handed to check(); if that raises, the error is
+printed and the old version keeps running. A copy that passes waits in
+`pending` until the owner calls swap() at a safe point, e.g. between
+frames:
+
+    EFFECTS = hot_reload.HotModule("effects", check=test_effects).start()
+    ...
+    if EFFECTS.swap():
+        print("effects reloaded")
+    frame = EFFECTS.module.render(...)
+
+Code should always go through HotModule.module rather than holding on to
+functions from it, and state that must survive a reload belongs to the
+owner, not the module.
+"""
+
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+import time
+import traceback
+
+POLL_INTERVAL = 0.5
+
+
+class HotModule(object):
+
+    def __init__(self, name, check=None, interval=POLL_INTERVAL):
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self.module = importlib.import_module(name)
+        self.path = self.module.__file__
+        self.mtime = self._mtime()
+        self.pending = None
+        self.version = 1
+        self._lock = threading.Lock()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        """Import and check a fresh copy of the module; returns it, or None on failure."""
+        spec = importlib.util.spec_from_file_location(self.name, self.path)
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module)
+            if self.check is not None:
+                self.check(module)
+        except Exception:
+            print(f"Reloading {self.name} failed, keeping the running version:")
+            traceback.print_exc()
+            return None
+        return module
+
+    def poll(self):
+        mtime = self._mtime()
+        if mtime is None or mtime == self.mtime:
+            return
+        self.mtime = mtime
+        module = self.load()
+        if module is not None:
+            with self._lock:
+                self.pending = module
+
+    def swap(self):
+        """Switch to a checked new version if there is one; returns True if it switched."""
+        with self._lock:
+            module, self.pending = self.pending, None
+        if module is None:
+            return False
+        self.module = module
+        sys.modules[self.name] = module
+        self.version += 1
+        print(f"Reloaded {self.name} (version {self.version})")
+        return True
+
+    def start(self):
+        def loop():
+            while True:
+                time.sleep(self.interval)
+                self.poll()
+
+        threading.Thread(target=loop, name=f"reload-{self.name}", daemon=True).start()
+        return self
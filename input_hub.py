@@ -0,0 +1,337 @@
+"""
+One asyncio event loop for every control input.
+
+InputHub turns MIDI ports, OSC over UDP and a local Unix control socket
+into the same thing: mido control_change / note_on messages, handed one at
+a time to a single handle(msg, source) callback on the loop. Anything that
+understands the APC's faders and pads (handle_cc / handle_note) can then be
+driven from any mix of controllers at once, with no polling and no
+per-input threads:
+
+  * MIDI: mido delivers messages from the backend's own callback, which
+    only queues them onto the loop. Ports are found by name substring and
+    reopened if they disappear, like the old retry loop.
+  * OSC: "/tree/cc/<n> <value>", "/tree/note/<n> [velocity]" or
+    "/tree/<name> [value]" for the names the owner defines (e.g.
+    /tree/brightness 0.8). Bundles are unpacked.
+  * Unix socket: the same commands as text lines, e.g.
+    `echo "brightness 0.8" | nc -U /tmp/treeled.sock`. Each line is answered
+    with "ok" or "error: ...".
+
+Named faders (brightness, speed, ...) always take 0..1, so "brightness 1"
+is full. Explicit "cc N V" / "note N V" follow OSC habits: floats are 0..1
+and integers are raw MIDI 0..127. A missing value means 127 (a full fader or
+a pressed pad). Names bound to a callable take the callable's own units,
+e.g. a whole-number mode or colour index read with parse_index().
+
+Status and error lines go to the hub's log callable (print by default);
+curses programs pass their own so nothing is written over the screen.
+
+    hub = input_hub.InputHub(handle, names={"brightness": ("cc", 50)})
+    hub.add_midi("APC MINI", out_port="APC MINI", on_connect=draw_leds)
+    hub.add_osc(":9000")
+    hub.add_socket("/tmp/treeled.sock")
+    asyncio.run(hub.run())
+"""
+
+import asyncio
+import os
+import struct
+import traceback
+from collections import Counter
+
+import mido
+from mido import Message
+
+RETRY_SECONDS = 2.0
+OSC_PREFIX = "/tree"
+DEFAULT_OSC_PORT = 9000
+
+
+class NullPort(object):
+    """Stands in for a MIDI output when LED feedback has nowhere to go."""
+
+    def send(self, msg):
+        pass
+
+
+def midi_value(value):
+    if value is None:
+        return 127
+    if isinstance(value, float):
+        return max(0, min(127, int(round(value * 127))))
+    return max(0, min(127, int(value)))
+
+
+def parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def parse_index(value, name="value"):
+    """Whole-number argument of a named command (a mode or colour index); None means 0."""
+    if value is None:
+        return 0
+    try:
+        number = parse_value(value) if isinstance(value, str) else value
+        if float(number).is_integer():
+            return int(number)
+    except (ValueError, TypeError):
+        pass
+    raise ValueError(f"{name} takes a whole-number index, got {value!r}")
+
+
+def find_port(substring, names):
+    for name in names:
+        if substring.lower() in name.lower():
+            return name
+    return None
+
+
+def _osc_string(data, offset):
+    end = data.index(b"\0", offset)
+    return data[offset:end].decode("utf-8", "replace"), (end + 4) & ~3
+
+
+def parse_osc(data):
+    """[(address, [args]), ...] for an OSC packet, bundles flattened."""
+    if data.startswith(b"#bundle\0"):
+        messages = []
+        offset = 16  # "#bundle\0" + 8-byte timetag
+        while offset + 4 <= len(data):
+            (size,) = struct.unpack_from(">i", data, offset)
+            messages.extend(parse_osc(data[offset + 4:offset + 4 + size]))
+            offset += 4 + size
+        return messages
+    address, offset = _osc_string(data, 0)
+    if offset >= len(data):
+        return [(address, [])]
+    tags, offset = _osc_string(data, offset)
+    args = []
+    for tag in tags.lstrip(","):
+        if tag == "i":
+            args.append(struct.unpack_from(">i", data, offset)[0])
+            offset += 4
+        elif tag == "f":
+            args.append(struct.unpack_from(">f", data, offset)[0])
+            offset += 4
+        elif tag == "h":
+            args.append(struct.unpack_from(">q", data, offset)[0])
+            offset += 8
+        elif tag == "d":
+            args.append(struct.unpack_from(">d", data, offset)[0])
+            offset += 8
+        elif tag == "s":
+            text, offset = _osc_string(data, offset)
+            args.append(text)
+        elif tag in "TF":
+            args.append(127 if tag == "T" else 0)
+        else:
+            raise ValueError(f"unsupported OSC type tag {tag!r}")
+    return [(address, args)]
+
+
+class MidiInput(object):
+
+    def __init__(self, hub, port, out_port=None, on_connect=None, on_disconnect=None):
+        self.hub = hub
+        self.port = port
+        self.out_port = out_port
+        self.on_connect = on_connect        # called with the output port (or a NullPort)
+        self.on_disconnect = on_disconnect  # called with the same port just before it closes
+        self.inport = None
+        self.outport = None
+        self.name = None
+
+    def _open(self, name):
+        loop = self.hub.loop
+        source = f"midi:{name}"
+        self.inport = mido.open_input(name, callback=lambda msg: loop.call_soon_threadsafe(
+            self.hub.dispatch, msg, source))
+        self.outport = NullPort()
+        if self.out_port is not None:
+            out_name = find_port(self.out_port, mido.get_output_names())
+            if out_name is not None:
+                self.outport = mido.open_output(out_name)
+        self.name = name
+        self.hub.log(f"Using MIDI ports: {name} / {getattr(self.outport, 'name', None)}")
+        if self.on_connect is not None:
+            self.on_connect(self.outport)
+
+    def close(self):
+        if self.inport is None:
+            return
+        if self.on_disconnect is not None:
+            try:
+                self.on_disconnect(self.outport)
+            except Exception as exc:
+                self.hub.log(f"MIDI disconnect for {self.name} failed: {exc}")
+        for port in (self.inport, self.outport):
+            if hasattr(port, "close"):
+                port.close()
+        self.inport = self.outport = self.name = None
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    names = mido.get_input_names()
+                    if self.inport is None:
+                        name = find_port(self.port, names)
+                        if name is not None:
+                            self._open(name)
+                    elif self.name not in names:
+                        self.hub.log(f"MIDI port {self.name} went away")
+                        self.close()
+                except Exception as exc:
+                    # ALSA/port errors: log and retry. The tree keeps rendering meanwhile.
+                    self.hub.log(f"MIDI error on {self.port}: {exc}. Retrying in {RETRY_SECONDS:g}s...")
+                    self.close()
+                await asyncio.sleep(RETRY_SECONDS)
+        finally:
+            self.close()
+
+
+class _OscProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def datagram_received(self, data, addr):
+        try:
+            messages = parse_osc(data)
+        except (ValueError, struct.error) as exc:
+            self.hub.errors += 1
+            self.hub.log(f"Bad OSC packet from {addr[0]}: {exc}")
+            return
+        for address, args in messages:
+            if not address.startswith(self.hub.prefix + "/"):
+                continue
+            words = address[len(self.hub.prefix) + 1:].split("/")
+            self.hub.submit(words + args[:1], "osc")
+
+
+class InputHub(object):
+
+    def __init__(self, handle, names=None, prefix=OSC_PREFIX, log=print):
+        """handle(msg, source) gets every message; names maps command names to
+        ("cc", control), ("note", note) or a callable(value) -> Message.
+        log(text) gets status and error lines."""
+        self.handle = handle
+        self.log = log
+        self.names = dict(names or {})
+        self.prefix = prefix
+        self.loop = None
+        self.counts = Counter()
+        self.errors = 0
+        self._midi = []
+        self._osc = []
+        self._sockets = []
+
+    def add_midi(self, port, out_port=None, on_connect=None, on_disconnect=None):
+        self._midi.append(MidiInput(self, port, out_port, on_connect, on_disconnect))
+        return self
+
+    def add_osc(self, listen):
+        """listen: "[HOST]:PORT" or "PORT"; binds all interfaces when no host is given."""
+        host, _, port = str(listen).rpartition(":")
+        self._osc.append((host or "0.0.0.0", int(port or DEFAULT_OSC_PORT)))
+        return self
+
+    def add_socket(self, path):
+        self._sockets.append(path)
+        return self
+
+    def message(self, words):
+        """Message for a command split into words, e.g. ["cc", "50", 0.8] or ["mode", 3]."""
+        words = list(words)
+        if not words:
+            raise ValueError("empty command")
+        kind = words[0]
+        if kind in ("cc", "note"):
+            if len(words) < 2:
+                raise ValueError(f"{kind} needs a number")
+            target, value = int(words[1]), words[2] if len(words) > 2 else None
+        elif kind in self.names:
+            spec, value = self.names[kind], words[1] if len(words) > 1 else None
+            if callable(spec):
+                return spec(value)
+            kind, target = spec
+            if value is not None:
+                value = float(value)  # named commands are always 0..1
+        else:
+            raise ValueError(f"unknown command {kind!r}")
+        if isinstance(value, str):
+            value = parse_value(value)
+        if kind == "cc":
+            return Message("control_change", control=target, value=midi_value(value))
+        return Message("note_on", note=target, velocity=midi_value(value))
+
+    def submit(self, words, source):
+        try:
+            msg = self.message(words)
+        except (ValueError, TypeError) as exc:
+            self.errors += 1
+            return f"error: {exc}"
+        self.dispatch(msg, source)
+        return "ok"
+
+    def dispatch(self, msg, source):
+        self.counts[source] += 1
+        try:
+            self.handle(msg, source)
+        except Exception:
+            # One bad message must not take every input down with it.
+            self.errors += 1
+            self.log(traceback.format_exc().rstrip())
+
+    async def _client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode("utf-8", "replace").split()
+                if words:
+                    writer.write((self.submit(words, "socket") + "\n").encode())
+                    await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Cancelled at shutdown: end quietly, asyncio's stream server logs cancelled handlers.
+            pass
+        finally:
+            writer.close()
+
+    async def run(self):
+        """Serve every input until cancelled (e.g. by Ctrl-C under asyncio.run)."""
+        self.loop = asyncio.get_running_loop()
+        tasks = [asyncio.ensure_future(midi.run()) for midi in self._midi]
+        transports, servers = [], []
+        try:
+            for host, port in self._osc:
+                transport, _ = await self.loop.create_datagram_endpoint(
+                    lambda: _OscProtocol(self), local_addr=(host, port))
+                transports.append(transport)
+                self.log(f"Listening for OSC on {host}:{port} ({self.prefix}/...)")
+            for path in self._sockets:
+                if os.path.exists(path):
+                    os.unlink(path)  # left over from a previous run
+                servers.append(await asyncio.start_unix_server(self._client, path))
+                self.log(f"Listening for control commands on {path}")
+            await asyncio.Event().wait()  # until cancelled
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for transport in transports:
+                transport.close()
+            for server in servers:
+                server.close()
+            for path in self._sockets:
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def report(self):
+        counts = ", ".join(f"{source} {count}" for source, count in sorted(self.counts.items())) or "none"
+        return f"inputs: {counts}; {self.errors} errors"
@@ -0,0 +1,239 @@
+"""
+Sparse neighbour graph of the LEDs, for effects that spread across the tree.
+
+Strip index says little about where an LED is once the strip is wrapped
+round the branches, so propagation effects work on a graph instead. Each LED
+is linked to:
+
+  * its k nearest LEDs in space, from the calibrated positions
+    (geometry.load_xyz), weighted by a Gaussian of the distance;
+  * the LEDs either side of it on its strip, which are physically close
+    whatever the calibration says.
+
+LedGraph turns that into two row-normalized sparse matrices, kept as edge
+lists. `mix` averages each LED's neighbours. `up` averages only the
+neighbours below it. Each propagation step is then one sparse
+matrix-vector product (a gather, a multiply and np.bincount over a few
+thousand edges), so several substeps per frame are cheap even on the Pi.
+Only numpy is needed: the neighbour search is brute force, done
+KNN_CHUNK rows at a time so memory stays at O(KNN_CHUNK * N) even for
+thousands of LEDs, and it only runs when the cache is stale. The graph is
+cached in led_graph.npz and rebuilt whenever the positions, strips or k
+change. If the positions are mostly flat (e.g. an uncalibrated pixels.csv)
+few LEDs have a neighbour below them, so `up` carries almost nothing and
+fire can't rise; that is reported when the graph is loaded.
+
+    GRAPH = led_graph.load(LED_XYZ, TOPOLOGY.strips)
+    FIRE = led_graph.FireField(GRAPH)
+    heat = FIRE.advance(t, rate, speed)     # (N,) 0..~1.5 per LED
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GRAPH_CACHE = os.path.join(HERE, "led_graph.npz")
+K = 6
+STEP_RATE = 50.0   # propagation steps per second, whatever the frame rate
+MAX_STEPS = 5      # per frame, so a stall doesn't run the simulation away
+MAX_DT = 0.1
+KNN_CHUNK = 256    # rows of the distance matrix computed at once
+MIN_LIFTED = 0.5   # below this share of LEDs with a lower neighbour, warn that fire won't rise
+
+
+class SparseMatrix(object):
+    """Square matrix as (rows, cols, data) edge lists; `matrix @ u` for 1-D u."""
+
+    def __init__(self, rows, cols, data, n):
+        self.rows = np.asarray(rows, dtype=np.intp)
+        self.cols = np.asarray(cols, dtype=np.intp)
+        self.data = np.asarray(data, dtype=float)
+        self.n = n
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    def __matmul__(self, u):
+        return np.bincount(self.rows, weights=self.data * u[self.cols], minlength=self.n)
+
+    def subset(self, keep):
+        return SparseMatrix(self.rows[keep], self.cols[keep], self.data[keep], self.n)
+
+    def row_normalized(self):
+        sums = np.bincount(self.rows, weights=self.data, minlength=self.n)
+        return SparseMatrix(self.rows, self.cols, self.data / sums[self.rows], self.n)
+
+
+class LedGraph(object):
+
+    def __init__(self, adjacency, xyz):
+        self.adjacency = adjacency
+        self.n = adjacency.n
+        self.xyz = np.asarray(xyz)
+        self.mix = adjacency.row_normalized()
+        # Keep only edges whose far end is lower down.
+        z = self.xyz[:, 2]
+        self.up = adjacency.subset(z[adjacency.cols] < z[adjacency.rows] - 1e-6).row_normalized()
+        lifted = len(np.unique(self.up.rows))
+        if self.n > 1 and lifted < MIN_LIFTED * self.n:
+            print(f"LED graph: only {lifted} of {self.n} LEDs have a neighbour below them, so fire "
+                  f"won't rise; check the LED heights in pixels.csv")
+
+    @classmethod
+    def build(cls, xyz, strips=(), k=K):
+        """strips: (logical_start, logical_count) pairs; neighbours on a strip are always linked."""
+        xyz = np.asarray(xyz, dtype=float)
+        n = len(xyz)
+        k = min(k, n - 1)
+        idx, dist = _nearest(xyz, k)
+        nonzero = dist[dist > 0]
+        sigma = np.median(nonzero) if len(nonzero) else 1.0
+        rows = [np.repeat(np.arange(n), k)]
+        cols = [idx.ravel()]
+        weights = [np.exp(-0.5 * (dist.ravel() / sigma) ** 2)]
+        for start, count in strips:
+            chain = np.arange(start, start + count - 1)
+            rows.append(chain)
+            cols.append(chain + 1)
+            weights.append(np.ones(len(chain)))
+        rows, cols, weights = np.concatenate(rows), np.concatenate(cols), np.concatenate(weights)
+        # Symmetric, no self loops; where an edge appears twice keep the stronger weight.
+        rows, cols = np.concatenate([rows, cols]), np.concatenate([cols, rows])
+        weights = np.concatenate([weights, weights])
+        keep = (rows != cols) & (weights > 0)
+        rows, cols, weights = rows[keep], cols[keep], weights[keep]
+        key = rows * n + cols
+        order = np.lexsort((weights, key))
+        last = np.r_[key[order][1:] != key[order][:-1], True]
+        order = order[last]
+        return cls(SparseMatrix(rows[order], cols[order], weights[order], n), xyz)
+
+    def diffuse(self, u, rate):
+        """One heat-diffusion step: move each value `rate` of the way to its neighbours' mean."""
+        return u + rate * (self.mix @ u - u)
+
+    def rise(self, u):
+        """Each LED takes the mean of its lower neighbours (0 where it has none)."""
+        return self.up @ u
+
+
+def _nearest(xyz, k, chunk=KNN_CHUNK):
+    """(N, k) indices of each point's k nearest others, and their distances."""
+    n = len(xyz)
+    sq = (xyz ** 2).sum(axis=1)
+    idx = np.empty((n, k), dtype=np.intp)
+    dist = np.empty((n, k))
+    for start in range(0, n, chunk):
+        stop = min(n, start + chunk)
+        d2 = np.maximum(sq[start:stop, None] + sq[None, :] - 2.0 * xyz[start:stop] @ xyz.T, 0.0)
+        d2[np.arange(stop - start), np.arange(start, stop)] = np.inf  # not your own neighbour
+        part = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        idx[start:stop] = part
+        dist[start:stop] = np.sqrt(np.take_along_axis(d2, part, axis=1))
+    return idx, dist
+
+
+def _cache_key(xyz, strips, k):
+    h = hashlib.sha1(np.ascontiguousarray(xyz, dtype=float).tobytes())
+    h.update(repr((list(strips), k)).encode())
+    return h.hexdigest()
+
+
+def load(xyz, strips=(), k=K, path=GRAPH_CACHE):
+    """LedGraph for these positions, from the cache file if it matches, else built and cached.
+
+    strips may be topology strip dicts or (logical_start, logical_count) pairs.
+    """
+    xyz = np.asarray(xyz, dtype=float)
+    strips = [(s["logical_start"], s["logical_count"]) if isinstance(s, dict) else tuple(s) for s in strips]
+    key = _cache_key(xyz, strips, k)
+    try:
+        with np.load(path) as cached:
+            if str(cached["key"]) == key:
+                return LedGraph(SparseMatrix(cached["rows"], cached["cols"], cached["data"], len(xyz)), xyz)
+    except (OSError, KeyError, ValueError):
+        pass
+    graph = LedGraph.build(xyz, strips, k)
+    a = graph.adjacency
+    try:
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, key=key, rows=a.rows, cols=a.cols, data=a.data)
+        os.replace(tmp, path)
+    except OSError as exc:
+        print(f"Could not cache LED graph to {path}: {exc}")
+    return graph
+
+
+class _Field(object):
+
+    def __init__(self, graph, seed=None):
+        self.graph = graph
+        self.rng = np.random.default_rng(seed)
+        self._last_t = None
+        self._pending = 0.0
+
+    def _steps(self, t, speed):
+        """Seconds since the last frame, and how many fixed-size steps to run for them."""
+        dt = 0.0 if self._last_t is None else min(MAX_DT, max(0.0, t - self._last_t))
+        self._last_t = t
+        # Carry the fraction over so slow speeds still move at 50 fps.
+        self._pending = min(MAX_STEPS, self._pending + dt * speed * STEP_RATE)
+        steps = int(self._pending)
+        self._pending -= steps
+        return dt, steps
+
+
+class FireField(_Field):
+    """Heat injected near the bottom, carried upward and spread sideways, cooling as it goes."""
+
+    def __init__(self, graph, cooling=2.0, spread=0.3, lift=0.7, base_height=0.15, seed=None):
+        super().__init__(graph, seed)
+        self.heat = np.zeros(graph.n)
+        self.cooling = cooling     # fraction lost per second, roughly
+        self.spread = spread       # sideways diffusion per step
+        self.lift = lift           # share of each step's heat taken from below
+        self.sources = np.flatnonzero(graph.xyz[:, 2] <= base_height)
+        if not len(self.sources):
+            self.sources = np.argsort(graph.xyz[:, 2])[:max(1, graph.n // 10)]
+
+    def advance(self, t, rate, speed=1.0):
+        """Step to time t with `rate` sparks per second; returns the heat per LED."""
+        dt, steps = self._steps(t, speed)
+        keep = np.exp(-self.cooling / STEP_RATE)
+        h = self.heat
+        for _ in range(steps):
+            h = keep * ((1.0 - self.lift) * h + self.lift * self.graph.rise(h))
+            h = self.graph.diffuse(h, self.spread)
+        sparks = self.rng.poisson(rate * dt) if dt > 0 else 0
+        if sparks:
+            hit = self.rng.choice(self.sources, size=sparks)
+            np.add.at(h, hit, self.rng.uniform(0.6, 1.5, size=sparks))
+        self.heat = h
+        return h
+
+
+class WaveField(_Field):
+    """Ripples: drops push LEDs out of rest and the disturbance travels over the graph."""
+
+    def __init__(self, graph, stiffness=0.5, damping=0.97, seed=None):
+        super().__init__(graph, seed)
+        self.u = np.zeros(graph.n)
+        self.v = np.zeros(graph.n)
+        self.stiffness = stiffness  # <= 1 for stability with a row-normalized mix
+        self.damping = damping      # velocity kept per step
+
+    def advance(self, t, rate, speed=1.0):
+        """Step to time t with `rate` drops per second; returns the displacement per LED."""
+        dt, steps = self._steps(t, speed)
+        u, v = self.u, self.v
+        for _ in range(steps):
+            v = self.damping * (v + self.stiffness * (self.graph.mix @ u - u))
+            u = u + v
+        drops = self.rng.poisson(rate * dt) if dt > 0 else 0
+        if drops:
+            np.add.at(u, self.rng.integers(0, self.graph.n, size=drops), 1.0)
+        self.u, self.v = u, v
+        return u
@@ -2,59 +2,33 @@
 import opc, time
 from colorsys import *
 from random import random
-import math
-numLEDs = 512
+import numpy as np
+import palettes
+import particles
+import topology
+tree = topology.load()
+numLEDs = tree.led_count
 client = opc.Client('treeled.local:7890')
 pixels = [(0,0,0)] * numLEDs
 
 t = 0
 
-blips = {}
+blips = particles.ParticleSystem(64)
 
 
-# vec3 palette( in float t, in vec3 a, in vec3 b, in vec3 c, in vec3 d )
-# {
-#     return a + b*cos( 6.283185*(c*t+d) );
-# }
-
-def palette( a, b, c, d):
-    return lambda t: tuple([255*(a[i] + b[i]*math.cos(6.283185*(c[i]*t+d[i]))) for i in range(3)])
-    # vec3                col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(1.0,1.0,1.0),vec3(0.0,0.33,0.67) );
-    # if( p.y>(1.0/7.0) ) col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(1.0,1.0,1.0),vec3(0.0,0.10,0.20) );
-    # if( p.y>(2.0/7.0) ) col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(1.0,1.0,1.0),vec3(0.3,0.20,0.20) );
-    # if( p.y>(3.0/7.0) ) col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(1.0,1.0,0.5),vec3(0.8,0.90,0.30) );
-    # if( p.y>(4.0/7.0) ) col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(1.0,0.7,0.4),vec3(0.0,0.15,0.20) );
-    # if( p.y>(5.0/7.0) ) col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(2.0,1.0,0.0),vec3(0.5,0.20,0.25) );
-    # if( p.y>(6.0/7.0) ) col = pal( p.x, vec3(0.8,0.5,0.4),vec3(0.2,0.4,0.2),vec3(2.0,1.0,1.0),vec3(0.0,0.25,0.25) );
-
-
-def pal1(t):
-    return palette((0.5,0.5,0.5), (0.5,0.5,0.5), (1.0,1.0,1.0), (0.0,0.33,0.67))(t)
-
-def pal2(t):
-    return palette((0.5,0.5,0.5), (0.5,0.5,0.5), (1.0,1.0,1.0), (0.0,0.10,0.20))(t)
-
-def pal3(t):
-    return palette((0.5,0.5,0.5), (0.5,0.5,0.5), (1.0,1.0,1.0), (0.3,0.20,0.20))(t)
-
-def pal4(t):
-    return palette((0.5,0.5,0.5), (0.5,0.5,0.5), (1.0,1.0,0.5), (0.8,0.90,0.30))(t)
-
-def pal5(t):
-    return palette((0.5,0.5,0.5), (0.5,0.5,0.5), (1.0,0.7,0.4), (0.0,0.15,0.20))(t)
-
+# palettes live in palettes.py; these are built once instead of per call
+pal1 = palettes.PRESETS["pal1"]
+pal2 = palettes.PRESETS["pal2"]
+pal3 = palettes.PRESETS["pal3"]
+pal4 = palettes.PRESETS["pal4"]
+pal5 = palettes.PRESETS["pal5"]
 # pink, aqua, blue, light green
-def pal6(t):
-    return palette((0.5,0.5,0.5), (0.5,0.5,0.5), (2.0,1.0,0.0), (0.5,0.20,0.25))(t)
-
-def pal7(t):
-    return palette((0.8,0.5,0.4), (0.2,0.4,0.2), (2.0,1.0,1.0), (0.0,0.25,0.25))(t)
+pal6 = palettes.PRESETS["pal6"]
+pal7 = palettes.PRESETS["pal7"]
+blue_palette = palettes.PRESETS["blue"]
 
-def blue_palette(t):
-    return palette((0,0,0), (0,0,0), (0.5, 0.5, 0.5), (0.5, 0.5, 0.5))(t)
-
-random_pixel = [tuple([int(random()*255) for i in range(3)]) for i in range(512)]
-random_hsv = [tuple([x*255 for x in hsv_to_rgb(random(), 1, 1)]) for i in range(512)]
+random_pixel = [tuple([int(random()*255) for i in range(3)]) for i in range(numLEDs)]
+random_hsv = [tuple([x*255 for x in hsv_to_rgb(random(), 1, 1)]) for i in range(numLEDs)]
 
 def random_palette(height, time, pixel):
     return random_hsv[pixel] #tuple([int(random()*255) for i in range(3)])
@@ -94,16 +68,9 @@ while True:
                     print(int(pixel))
                     pixels[int(pixel)] = col
 
-        for i in range(512):
-            if random() < 0.001 and i not in blips:
-                blips[i] = 10
-
-            if i in blips:
-                pixels[i] = [x*math.cos(blips[i]/10)*3 for x in (200,200,180)]
-                blips[i] -= 1
-
-                if blips[i] == 0:
-                    del blips[i]
-    client.put_pixels(pixels)
+        # ~0.1% of pixels per frame flash white and fade over ~10 frames
+        pixels = np.array(pixels, dtype=float)
+        particles.blips(blips, time.time(), pixels, rate=0.001 * numLEDs / 0.07, color=(600,600,540), life=0.7)
+    tree.put_pixels(client, pixels)
     time.sleep(0.07)
 
@@ -1,27 +1,28 @@
 #!/usr/bin/env python
 
 import opc, time
+import topology
 
-# colours are
-# GRB
+# colours are RGB
 
-numLEDs = 512
+tree = topology.load()
+numLEDs = tree.led_count
 client = opc.Client('treeled.local:7890')
 pixels = [(0,0,0)] * numLEDs
-client.put_pixels(pixels)
+tree.put_pixels(client, pixels)
 time.sleep(2)
 pixels = [(100,100,100)] * numLEDs
-client.put_pixels(pixels)
+tree.put_pixels(client, pixels)
 time.sleep(2)
 
 colors = [
-        (0,255,0),
-        (127,255,0),
-        (255,255,0),
         (255,0,0),
-        (150,0,150),
+        (255,127,0),
+        (255,255,0),
+        (0,255,0),
+        (0,150,150),
         (0,0,255),
-        (0,75,130),
+        (75,0,130),
         (100,100,100)
     ]
 
@@ -30,8 +31,8 @@ while True:
     for i in range(numLEDs):
         print(i)
         pixels = [(0,0,0)] * numLEDs
-        client.put_pixels(pixels)
+        tree.put_pixels(client, pixels)
         time.sleep(0.5)
         pixels[i] = (255,255,255)
-        client.put_pixels(pixels)
+        tree.put_pixels(client, pixels)
         time.sleep(0.5)
@@ -1,18 +1,20 @@
 
 import opc, time
+import topology
 
-numLEDs = 512
+tree = topology.load()
+numLEDs = tree.led_count
 client = opc.Client('treeled.local:7890')
 pixels = [(0,0,0)] * numLEDs
 
 colours = [
-        (0,255,0),
-        (127,255,0),
-        (255,255,0),
         (255,0,0),
-        (150,0,150),
+        (255,127,0),
+        (255,255,0),
+        (0,255,0),
+        (0,150,150),
         (0,0,255),
-        (0,75,130),
+        (75,0,130),
         (100,100,100)
     ]
 
@@ -23,5 +25,5 @@ while True:
             h,r,a = tuple(map(int, line.split('\t')))
             pixels[i] = colours[h]
 
-    client.put_pixels(pixels)
+    tree.put_pixels(client, pixels)
     time.sleep(2)
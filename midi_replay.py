@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+"""
+Record APC Mini sessions and replay them into the controller without hardware.
+
+    ./midi_replay.py record sweep.jsonl           # play the APC, Ctrl-C to stop
+    ./midi_replay.py replay sweep.jsonl           # same session, no APC or tree needed
+    ./midi_replay.py replay --sweep 48 --seconds 3 --fixed-fps
+
+A recording is one JSON object per line: {"t": seconds since start, "data":
+[raw MIDI bytes]}. Replay runs the real render thread from apc_tree_control
+with a FakeOPC sink in place of the OPC client and a VirtualAPC in place of
+the MIDI output port, and feeds each message through handle_message at its
+recorded time (scaled by --speed). --sweep CC instead synthesises a fader
+going 0 -> 127 -> 0 on that CC.
+
+Reported at the end:
+  * input-to-frame latency: from a message arriving to the first frame that
+    was rendered after it was handled leaving for OPC (p50/p95/p99/max),
+    split into faders and pads;
+  * frame intervals: gaps between frames sent, to show stutter;
+  * pad LED traffic: messages sent back to the APC in total, per second
+    (mean and worst second), and per input.
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+
+import mido
+
+import apc_tree_control as ctl
+import audio
+import input_hub
+
+
+class FakeOPC(object):
+    """Stands in for opc.Client: accepts everything, keeps counts, sends nothing."""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def put_pixels(self, pixels, channel=0):
+        return self.put_message(b"\0" * (4 + 3 * len(pixels)))
+
+    def put_pixel_bytes(self, data, channel=0):
+        return self.put_message(b"\0" * 4 + bytes(data))
+
+    def put_message(self, message):
+        self.messages += 1
+        self.bytes += len(message)
+        return True
+
+    def set_interpolation(self, enabled=True):
+        return True
+
+    def can_connect(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+
+class VirtualAPC(object):
+    """Stands in for the APC's MIDI output port and counts pad LED traffic."""
+
+    def __init__(self):
+        self.sent = []  # send times
+        self.types = Counter()
+        self._lock = threading.Lock()
+
+    def send(self, msg):
+        with self._lock:
+            self.sent.append(time.time())
+            self.types[msg.type] += 1
+
+    def count(self):
+        with self._lock:
+            return len(self.sent)
+
+
+def record(path):
+    in_name = input_hub.find_port(ctl.PORT_IN, mido.get_input_names())
+    if in_name is None:
+        raise SystemExit(f'No MIDI input containing "{ctl.PORT_IN}". Available: {mido.get_input_names()}')
+    print(f"Recording {in_name} to {path}, Ctrl-C to stop")
+    count = 0
+    with mido.open_input(in_name) as inp, open(path, "w") as f:
+        t0 = time.time()
+        try:
+            for msg in inp:
+                f.write(json.dumps({"t": round(time.time() - t0, 6), "data": msg.bytes()}) + "\n")
+                count += 1
+        except KeyboardInterrupt:
+            pass
+    print(f"Recorded {count} messages")
+
+
+def load(path):
+    events = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                events.append((event["t"], mido.Message.from_bytes(event["data"])))
+    return events
+
+
+def fader_sweep(cc, seconds, rate=100):
+    """A fader pushed up and back down over `seconds`, sending at `rate` messages/s."""
+    steps = max(2, int(seconds * rate))
+    events = []
+    for i in range(steps):
+        position = 1.0 - abs(2.0 * i / (steps - 1) - 1.0)
+        events.append((i / rate, mido.Message("control_change", control=cc, value=int(round(127 * position)))))
+    return events
+
+
+class Replay(object):
+
+    def __init__(self, events, speed=1.0, settle=0.5):
+        self.events = events
+        self.speed = speed
+        self.settle = settle
+        self.sink = FakeOPC()
+        self.apc = VirtualAPC()
+        self.handled = 0          # inputs applied so far; frames note this when they start rendering
+        self.inputs = []          # (arrived_at, kind, pad messages caused)
+        self.frames = []          # (sent_at, inputs handled before it started rendering)
+        self.duration = 0.0
+
+    def _render_and_send(self, t, _render_and_send=ctl.render_and_send):
+        handled = self.handled
+        frame = _render_and_send(t)
+        self.frames.append((time.time(), handled))
+        return frame
+
+    def run(self):
+        ctl.OPC_CLIENT = self.sink
+        ctl.MIDI_OUT["port"] = self.apc
+        ctl.render_and_send = self._render_and_send
+        started = time.time()
+        ctl.light_mode_buttons(self.apc)
+        ctl.refresh_grid(self.apc)
+
+        stop_event = threading.Event()
+        runner = threading.Thread(target=ctl.runner, args=(stop_event,), daemon=True)
+        runner.start()
+        time.sleep(self.settle)
+        t0 = time.time()
+        for t, msg in self.events:
+            time.sleep(max(0.0, t0 + t / self.speed - time.time()))
+            arrived = time.time()
+            before = self.apc.count()
+            ctl.handle_message(msg, self.apc)
+            self.inputs.append((arrived, "fader" if msg.type == "control_change" else "pad",
+                                self.apc.count() - before))
+            self.handled += 1
+        time.sleep(self.settle)
+        stop_event.set()
+        runner.join()
+        self.duration = time.time() - started
+        return self
+
+    def latencies(self):
+        """Per input: (kind, seconds until the first frame rendered after it was sent)."""
+        out = []
+        j = 0
+        for k, (arrived, kind, _) in enumerate(self.inputs):
+            while j < len(self.frames) and self.frames[j][1] <= k:
+                j += 1
+            if j < len(self.frames):
+                out.append((kind, self.frames[j][0] - arrived))
+        return out
+
+    def report(self):
+        lines = [f"replayed {len(self.inputs)} inputs, {len(self.frames)} frames, "
+                 f"{self.sink.messages} OPC messages ({self.sink.bytes / 1e3:.0f} kB)",
+                 ctl.FRAME_CACHE.report()]
+        latencies = self.latencies()
+        for kind in ("fader", "pad"):
+            values = [v for k, v in latencies if k == kind]
+            if values:
+                lines.append(f"{kind} -> frame latency  " + _percentiles(values))
+        gaps = [b[0] - a[0] for a, b in zip(self.frames, self.frames[1:])]
+        if gaps:
+            lines.append("frame interval        " + _percentiles(gaps))
+
+        sent = self.apc.sent
+        if sent:
+            worst = Counter(int(t - sent[0]) for t in sent).most_common(1)[0][1]
+            per_input = [n for _, _, n in self.inputs]
+            lines.append(f"pad LED messages      {len(sent)} total, {len(sent) / self.duration:.0f}/s mean, "
+                         f"{worst} in the worst second, "
+                         f"{sum(per_input) / max(1, len(per_input)):.1f} per input (max {max(per_input, default=0)})")
+            lines.append("  by type: " + ", ".join(f"{k} {v}" for k, v in self.apc.types.most_common()))
+        return "\n".join(lines)
+
+
+def _percentiles(values):
+    stats = audio.LatencyStats(size=len(values))
+    for v in values:
+        stats.add(v)
+    p50, p95, p99 = stats.percentiles()
+    return f"p50 {p50 * 1e3:.1f} ms  p95 {p95 * 1e3:.1f} ms  p99 {p99 * 1e3:.1f} ms  max {max(values) * 1e3:.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay APC Mini sessions against a fake tree")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="record the APC to a file")
+    rec.add_argument("path")
+    play = sub.add_parser("replay", help="replay a recording (or a synthetic sweep) and report latency")
+    play.add_argument("path", nargs="?")
+    play.add_argument("--sweep", type=int, metavar="CC", help="replay a synthetic fader sweep on this CC instead")
+    play.add_argument("--seconds", type=float, default=2.0, help="length of the synthetic sweep")
+    play.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    play.add_argument("--mode", type=int, help="start in this mode (0..%d)" % (ctl.NUM_MODES - 1))
+    play.add_argument("--fixed-fps", action="store_true", help=f"disable the adaptive rate (always {ctl.FPS} fps)")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.path)
+        return
+    if args.sweep is not None:
+        events = fader_sweep(args.sweep, args.seconds)
+    elif args.path:
+        events = load(args.path)
+    else:
+        parser.error("replay needs a recording or --sweep CC")
+    if args.mode is not None:
+        ctl.STATE["mode"] = args.mode
+    if args.fixed_fps:
+        ctl.RATE = None
+    print(Replay(events, speed=args.speed).run().report())
+
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,12 @@ import socket
 import struct
 import sys
 
+
+def pixel_message(data, channel=0):
+    """Build a complete "set pixel colors" OPC message from already-encoded pixel bytes."""
+    return struct.pack("BBBB", channel, 0, len(data) // 256, len(data) % 256) + bytes(data)
+
+
 class Client(object):
 
     def __init__(self, server_ip_port, long_connection=True, verbose=False):
@@ -178,6 +184,45 @@ class Client(object):
 
         return True
 
+    def put_pixel_bytes(self, data, channel=0):
+        """Send already-encoded pixel data to the OPC server on the given channel.
+
+        data: A bytes-like object of packed 8-bit color triples, exactly as they
+            should appear on the wire (no clamping or reordering is done).
+
+        Return True on success, False on failure, like put_pixels.
+
+        """
+        return self.put_message(pixel_message(data, channel))
+
+    def put_message(self, message):
+        """Send a complete, pre-built OPC message (header included).
+
+        Useful when the same message is sent repeatedly and can be cached.
+
+        Return True on success, False on failure, like put_pixels.
+
+        """
+        self._debug('put_message: connecting')
+        is_connected = self._ensure_connected()
+        if not is_connected:
+            self._debug('put_message: not connected.  ignoring this message.')
+            return False
+
+        self._debug('put_message: sending message to server')
+        try:
+            self._socket.sendall(message)
+        except socket.error:
+            self._debug('put_message: connection lost.  could not send message.')
+            self._socket = None
+            return False
+
+        if not self._long_connection:
+            self._debug('put_message: disconnecting')
+            self.disconnect()
+
+        return True
+
     def set_interpolation(self, enabled = True):
         """
         Enables or disables frame interpolation on runtime.
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+
+"""
+Local OPC multiplexer: lets several programs drive the tree at once.
+
+Clients (locate.py, simple.py, the APC controller, ...) connect to the mux
+instead of fcserver. Every connection is a layer holding the last frame it
+sent on each OPC channel. Once per tick the layers are merged, lowest
+priority first, and the result goes to fcserver as one stream over a single
+persistent connection:
+
+    ./opc_mux.py --listen 7892 --listen 7893:10 --upstream 127.0.0.1:7890 --fps 50
+
+Each --listen PORT[:PRIORITY[:START-STOP[:MODE]]] sets the defaults for
+layers connecting on that port. START-STOP is a range of wire pixels
+(stop exclusive); the layer only touches pixels in that range. MODE is one
+of:
+
+  * over: replace what lower layers drew (the default)
+  * add: saturating add on top
+  * max: per-channel maximum
+
+A client can also set its own layer by sending layer_message() as a
+sysex first:
+
+    client.put_message(opc_mux.layer_message(priority=10, start=0, stop=64, mode="add"))
+
+A connected client's last frame stays up until it disconnects, however long
+it sleeps between frames; after disconnecting it stays for --hold seconds,
+then drops out so a script that exits stops covering the others. Every
+connection gets its own layer. Short-connection clients
+(long_connection=False) keep one layer across reconnects by naming it: send
+layer_message(..., client_id="locate") together with each frame, e.g.
+
+    client.put_message(opc_mux.layer_message(client_id="locate") + opc.pixel_message(data))
+
+Other sysex messages, e.g. Fadecandy interpolation settings, are forwarded
+upstream as they arrive.
+"""
+
+import argparse
+import itertools
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+
+import opc
+
+DEFAULT_PORT = 7892
+DEFAULT_HOLD = 1.0
+LAYER_SYSTEM_ID = 0x7E01  # sysex system id for layer settings (Fadecandy uses 0x0001)
+LAYER = struct.Struct(">HhHHB")  # system id, priority, start, stop (0xFFFF = end), mode; then optional utf-8 client id
+MODES = ("over", "add", "max")
+REPORT_EVERY = 10.0
+
+
+def layer_message(priority=0, start=0, stop=None, mode="over", channel=0, client_id=None):
+    """OPC sysex that sets the sending connection's layer.
+
+    client_id names the layer, so later connections sending the same id draw on it again.
+    """
+    body = LAYER.pack(LAYER_SYSTEM_ID, priority, start, 0xFFFF if stop is None else stop, MODES.index(mode))
+    if client_id:
+        body += client_id.encode("utf-8")
+    return struct.pack(">BBH", channel, 0xFF, len(body)) + body
+
+
+def parse_listen(spec):
+    """PORT[:PRIORITY[:START-STOP[:MODE]]] -> (port, layer defaults)."""
+    fields = spec.split(":")
+    settings = {"priority": 0, "start": 0, "stop": None, "mode": "over"}
+    if len(fields) > 1 and fields[1]:
+        settings["priority"] = int(fields[1])
+    if len(fields) > 2 and fields[2]:
+        start, _, stop = fields[2].partition("-")
+        settings["start"] = int(start or 0)
+        settings["stop"] = int(stop) if stop else None
+    if len(fields) > 3:
+        if fields[3] not in MODES:
+            raise ValueError(f"layer mode must be one of {MODES}")
+        settings["mode"] = fields[3]
+    return int(fields[0]), settings
+
+
+class Layer(object):
+
+    def __init__(self, key, order, priority=0, start=0, stop=None, mode="over"):
+        self.key = key
+        self.order = order  # connection order breaks priority ties: newer on top
+        self.priority = priority
+        self.start = start
+        self.stop = stop
+        self.mode = mode
+        self.client_id = None
+        self.frames = {}  # OPC channel -> uint8 wire bytes
+        self.updated = 0.0
+        self.connected = True
+
+    def live(self, now, hold):
+        """Drawn while connected, and for hold seconds after disconnecting."""
+        return bool(self.frames) and (self.connected or now - self.updated <= hold)
+
+
+class Mux(object):
+
+    def __init__(self, upstream, fps=50, hold=DEFAULT_HOLD):
+        self.upstream = upstream
+        self.fps = fps
+        self.hold = hold
+        self.layers = []
+        self.stats = {"frames_in": 0, "frames_out": 0, "sysex": 0}
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._live = ()
+        self._message = b""
+        self._sizes = {}  # every channel seen -> bytes, so it goes dark when its layers drop out
+        self._sysex = []  # queued for the send loop, which owns the upstream connection
+
+    def connect(self, key, settings):
+        """A new layer for a new connection."""
+        with self._lock:
+            layer = Layer(key, next(self._order), **settings)
+            self.layers.append(layer)
+            return layer
+
+    def disconnect(self, layer):
+        with self._lock:
+            layer.connected = False
+            layer.updated = time.time()  # hold counts from here
+
+    def _claim(self, layer, client_id):
+        # A named connection takes over the disconnected layer with its name, if there is one.
+        for other in self.layers:
+            if other is not layer and other.client_id == client_id and not other.connected:
+                other.connected = True
+                other.key = layer.key
+                other.frames.update(layer.frames)
+                self.layers.remove(layer)
+                return other
+        layer.client_id = client_id
+        return layer
+
+    def receive(self, layer, channel, command, data):
+        """Apply one message from a connection; returns the layer its next messages go to."""
+        if command == 0:
+            with self._lock:
+                layer.frames[channel] = np.frombuffer(data, dtype=np.uint8)
+                layer.updated = time.time()
+                self._dirty = True
+                self.stats["frames_in"] += 1
+        elif command == 0xFF and len(data) >= 2:
+            if struct.unpack_from(">H", data)[0] == LAYER_SYSTEM_ID and len(data) >= LAYER.size:
+                _, priority, start, stop, mode = LAYER.unpack_from(data)
+                client_id = data[LAYER.size:].decode("utf-8", "replace")
+                with self._lock:
+                    if client_id and client_id != layer.client_id:
+                        layer = self._claim(layer, client_id)
+                    layer.priority, layer.start = priority, start
+                    layer.stop = None if stop == 0xFFFF else stop
+                    layer.mode = MODES[mode] if mode < len(MODES) else "over"
+                    self._dirty = True
+            else:
+                with self._lock:
+                    self.stats["sysex"] += 1
+                    self._sysex.append(struct.pack(">BBH", channel, command, len(data)) + data)
+        return layer
+
+    def merge(self, now=None):
+        """Combined OPC messages for every channel drawn on so far (black where no live layer)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            live = [l for l in self.layers if l.live(now, self.hold)]
+            self.layers = [l for l in self.layers if l.connected or l in live]
+            ids = tuple(l.order for l in live)
+            if not self._dirty and ids == self._live:
+                return self._message
+            self._dirty = False
+            self._live = ids
+            live.sort(key=lambda l: (l.priority, l.order))
+            for l in live:
+                for channel, data in l.frames.items():
+                    self._sizes[channel] = max(len(data), self._sizes.get(channel, 0))
+            messages = []
+            for channel, size in sorted(self._sizes.items()):
+                out = np.zeros(size, dtype=np.uint8)
+                for l in live:
+                    data = l.frames.get(channel)
+                    if data is None:
+                        continue
+                    lo = min(len(data), l.start * 3)
+                    hi = len(data) if l.stop is None else min(len(data), l.stop * 3)
+                    if lo >= hi:
+                        continue
+                    if l.mode == "add":
+                        out[lo:hi] = np.minimum(255, out[lo:hi].astype(np.uint16) + data[lo:hi])
+                    elif l.mode == "max":
+                        np.maximum(out[lo:hi], data[lo:hi], out=out[lo:hi])
+                    else:
+                        out[lo:hi] = data[lo:hi]
+                messages.append(opc.pixel_message(out.tobytes(), channel))
+            self._message = b"".join(messages)
+            return self._message
+
+    def run(self, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        period = 1.0 / self.fps
+        next_tick = time.time()
+        next_report = next_tick + REPORT_EVERY
+        while not stop_event.is_set():
+            with self._lock:
+                sysex, self._sysex = self._sysex, []
+            for message in sysex:
+                self.upstream.put_message(message)
+            message = self.merge()
+            if message and self.upstream.put_message(message):
+                self.stats["frames_out"] += 1
+            now = time.time()
+            if now >= next_report:
+                next_report = now + REPORT_EVERY
+                print(self.report())
+            next_tick += period
+            if next_tick < now:
+                next_tick = now
+            time.sleep(max(0.0, next_tick - time.time()))
+
+    def report(self):
+        with self._lock:
+            now = time.time()
+            layers = ", ".join(
+                f"{l.client_id or l.key[1]}:{l.key[0]} p{l.priority} {l.mode}"
+                f"{'' if l.connected else ' (disconnected)'}"
+                for l in sorted(self.layers, key=lambda l: (l.priority, l.order))) or "none"
+        s = self.stats
+        return f"mux: {s['frames_in']} frames in, {s['frames_out']} out, {s['sysex']} sysex; layers: {layers}"
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    mux = None
+    settings = None
+
+    def handle(self):
+        port = self.server.server_address[1]
+        layer = self.mux.connect((port, self.client_address[0]), dict(self.settings))
+        f = self.request.makefile("rb")
+        try:
+            while True:
+                header = f.read(4)
+                if len(header) < 4:
+                    break
+                channel, command, length = struct.unpack(">BBH", header)
+                data = f.read(length)
+                if len(data) < length:
+                    break
+                layer = self.mux.receive(layer, channel, command, data)
+        except OSError:
+            pass
+        finally:
+            self.mux.disconnect(layer)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True  # restart straight away after a crash
+    daemon_threads = True
+
+
+def serve(mux, port, settings, host=""):
+    handler = type("Handler", (_Handler,), {"mux": mux, "settings": settings})
+    server = _Server((host, port), handler)
+    threading.Thread(target=server.serve_forever, name=f"mux-{port}", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge several OPC clients into one stream to fcserver")
+    parser.add_argument("--listen", action="append", metavar="PORT[:PRIORITY[:START-STOP[:MODE]]]",
+                        help=f"port to accept OPC clients on, with layer defaults (default {DEFAULT_PORT})")
+    parser.add_argument("--upstream", default="127.0.0.1:7890", help="fcserver address")
+    parser.add_argument("--fps", type=float, default=50, help="rate the merged stream is sent at")
+    parser.add_argument("--hold", type=float, default=DEFAULT_HOLD,
+                        help="seconds a layer stays after its client disconnects")
+    args = parser.parse_args()
+
+    mux = Mux(opc.Client(args.upstream), fps=args.fps, hold=args.hold)
+    for spec in args.listen or [str(DEFAULT_PORT)]:
+        port, settings = parse_listen(spec)
+        serve(mux, port, settings)
+        print(f"Accepting OPC clients on :{port} as priority {settings['priority']} "
+              f"{settings['mode']} layers, pixels {settings['start']}-{settings['stop'] or 'end'}")
+    print(f"Sending merged frames to {args.upstream} at {args.fps:g} fps")
+    try:
+        mux.run()
+    except KeyboardInterrupt:
+        print(mux.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compiled output mapping: logical RGB frame -> wire bytes for the LED strips.
+
+Effects render in plain RGB, one entry per *logical* pixel. The physical
+wiring differs: the strips want GRB, some strips are mounted backwards, a
+few LEDs are dead and should be skipped, and the frame may be shorter or
+longer than the string. All of that is folded into one index table at
+startup, so each frame costs a single numpy gather:
+
+    out = OutputMap(512, color_order="GRB", strips=[(64, False)] * 8)
+    client.put_pixel_bytes(out.apply(frame))
+"""
+
+import numpy as np
+
+DEFAULT_COLOR_ORDER = "GRB"
+
+
+def compile_table(strips, color_order=DEFAULT_COLOR_ORDER, dead=()):
+    """Build the byte-level gather table.
+
+    strips: list of (length, reversed) in physical wiring order.
+    dead: physical LED indices to leave dark; no logical pixel is spent on them.
+
+    Returns (table, logical_count). table[k] is the index of the source byte for
+    output byte k, in a flattened logical frame with one extra zero byte on the end
+    (index logical_count * 3) used for dead LEDs.
+    """
+    color_order = color_order.upper()
+    if sorted(color_order) != sorted("RGB"):
+        raise ValueError(f"color_order must be a permutation of RGB, got {color_order!r}")
+    dead = set(dead)
+
+    physical_count = sum(length for length, _ in strips)
+    source = np.full(physical_count, -1, dtype=np.intp)
+    logical = 0
+    start = 0
+    for length, reverse in strips:
+        positions = range(start, start + length)
+        for p in (reversed(positions) if reverse else positions):
+            if p in dead:
+                continue
+            source[p] = logical
+            logical += 1
+        start += length
+
+    channels = np.array(["RGB".index(c) for c in color_order], dtype=np.intp)
+    table = source[:, None] * 3 + channels[None, :]
+    table[source < 0] = logical * 3
+    return table.reshape(-1), logical
+
+
+class OutputMap(object):
+
+    def __init__(self, led_count, color_order=DEFAULT_COLOR_ORDER, strips=None, dead=()):
+        """Compile a mapping for led_count physical LEDs.
+
+        strips defaults to a single forward strip of led_count LEDs; when given,
+        the strip lengths must add up to led_count.
+        """
+        if strips is None:
+            strips = [(led_count, False)]
+        if sum(length for length, _ in strips) != led_count:
+            raise ValueError("strip lengths do not add up to led_count")
+        self.led_count = led_count
+        self.color_order = color_order
+        self.table, self.logical_count = compile_table(strips, color_order, dead)
+        # Logical pixel shown on each physical LED, -1 for dead ones.
+        first = self.table[::3]
+        self.source = np.where(first == self.logical_count * 3, -1, first // 3)
+        # Flattened logical frame plus the trailing zero byte for dead LEDs.
+        self._src = np.zeros(self.logical_count * 3 + 1, dtype=np.uint8)
+        self._out = np.empty(len(self.table), dtype=np.uint8)
+
+    def apply(self, frame):
+        """Map a logical frame (N x 3 array or list of RGB tuples) to wire bytes.
+
+        Short frames are padded with black, long frames are truncated and values
+        are clamped to 0-255, matching what opc.Client.put_pixels would do.
+        """
+        flat = np.asarray(frame).reshape(-1)
+        n = min(len(flat), self.logical_count * 3)
+        src = self._src
+        if flat.dtype == np.uint8:
+            src[:n] = flat[:n]
+        else:
+            np.clip(flat[:n], 0, 255, out=src[:n], casting="unsafe")
+        src[n:-1] = 0
+        np.take(src, self.table, out=self._out)
+        return self._out.tobytes()
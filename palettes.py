@@ -0,0 +1,84 @@
+"""
+Cosine gradient palettes (https://iquilezles.org/articles/palettes/).
+
+    colour(t) = 255 * (a + b * cos(2pi * (c * t + d)))
+
+with a, b, c, d given per RGB channel. A CosinePalette is built once and then
+evaluated over whole arrays of positions, or baked into a lookup table so a
+frame costs one index computation and one gather.
+
+    pal = PRESETS["pal6"]
+    lut = pal.bake()
+    frame = pal.lookup(t / 100 + np.arange(512) / 50)
+"""
+
+import math
+from fractions import Fraction
+
+import numpy as np
+
+LUT_SIZE = 1024
+
+
+def _period(c):
+    # Smallest span of t after which every channel repeats, so a baked LUT can
+    # wrap seamlessly. Channels with c == 0 are constant and don't matter.
+    period = 1
+    for value in c:
+        if value:
+            period = math.lcm(period, Fraction(value).limit_denominator(100).denominator)
+    return float(period)
+
+
+class CosinePalette(object):
+
+    def __init__(self, a, b, c, d):
+        self.a = np.asarray(a, dtype=float)
+        self.b = np.asarray(b, dtype=float)
+        self.c = np.asarray(c, dtype=float)
+        self.d = np.asarray(d, dtype=float)
+        self.period = _period(c)
+        self._scalar = list(zip(a, b, c, d))
+        self._lut = None
+
+    def __call__(self, t):
+        """Evaluate at t. Scalars give an RGB tuple, arrays give an (N, 3) array; 0-255 floats."""
+        if np.ndim(t) == 0:
+            return tuple(255 * (a + b * math.cos(math.tau * (c * t + d))) for a, b, c, d in self._scalar)
+        t = np.asarray(t, dtype=float)[..., None]
+        return 255 * (self.a + self.b * np.cos(math.tau * (self.c * t + self.d)))
+
+    def bake(self, size=LUT_SIZE):
+        """Sample one full period into a (size, 3) uint8 table; cached after the first call."""
+        if self._lut is None or len(self._lut) != size:
+            t = np.arange(size) * (self.period / size)
+            self._lut = np.clip(self(t), 0, 255).astype(np.uint8)
+        return self._lut
+
+    def lookup(self, t, size=LUT_SIZE):
+        """Like calling the palette on an array, but via the baked table (nearest entry)."""
+        lut = self.bake(size)
+        idx = (np.asarray(t) * (size / self.period)).astype(np.intp) % size
+        return lut[idx]
+
+
+# The shader palettes these came from:
+# vec3                col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(1.0,1.0,1.0),vec3(0.0,0.33,0.67) );
+# if( p.y>(1.0/7.0) ) col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(1.0,1.0,1.0),vec3(0.0,0.10,0.20) );
+# if( p.y>(2.0/7.0) ) col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(1.0,1.0,1.0),vec3(0.3,0.20,0.20) );
+# if( p.y>(3.0/7.0) ) col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(1.0,1.0,0.5),vec3(0.8,0.90,0.30) );
+# if( p.y>(4.0/7.0) ) col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(1.0,0.7,0.4),vec3(0.0,0.15,0.20) );
+# if( p.y>(5.0/7.0) ) col = pal( p.x, vec3(0.5,0.5,0.5),vec3(0.5,0.5,0.5),vec3(2.0,1.0,0.0),vec3(0.5,0.20,0.25) );
+# if( p.y>(6.0/7.0) ) col = pal( p.x, vec3(0.8,0.5,0.4),vec3(0.2,0.4,0.2),vec3(2.0,1.0,1.0),vec3(0.0,0.25,0.25) );
+PRESETS = {
+    "pal1": CosinePalette((0.5, 0.5, 0.5), (0.5, 0.5, 0.5), (1.0, 1.0, 1.0), (0.0, 0.33, 0.67)),
+    "pal2": CosinePalette((0.5, 0.5, 0.5), (0.5, 0.5, 0.5), (1.0, 1.0, 1.0), (0.0, 0.10, 0.20)),
+    "pal3": CosinePalette((0.5, 0.5, 0.5), (0.5, 0.5, 0.5), (1.0, 1.0, 1.0), (0.3, 0.20, 0.20)),
+    "pal4": CosinePalette((0.5, 0.5, 0.5), (0.5, 0.5, 0.5), (1.0, 1.0, 0.5), (0.8, 0.90, 0.30)),
+    "pal5": CosinePalette((0.5, 0.5, 0.5), (0.5, 0.5, 0.5), (1.0, 0.7, 0.4), (0.0, 0.15, 0.20)),
+    # pink, aqua, blue, light green
+    "pal6": CosinePalette((0.5, 0.5, 0.5), (0.5, 0.5, 0.5), (2.0, 1.0, 0.0), (0.5, 0.20, 0.25)),
+    "pal7": CosinePalette((0.8, 0.5, 0.4), (0.2, 0.4, 0.2), (2.0, 1.0, 1.0), (0.0, 0.25, 0.25)),
+    "blue": CosinePalette((0, 0, 0), (0, 0, 0), (0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
+}
+PRESET_NAMES = list(PRESETS)
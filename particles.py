@@ -0,0 +1,165 @@
+"""
+Struct-of-arrays particle engine.
+
+Particles live in fixed-capacity arrays (position, velocity, age, life, color)
+with a free-list of unused slots and a compact array of active slots, so
+spawning, updating and killing only ever touch the active particles. Positions
+are either 1D (LED index along the strip) or 3D (same space as
+geometry.load_xyz). splat_strip/splat_points add the particles onto an
+(N, 3) float frame.
+
+The snow/embers/blips helpers at the bottom are the effects the controller
+uses; each one spawns, updates and splats in a few vectorized calls.
+"""
+
+import numpy as np
+
+MAX_DT = 0.1
+
+
+class ParticleSystem(object):
+
+    def __init__(self, capacity, dims=1, seed=None):
+        self.capacity = capacity
+        self.dims = dims
+        self.pos = np.zeros((capacity, dims))
+        self.vel = np.zeros((capacity, dims))
+        self.age = np.zeros(capacity)
+        self.life = np.ones(capacity)
+        self.color = np.zeros((capacity, 3))
+        # Free-list as a stack: free[:n_free] are the unused slots.
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.intp)
+        self.n_free = capacity
+        self.active = np.empty(0, dtype=np.intp)
+        self.rng = np.random.default_rng(seed)
+        self._last_t = None
+
+    def __len__(self):
+        return len(self.active)
+
+    def spawn(self, count, pos, vel=0.0, color=(255, 255, 255), life=1.0):
+        """Spawn up to count particles; arguments broadcast against (count, ...).
+
+        Silently spawns fewer if the system is full. Returns the slot indices used.
+        """
+        count = min(int(count), self.n_free)
+        if count <= 0:
+            return np.empty(0, dtype=np.intp)
+        self.n_free -= count
+        idx = self.free[self.n_free:self.n_free + count].copy()
+        self.pos[idx] = np.broadcast_to(pos, (count, self.dims))
+        self.vel[idx] = np.broadcast_to(vel, (count, self.dims))
+        self.color[idx] = np.broadcast_to(color, (count, 3))
+        self.life[idx] = np.broadcast_to(life, (count,))
+        self.age[idx] = 0.0
+        self.active = np.concatenate([self.active, idx])
+        return idx
+
+    def kill(self, mask):
+        """Kill the active particles selected by a boolean mask over self.active."""
+        dead = self.active[mask]
+        if not len(dead):
+            return
+        self.free[self.n_free:self.n_free + len(dead)] = dead
+        self.n_free += len(dead)
+        self.active = self.active[~mask]
+
+    def update(self, t, accel=None, drag=0.0):
+        """Advance active particles to time t; returns the dt that was applied.
+
+        Particles whose age reaches their life are freed.
+        """
+        dt = 0.0 if self._last_t is None else min(MAX_DT, max(0.0, t - self._last_t))
+        self._last_t = t
+        a = self.active
+        if len(a) and dt > 0:
+            if accel is not None:
+                self.vel[a] += np.asarray(accel) * dt
+            if drag:
+                self.vel[a] *= max(0.0, 1.0 - drag * dt)
+            self.pos[a] += self.vel[a] * dt
+            self.age[a] += dt
+            self.kill(self.age[a] >= self.life[a])
+        return dt
+
+    def intensity(self):
+        """Linear fade over each active particle's life, 1 at birth to 0 at death."""
+        a = self.active
+        return np.clip(1.0 - self.age[a] / self.life[a], 0.0, 1.0)
+
+    def splat_strip(self, frame):
+        """Add 1D particles onto frame, split linearly between the two nearest LEDs."""
+        a = self.active
+        if not len(a):
+            return frame
+        n = len(frame)
+        x = self.pos[a, 0]
+        lo = np.floor(x)
+        w_hi = x - lo
+        lo = lo.astype(np.intp)
+        rgb = self.color[a] * self.intensity()[:, None]
+        for idx, w in ((lo, 1.0 - w_hi), (lo + 1, w_hi)):
+            ok = (idx >= 0) & (idx < n)
+            np.add.at(frame, idx[ok], rgb[ok] * w[ok, None])
+        return frame
+
+    def splat_points(self, frame, coords, radius):
+        """Add 3D particles onto frame using a linear falloff over radius.
+
+        coords is the (N, 3) LED position array. Cost is active x N, which stays
+        cheap as long as particle counts are in the tens to low hundreds.
+        """
+        a = self.active
+        if not len(a):
+            return frame
+        d = np.sqrt(((coords[None, :, :] - self.pos[a][:, None, :]) ** 2).sum(axis=2))
+        weight = np.clip(1.0 - d / radius, 0.0, None)
+        rgb = self.color[a] * self.intensity()[:, None]
+        frame += weight.T @ rgb
+        return frame
+
+
+def _poisson_count(system, rate, dt):
+    return system.rng.poisson(rate * dt) if rate * dt > 0 else 0
+
+
+def _spawn_xy(system, coords, k):
+    # Pick existing LEDs' x/y so particles start somewhere on the tree.
+    return coords[system.rng.integers(0, len(coords), k), :2]
+
+
+def snow(system, coords, t, frame, rate, color, radius=0.08):
+    """Flakes drift down from the top of the tree and vanish at the bottom."""
+    dt = system.update(t)
+    k = _poisson_count(system, rate, dt)
+    if k:
+        rng = system.rng
+        pos = np.column_stack([_spawn_xy(system, coords, k), np.full(k, 1.0 + radius)])
+        vel = np.column_stack([rng.normal(0.0, 0.02, (k, 2)), -rng.uniform(0.1, 0.25, k)])
+        system.spawn(k, pos, vel, color, life=20.0)
+    system.kill(system.pos[system.active, 2] < -radius)
+    return system.splat_points(frame, coords, radius)
+
+
+def embers(system, coords, t, frame, rate, color, radius=0.06):
+    """Sparks rise from the base, wobble sideways and burn out."""
+    dt = system.update(t, accel=(0.0, 0.0, 0.15))
+    if len(system) and dt:
+        system.vel[system.active, :2] += system.rng.normal(0.0, 0.3 * dt, (len(system), 2))
+    k = _poisson_count(system, rate, dt)
+    if k:
+        rng = system.rng
+        pos = np.column_stack([_spawn_xy(system, coords, k), np.zeros(k)])
+        vel = np.column_stack([np.zeros((k, 2)), rng.uniform(0.1, 0.4, k)])
+        system.spawn(k, pos, vel, color, life=rng.uniform(0.8, 2.5, k))
+    return system.splat_points(frame, coords, radius)
+
+
+def blips(system, t, frame, rate, color, life=0.7):
+    """Single LEDs flash up and fade, scattered at random along the strip."""
+    dt = system.update(t)
+    k = _poisson_count(system, rate, dt)
+    if k:
+        pos = system.rng.integers(0, len(frame), k)[:, None].astype(float)
+        system.spawn(k, pos, 0.0, color, life)
+    return system.splat_strip(frame)
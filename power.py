@@ -0,0 +1,145 @@
+"""
+Power budget limiter for the output path.
+
+WS2812-style LEDs draw roughly ma_per_channel milliamps per colour channel
+at full level, plus idle_ma per LED even when dark. Before a frame is
+encoded, PowerLimiter estimates the current for each strip and for the
+whole tree. It uses a single cumulative sum over the per-LED channel totals,
+so the cost is the same for any number of strips. If the estimate is over
+budget, the frame is scaled down:
+
+  * "global": one factor for the whole tree, small enough to keep the total
+    and every strip within limits (the look stays balanced);
+  * "strip": each strip is scaled to its own limit, then the total is
+    capped (only the overloaded strips dim).
+
+Scaling down takes effect on the same frame, so the supply is never asked
+for more than the budget. Recovery is eased over a few frames so limiting
+doesn't visibly pump.
+
+fcserver applies its gamma curve (config.json "color": {"gamma": 2.5}) to
+the 8-bit values it is sent, so current goes with (value / 255) ** gamma,
+not with the value itself. The estimate looks every level up in a 256-entry
+table of that curve, and a scale s in current becomes s ** (1 / gamma) on
+the values. The limits come from the "power" section of topology.json; its
+"gamma" defaults to fcserver's:
+
+    "power": {"budget_amps": 20.0, "strip_amps": 3.5, "mode": "global",
+              "ma_per_channel": 20.0, "idle_ma": 1.0, "gamma": 2.5}
+
+metrics() returns the latest estimate (amps before and after limiting, per
+strip, current scale) for logging or the preview server's /metrics.json.
+"""
+
+import numpy as np
+
+import color_correction
+
+MODES = ("global", "strip")
+MA_PER_CHANNEL = 20.0
+IDLE_MA = 1.0
+RELEASE = 0.05  # per-frame easing back towards full brightness
+
+
+class PowerLimiter(object):
+
+    def __init__(self, strips, budget_amps, strip_amps=None, mode="global",
+                 ma_per_channel=MA_PER_CHANNEL, idle_ma=IDLE_MA, release=RELEASE, gamma=1.0):
+        """strips: topology strip dicts (logical_start, logical_count, length).
+
+        gamma: the curve fcserver applies to the values before they reach the LEDs.
+        """
+        if mode not in MODES:
+            raise ValueError(f"power mode must be one of {MODES}")
+        self.budget = float(budget_amps)
+        self.strip_limit = None if strip_amps is None else float(strip_amps)
+        self.mode = mode
+        self.release = release
+        self.gamma = float(gamma)
+        # Amps drawn by one channel at each 8-bit value.
+        self.amps = (np.arange(256) / 255.0) ** self.gamma * ma_per_channel / 1000.0
+        self.starts = np.array([s["logical_start"] for s in strips], dtype=np.intp)
+        self.stops = self.starts + np.array([s["logical_count"] for s in strips], dtype=np.intp)
+        # Dead LEDs still draw idle current.
+        self.idle = np.array([s["length"] for s in strips], dtype=float) * idle_ma / 1000.0
+        self.led_strip = np.repeat(np.arange(len(strips)), self.stops - self.starts)
+        self.scale = np.ones(len(strips)) if mode == "strip" else 1.0
+        self.limited_frames = 0
+        self._metrics = {"amps": 0.0, "limited_amps": 0.0, "scale": 1.0,
+                         "strip_amps": [0.0] * len(strips), "limited_frames": 0}
+
+    @classmethod
+    def from_description(cls, strips, description):
+        if not description:
+            return None
+        return cls(strips, description["budget_amps"], description.get("strip_amps"),
+                   mode=description.get("mode", "global"),
+                   ma_per_channel=description.get("ma_per_channel", MA_PER_CHANNEL),
+                   idle_ma=description.get("idle_ma", IDLE_MA),
+                   gamma=description.get("gamma", color_correction.fcserver_gamma()))
+
+    def estimate(self, frame):
+        """Estimated amps per strip for a logical (N, 3) frame already clipped to 0..255."""
+        amps = self.amps[frame.astype(np.intp)].sum(axis=1)  # truncated, as the output maps do
+        totals = np.concatenate(([0.0], np.cumsum(amps)))
+        return totals[self.stops] - totals[self.starts] + self.idle
+
+    def target(self, strip_amps):
+        """Scale factor(s) on the current that bring the given load within budget."""
+        lit = np.maximum(strip_amps - self.idle, 1e-9)  # only the lit part scales
+        if self.strip_limit is not None:
+            per_strip = np.clip((self.strip_limit - self.idle) / lit, 0.0, 1.0)
+        else:
+            per_strip = np.ones(len(strip_amps))
+        if self.mode == "global":
+            scale = min(1.0, per_strip.min(), (self.budget - self.idle.sum()) / lit.sum())
+            return max(0.0, scale)
+        scaled = lit * per_strip
+        total = min(1.0, max(0.0, (self.budget - self.idle.sum()) / max(scaled.sum(), 1e-9)))
+        return per_strip * total
+
+    def apply(self, frame, smooth=True):
+        """Return the frame, clipped to 0..255 and scaled to stay within budget.
+
+        With smooth=False the scale is exactly what this frame needs and the
+        easing state is left alone, for frames that are cached and replayed.
+        """
+        frame = np.clip(np.asarray(frame, dtype=float), 0, 255)
+        strip_amps = self.estimate(frame)
+        target = self.target(strip_amps)
+        if smooth:
+            # Drop at once, recover gently.
+            eased = self.scale + self.release * (target - self.scale)
+            self.scale = np.minimum(target, eased) if self.mode == "strip" else min(target, eased)
+            scale = self.scale
+        else:
+            scale = target
+        if np.all(np.asarray(scale) >= 1.0):
+            limited = strip_amps
+            out = frame
+        else:
+            self.limited_frames += 1
+            limited = self.idle + (strip_amps - self.idle) * scale
+            # Current scales with value ** gamma, so the values scale by the root.
+            value_scale = np.asarray(scale) ** (1.0 / self.gamma)
+            out = frame * (value_scale if self.mode == "global" else value_scale[self.led_strip][:, None])
+        self._metrics = {
+            "amps": float(strip_amps.sum()),
+            "limited_amps": float(np.sum(limited)),
+            "scale": float(np.min(scale)),
+            "strip_amps": [round(float(a), 3) for a in strip_amps],
+            "limited_frames": self.limited_frames,
+        }
+        return out
+
+    def metrics(self):
+        return self._metrics
+
+    def record(self, metrics):
+        """Make metrics() report a frame that was limited earlier and is being resent."""
+        self._metrics = dict(metrics, limited_frames=self.limited_frames)
+
+    def report(self):
+        m = self._metrics
+        return (f"power: {m['amps']:.1f} A wanted, {m['limited_amps']:.1f} A sent of {self.budget:g} A, "
+                f"scale {m['scale']:.2f}, limited {m['limited_frames']} frames")
@@ -0,0 +1,190 @@
+"""
+Browser live preview of what is being sent to the tree.
+
+A small stdlib HTTP server serves preview.html, the LED layout (3D position of
+every physical LED in wire order), optional /metrics.json and a WebSocket at /frames. The controller
+hands each channel's wire bytes to tap() straight after sending them to OPC;
+tap only keeps a reference to that bytes object, so the render path pays
+nothing extra. Each connected browser gets its own sender thread that wakes
+at the fps the page asked for (?fps=, capped at MAX_FPS), and sends either a
+keyframe or a delta of just the LEDs that changed since its last frame:
+
+    keyframe: 0x00, then 3 bytes per LED (wire colour order)
+    delta:    0x01, then (uint16 LE index, 3 colour bytes) per changed LED
+
+    PREVIEW = preview.PreviewServer(8080, TOPOLOGY, LED_XYZ).start()
+    TOPOLOGY.put_pixels(OPC_CLIENT, frame, tap=PREVIEW.tap)
+"""
+
+import base64
+import hashlib
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PREVIEW_HTML = os.path.join(HERE, "preview.html")
+DEFAULT_FPS = 15
+MAX_FPS = 30
+KEYFRAME_EVERY = 5.0  # seconds; resync in case a browser missed something
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class PreviewServer(object):
+
+    def __init__(self, port, topology, xyz, host="", metrics=None):
+        self.port = port
+        self.metrics = metrics  # callable returning a JSON-able dict, served at /metrics.json
+        self.host = host
+        self.layout = json.dumps({
+            "color_order": topology.color_order,
+            "positions": topology.physical_positions(xyz),
+        }).encode()
+        self.order = [channel for channel, _, _, _ in topology.channels]
+        self.latest = {}  # channel -> wire bytes last sent
+        self.seq = 0
+        self.clients = 0
+        self._server = None
+
+    def tap(self, channel, data):
+        self.latest[channel] = data
+        if channel == self.order[-1]:
+            self.seq += 1
+
+    def frame(self):
+        """(seq, (N, 3) uint8 view) of the newest complete frame in wire order."""
+        seq = self.seq
+        parts = [self.latest.get(channel, b"") for channel in self.order]
+        data = parts[0] if len(parts) == 1 else b"".join(parts)
+        return seq, np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+
+    def start(self):
+        preview = self
+
+        class Handler(_Handler):
+            server_preview = preview
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="preview", daemon=True).start()
+        print(f"Live preview on http://{socket.gethostname()}:{self.port}/")
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+
+
+def encode(frame, prev):
+    """Binary message for frame given what the client last got (None forces a keyframe)."""
+    if prev is not None and len(prev) == len(frame) and len(frame) <= 0xFFFF:
+        changed = np.flatnonzero((frame != prev).any(axis=1))
+        if len(changed) * 5 < len(frame) * 3:
+            out = np.empty(len(changed), dtype=[("i", "<u2"), ("c", "u1", 3)])
+            out["i"] = changed
+            out["c"] = frame[changed]
+            return b"\x01" + out.tobytes()
+    return b"\x00" + frame.tobytes()
+
+
+def _ws_frame(payload, opcode=0x2):
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return header + payload
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # browsers refuse a WebSocket upgrade over 1.0
+    server_preview = None
+
+    def log_message(self, fmt, *args):
+        pass  # keep the controller's console clean
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/frames" and self.headers.get("Upgrade", "").lower() == "websocket":
+            self._stream(parse_qs(url.query))
+        elif url.path == "/metrics.json" and self.server_preview.metrics:
+            self._send(200, "application/json", json.dumps(self.server_preview.metrics()).encode())
+        elif url.path == "/layout.json":
+            self._send(200, "application/json", self.server_preview.layout)
+        elif url.path in ("/", "/index.html"):
+            with open(PREVIEW_HTML, "rb") as f:
+                self._send(200, "text/html; charset=utf-8", f.read())
+        else:
+            self._send(404, "text/plain", b"not found")
+
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, query):
+        preview = self.server_preview
+        key = self.headers["Sec-WebSocket-Key"]
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+
+        try:
+            fps = min(MAX_FPS, max(1.0, float(query.get("fps", [DEFAULT_FPS])[0])))
+        except ValueError:
+            fps = DEFAULT_FPS
+        period = 1.0 / fps
+        conn = self.connection
+        conn.settimeout(0)  # only used to notice the browser going away
+        preview.clients += 1
+        prev = None
+        last_seq = -1
+        last_key = 0.0
+        try:
+            while True:
+                started = time.time()
+                if _closed(conn):
+                    break
+                seq, frame = preview.frame()
+                if seq != last_seq and len(frame):
+                    if started - last_key > KEYFRAME_EVERY:
+                        prev = None
+                        last_key = started
+                    conn.setblocking(True)
+                    conn.sendall(_ws_frame(encode(frame, prev)))
+                    conn.setblocking(False)
+                    prev = frame
+                    last_seq = seq
+                time.sleep(max(0.0, period - (time.time() - started)))
+        except OSError:
+            pass
+        finally:
+            preview.clients -= 1
+            self.close_connection = True
+
+
+def _closed(conn):
+    # Anything readable from the browser is either a close frame or EOF; we never
+    # need to act on other messages, so treat any data or EOF as "stop".
+    try:
+        conn.recv(1, socket.MSG_PEEK)
+        return True
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
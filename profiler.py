@@ -0,0 +1,146 @@
+"""
+On-demand sampling profiler for the running controller.
+
+Nothing runs until a capture is triggered, so it costs nothing while idle.
+A capture starts one daemon thread that wakes every few milliseconds, grabs
+the current stack of each watched thread via sys._current_frames() and counts
+identical stacks. When the capture ends the counts are written either as
+collapsed stacks (one "thread;outer;...;inner count" line per stack, for
+flamegraph.pl / speedscope / inferno) or as a speedscope JSON file.
+
+    PROFILER = profiler.SamplingProfiler("profiles")
+    PROFILER.watch_current("render")          # from inside each thread of interest
+    PROFILER.trigger(seconds=5)               # e.g. from a SIGUSR1 handler
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+INTERVAL = 0.005  # seconds between samples
+FORMATS = ("collapsed", "speedscope")
+
+
+class SamplingProfiler(object):
+
+    def __init__(self, out_dir="profiles", interval=INTERVAL, fmt="collapsed"):
+        if fmt not in FORMATS:
+            raise ValueError(f"profile format must be one of {FORMATS}")
+        self.out_dir = out_dir
+        self.interval = interval
+        self.fmt = fmt
+        self.threads = {}  # thread ident -> name
+        self.on_start = None
+        self.on_done = None  # called with the written path
+        self._running = threading.Lock()
+
+    def watch(self, thread, name=None):
+        # Forget threads that have exited (e.g. a restarted runner) so the map doesn't grow.
+        live = {t.ident for t in threading.enumerate()}
+        self.threads = {ident: n for ident, n in self.threads.items() if ident in live}
+        self.threads[thread.ident] = name or thread.name
+
+    def watch_current(self, name=None):
+        self.watch(threading.current_thread(), name)
+
+    @property
+    def busy(self):
+        return self._running.locked()
+
+    def trigger(self, seconds=5.0):
+        """Start a capture in the background; ignored if one is already running.
+
+        Safe to call from a signal handler. Returns True if a capture started.
+        """
+        if not self._running.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._capture, args=(seconds,), name="profiler", daemon=True).start()
+        return True
+
+    def _capture(self, seconds):
+        try:
+            self._notify(self.on_start)
+            counts, elapsed = self._sample(seconds)
+            path = self._write(counts, elapsed)
+            print(f"Profile: {sum(counts.values())} samples over {elapsed:.1f}s written to {path}")
+            self._notify(self.on_done, path)
+        finally:
+            self._running.release()
+
+    def _notify(self, callback, *args):
+        # Feedback (e.g. a pad LED on a port that just went away) must never stop a capture.
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as exc:
+            print(f"Profiler callback failed: {exc}")
+
+    def _sample(self, seconds):
+        counts = {}
+        code_names = {}
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            frames = sys._current_frames()
+            for ident, name in list(self.threads.items()):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = code_names.get(code)
+                    if label is None:
+                        label = code_names[code] = (code.co_name, code.co_filename, code.co_firstlineno)
+                    stack.append(label)
+                    frame = frame.f_back
+                key = (name, tuple(reversed(stack)))
+                counts[key] = counts.get(key, 0) + 1
+            del frames
+            time.sleep(self.interval)
+        return counts, time.perf_counter() - started
+
+    def _write(self, counts, elapsed):
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if self.fmt == "speedscope":
+            path = os.path.join(self.out_dir, f"profile-{stamp}.speedscope.json")
+            with open(path, "w") as f:
+                json.dump(_speedscope(counts, elapsed, self.interval), f)
+        else:
+            path = os.path.join(self.out_dir, f"profile-{stamp}.collapsed")
+            with open(path, "w") as f:
+                for (thread, stack), n in sorted(counts.items(), key=lambda kv: -kv[1]):
+                    frames = ";".join(f"{func} ({os.path.basename(file)}:{line})" for func, file, line in stack)
+                    f.write(f"{thread};{frames} {n}\n")
+        return path
+
+
+def _speedscope(counts, elapsed, interval):
+    frames = []
+    frame_index = {}
+    profiles = {}
+    for (thread, stack), n in counts.items():
+        ids = []
+        for func, file, line in stack:
+            key = (func, file, line)
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frames.append({"name": func, "file": file, "line": line})
+            ids.append(frame_index[key])
+        profile = profiles.setdefault(thread, {"samples": [], "weights": []})
+        profile["samples"].append(ids)
+        profile["weights"].append(n * interval)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "exporter": "treeled profiler",
+        "shared": {"frames": frames},
+        "profiles": [
+            {"type": "sampled", "name": thread, "unit": "seconds", "startValue": 0,
+             "endValue": elapsed, "samples": p["samples"], "weights": p["weights"]}
+            for thread, p in profiles.items()
+        ],
+    }
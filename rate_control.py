@@ -0,0 +1,74 @@
+"""
+Adaptive OPC send rate.
+
+The Fadecandy firmware interpolates between the last two frames it received,
+so slow content looks just as smooth at 10 fps as at 50. RateController
+watches how far each frame moved from the previous one and how long the
+render itself took, and picks the rate for the next frame:
+
+  * change: how fast the fastest-moving LED changes (largest channel
+    difference over all LEDs), in levels per second. The maximum rather than
+    a percentile, so sparse looks (sparkle, blips) where only a handful of
+    LEDs flash still get full rate instead of having their flashes smeared
+    by interpolation. The rate is chosen so each frame step stays under
+    max_step levels; a sudden jump (mode switch, fader) snaps straight back
+    to max_fps, and the rate eases down afterwards. `changed` counts the
+    LEDs that moved more than max_step, for metrics.
+  * load: if rendering eats more than max_load of the frame period, the rate
+    is capped so the Pi keeps some headroom.
+
+    RATE = rate_control.RateController(min_fps=10, max_fps=50)
+    fps = RATE.update(frame, render_seconds, time.time())
+"""
+
+import numpy as np
+
+MIN_FPS = 10.0
+MAX_STEP = 3.0   # channel levels (0-255) a busy LED may move by in one frame
+MAX_LOAD = 0.7   # fraction of the frame period rendering may use
+RELEASE = 0.1    # per-frame easing factor when slowing down
+
+
+class RateController(object):
+
+    def __init__(self, min_fps=MIN_FPS, max_fps=50.0, max_step=MAX_STEP, max_load=MAX_LOAD):
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.max_step = max_step
+        self.max_load = max_load
+        self.fps = max_fps
+        self.change = 0.0        # levels per second, smoothed
+        self.changed = 0         # LEDs that moved more than max_step last frame
+        self.render_time = 0.0   # seconds, smoothed
+        self._prev = None
+        self._prev_t = None
+
+    def update(self, frame, render_seconds, now):
+        """Feed the frame just sent; returns the fps to use until the next one."""
+        frame = np.asarray(frame, dtype=np.float32)
+        self.render_time += 0.2 * (render_seconds - self.render_time)
+
+        if self._prev is None or self._prev.shape != frame.shape:
+            wanted = self.max_fps
+        else:
+            dt = max(1e-3, now - self._prev_t)
+            diff = np.abs(frame - self._prev).max(axis=-1)
+            step = float(diff.max()) if diff.size else 0.0
+            self.changed = int(np.count_nonzero(diff > self.max_step))
+            self.change = step / dt
+            wanted = self.change / self.max_step
+        self._prev = frame
+        self._prev_t = now
+
+        cap = self.max_fps
+        if self.render_time > 0:
+            cap = min(cap, self.max_load / self.render_time)
+        wanted = min(cap, max(self.min_fps, wanted))
+
+        # Fast attack, slow release.
+        if wanted >= self.fps:
+            self.fps = wanted
+        else:
+            self.fps += RELEASE * (wanted - self.fps)
+        self.fps = min(cap, max(self.min_fps, self.fps))
+        return self.fps
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+"""
+Split rendering: a render host (laptop) sends timestamped frames over UDP to a
+relay on the Pi, which plays them out to the local fcserver on a steady clock.
+
+Each datagram carries one frame, already mapped to wire bytes per OPC channel:
+
+    "TLF1"  u32 seq  f64 render timestamp (sender clock)  u8 channel count
+    then per channel: u8 channel  u16 length  <length bytes>
+
+The relay estimates the sender->relay clock offset as the minimum of
+(arrival - timestamp) over the last few seconds, i.e. the fastest recent path,
+and plays each frame `delay` seconds after that. Frames that turn up after
+their slot has been played are counted late and dropped. If the buffer runs
+dry the relay holds the newest frame; when it has frames either side of the
+playout time it interpolates between them (or holds, with --no-interpolate).
+Buffer depth, late, lost and held counts are printed every few seconds.
+
+Render host:  ./apc_tree_control.py --remote treeled.local:7891
+On the Pi:    ./remote.py --listen :7891 --opc 127.0.0.1:7890 --delay 0.08
+"""
+
+import argparse
+import bisect
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import opc
+
+MAGIC = b"TLF1"
+HEADER = struct.Struct("<4sIdB")
+PART = struct.Struct("<BH")
+DEFAULT_PORT = 7891
+DEFAULT_DELAY = 0.08
+OFFSET_WINDOW = 5.0   # seconds of arrivals the clock-offset minimum is taken over
+MAX_BUFFERED = 200
+REPORT_EVERY = 5.0
+
+
+def _split_address(address, default_host=""):
+    host, _, port = address.rpartition(":")
+    return (host or default_host, int(port or DEFAULT_PORT))
+
+
+def pack_frame(seq, timestamp, parts):
+    pieces = [HEADER.pack(MAGIC, seq & 0xFFFFFFFF, timestamp, len(parts))]
+    for channel, data in parts:
+        pieces.append(PART.pack(channel, len(data)))
+        pieces.append(data)
+    return b"".join(pieces)
+
+
+def unpack_frame(message):
+    magic, seq, timestamp, count = HEADER.unpack_from(message)
+    if magic != MAGIC:
+        raise ValueError("not a treeled frame")
+    offset = HEADER.size
+    parts = []
+    for _ in range(count):
+        channel, length = PART.unpack_from(message, offset)
+        offset += PART.size
+        parts.append((channel, message[offset:offset + length]))
+        offset += length
+    return seq, timestamp, parts
+
+
+class RemoteSender(object):
+    """Render-host side: fire-and-forget one UDP datagram per frame."""
+
+    def __init__(self, address):
+        self.address = _split_address(address)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.seq = 0
+
+    def send_frame(self, parts, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        self.seq += 1
+        try:
+            self.sock.sendto(pack_frame(self.seq, timestamp, parts), self.address)
+            return True
+        except OSError:
+            return False
+
+
+class JitterRelay(object):
+
+    def __init__(self, client, delay=DEFAULT_DELAY, fps=50, interpolate=True):
+        self.client = client
+        self.delay = delay
+        self.fps = fps
+        self.interpolate = interpolate
+        self.frames = []          # sorted [(timestamp, seq, parts)]
+        self.arrivals = deque()   # (arrived_at, arrival - timestamp) for the offset estimate
+        self.offset = None
+        self.played_until = None  # sender-clock time of the last playout
+        self.first_seq = None
+        self.last_seq = None
+        self.stats = {"received": 0, "late": 0, "lost": 0, "held": 0, "played": 0}
+        self._lock = threading.Lock()
+
+    def receive(self, message, arrived_at=None):
+        arrived_at = time.time() if arrived_at is None else arrived_at
+        try:
+            seq, timestamp, parts = unpack_frame(message)
+        except (ValueError, struct.error):
+            return
+        with self._lock:
+            self.stats["received"] += 1
+            if self.last_seq is None or seq < self.first_seq:
+                self.first_seq = seq
+            self.last_seq = seq if self.last_seq is None else max(self.last_seq, seq)
+            # Anything in the seq range we haven't seen (yet) counts as lost.
+            self.stats["lost"] = max(0, self.last_seq - self.first_seq + 1 - self.stats["received"])
+
+            self.arrivals.append((arrived_at, arrived_at - timestamp))
+            while self.arrivals[0][0] < arrived_at - OFFSET_WINDOW:
+                self.arrivals.popleft()
+            self.offset = min(d for _, d in self.arrivals)
+
+            if self.played_until is not None and timestamp <= self.played_until:
+                self.stats["late"] += 1
+                return
+            bisect.insort(self.frames, (timestamp, seq, parts))
+            del self.frames[:-MAX_BUFFERED]
+
+    def tick(self, now=None):
+        """Play whatever belongs at this moment; returns the parts sent (or None)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.offset is None or not self.frames:
+                return None
+            playout = now - self.offset - self.delay
+            # Drop frames entirely behind us, keeping one at or before playout.
+            i = bisect.bisect_right(self.frames, (playout, float("inf")))
+            if i > 1:
+                del self.frames[:i - 1]
+                i = 1
+            frames = self.frames
+            if i == 0:
+                return None  # nothing due yet
+            before = frames[0]
+            if len(frames) > 1:
+                after = frames[1]
+                parts = before[2]
+                if self.interpolate:
+                    w = (playout - before[0]) / max(1e-6, after[0] - before[0])
+                    parts = _blend(before[2], after[2], w)
+            else:
+                self.stats["held"] += 1  # starved: hold the newest frame
+                parts = before[2]
+            self.played_until = playout
+            self.stats["played"] += 1
+        for channel, data in parts:
+            self.client.put_pixel_bytes(data, channel=channel)
+        return parts
+
+    def depth(self):
+        """(frames buffered ahead of playout, seconds of content buffered)."""
+        with self._lock:
+            if not self.frames or self.played_until is None:
+                return len(self.frames), 0.0
+            return len(self.frames) - 1, max(0.0, self.frames[-1][0] - self.played_until)
+
+    def report(self):
+        frames, seconds = self.depth()
+        s = self.stats
+        return (f"relay: buffer {frames} frames / {seconds * 1e3:.0f} ms, received {s['received']}, "
+                f"late {s['late']}, lost {s['lost']}, held {s['held']}")
+
+    def run(self, sock, stop_event=None):
+        stop_event = stop_event or threading.Event()
+
+        def listen():
+            while not stop_event.is_set():
+                try:
+                    message = sock.recv(65535)
+                except socket.timeout:
+                    continue
+                self.receive(message)
+
+        sock.settimeout(0.5)
+        threading.Thread(target=listen, name="relay-recv", daemon=True).start()
+        period = 1.0 / self.fps
+        next_tick = time.time()
+        next_report = next_tick + REPORT_EVERY
+        while not stop_event.is_set():
+            self.tick()
+            now = time.time()
+            if now >= next_report:
+                next_report = now + REPORT_EVERY
+                print(self.report())
+            next_tick += period
+            if next_tick < now:
+                next_tick = now  # fell behind; don't try to catch up with a burst
+            time.sleep(max(0.0, next_tick - time.time()))
+
+
+def _blend(a_parts, b_parts, w):
+    w = min(1.0, max(0.0, w))
+    if w == 0.0:
+        return a_parts
+    out = []
+    for (channel, a), (_, b) in zip(a_parts, b_parts):
+        if len(a) != len(b):
+            out.append((channel, a))
+            continue
+        av = np.frombuffer(a, dtype=np.uint8).astype(np.float32)
+        bv = np.frombuffer(b, dtype=np.uint8)
+        out.append((channel, (av + (bv - av) * w + 0.5).astype(np.uint8).tobytes()))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jitter-buffered relay from a remote render host to fcserver")
+    parser.add_argument("--listen", default=f":{DEFAULT_PORT}", help="host:port to receive frames on")
+    parser.add_argument("--opc", default="127.0.0.1:7890", help="local fcserver address")
+    parser.add_argument("--delay", type=float, default=DEFAULT_DELAY, help="jitter buffer depth in seconds")
+    parser.add_argument("--fps", type=float, default=50)
+    parser.add_argument("--no-interpolate", action="store_true", help="hold frames instead of blending")
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(_split_address(args.listen))
+    relay = JitterRelay(opc.Client(args.opc), delay=args.delay, fps=args.fps,
+                        interpolate=not args.no_interpolate)
+    print(f"Relaying frames from {args.listen} to {args.opc} with {args.delay * 1e3:.0f} ms buffer")
+    try:
+        relay.run(sock)
+    except KeyboardInterrupt:
+        print(relay.report())
+
+
+if __name__ == "__main__":
+    main()
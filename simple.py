@@ -1,7 +1,9 @@
 import opc
+import topology
 from colours import *
 
-numLEDs = 512
+tree = topology.load()
+numLEDs = tree.led_count
 client = opc.Client('treeled.local:7890')
 pixels = [(0,0,0)] * numLEDs
 colours = load_colours()
@@ -15,4 +17,4 @@ while True:
 
     for i in range(numLEDs):
         pixels[i] = colours[i%len(colours)]
-    client.put_pixels(pixels)
\ No newline at end of file
+    tree.put_pixels(client, pixels)
\ No newline at end of file
@@ -1,43 +1,45 @@
 #!/usr/bin/env python
 
 import opc, time, random
+import topology
 
 client = opc.Client('treeled.local:7890')
 
-numLEDs = 512
+tree = topology.load()
+numLEDs = tree.led_count
 base_pixels = [(0,0,0)] * numLEDs
 pixels = [(0,0,0)] * numLEDs
 
 # initialize pixels to either red, white or green
 colours = [
-    (0,127,0),
-    (127,127,127),
-    (127,0,0),
     (127,0,0),
-    (127,0,0)
+    (127,127,127),
+    (0,127,0),
+    (0,127,0),
+    (0,127,0)
 ]
 
 # fire colour paletter
 colours = [
     (0,0,0),
-    (0,150,0),
-    (70,180,0),
-    (140,180,0)
+    (150,0,0),
+    (180,70,0),
+    (180,140,0)
 ]
 
 # pastel colour palette
 # colours = [
-#     (80, 158, 180),
-#     (180, 80, 158),
-#     (158, 180, 80),
-#     (180, 158, 80),
-#     (80, 180, 158),
 #     (158, 80, 180),
+#     (80, 180, 158),
+#     (180, 158, 80),
+#     (158, 180, 80),
+#     (180, 80, 158),
+#     (80, 158, 180),
 #     (180, 180, 80),
-#     (180, 80, 180),
 #     (80, 180, 180),
+#     (180, 80, 180),
 #     (180, 180, 158),
-#     (158, 180, 180)
+#     (180, 158, 180)
 # ]
 
 
@@ -47,7 +49,7 @@ for i in range(numLEDs):
     pixels[i] = base_pixels[i]
 
 while True:
-    client.put_pixels(pixels)
+    tree.put_pixels(client, pixels)
     # randomly glow brighter every few seconds
     for i in range(numLEDs):
         if random.randint(0,100) > 75:
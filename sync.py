@@ -0,0 +1,197 @@
+"""
+Keep several trees (each with its own Pi and controller) on one timeline.
+
+One controller runs as master (--sync-master): it owns the effect clock and
+the look, and broadcasts both over UDP a few times a second and straight
+away whenever the look changes. The others run as followers (--sync-follow):
+they take the master's STATE and render at the master's effect time, so
+swirls, chases, spectrum and palette washes line up across trees.
+
+Each datagram is "TLS1" followed by JSON:
+
+    {"seq": n, "t": master effect time at send, "rev": state revision, "state": {...}}
+
+A follower estimates the master's clock as local time minus the smallest
+(arrival - t) seen over the last OFFSET_WINDOW seconds (the fastest recent
+path, as remote.py does). It slews its own effect clock towards that
+estimate by at most MAX_SLEW seconds per second, and only steps it when it
+is more than STEP_THRESHOLD out (on joining, or after the master restarts).
+Small corrections therefore never make effects jump or run backwards.
+Datagrams that aren't a well-formed sync message are counted and dropped,
+so a stray packet on the port can't stop a follower.
+
+    SYNC = sync.SyncMaster("<broadcast>:7894", snapshot_state).start()
+    t = SYNC.clock(time.time())
+"""
+
+import json
+import math
+import socket
+import threading
+import time
+from collections import deque
+
+MAGIC = b"TLS1"
+DEFAULT_PORT = 7894
+SEND_INTERVAL = 0.2
+OFFSET_WINDOW = 10.0
+MAX_SLEW = 0.01        # seconds of correction per second (1%)
+STEP_THRESHOLD = 0.25  # seconds; further out than this the follower clock jumps
+LOST_AFTER = 2.0       # seconds without a packet before a follower reports the master lost
+REPORT_EVERY = 30.0
+
+
+def _split_address(address, default_host=""):
+    host, _, port = address.rpartition(":")
+    return (host or default_host, int(port or DEFAULT_PORT))
+
+
+def parse_message(data):
+    """The message in a sync datagram; ValueError unless it has a numeric "t" and a dict state."""
+    if not data.startswith(MAGIC):
+        raise ValueError("not a sync packet")
+    message = json.loads(data[len(MAGIC):])  # JSONDecodeError is a ValueError
+    if not isinstance(message, dict):
+        raise ValueError("message is not an object")
+    t = message.get("t")
+    if isinstance(t, bool) or not isinstance(t, (int, float)) or not math.isfinite(t):
+        raise ValueError(f"bad master time {t!r}")
+    if not isinstance(message.get("state", {}), dict):
+        raise ValueError("state is not an object")
+    return message
+
+
+class SyncMaster(object):
+
+    def __init__(self, address, snapshot, interval=SEND_INTERVAL):
+        self.address = _split_address(address, "<broadcast>")
+        self.snapshot = snapshot
+        self.interval = interval
+        self.t0 = time.time()
+        self.seq = 0
+        self.rev = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self._changed = threading.Event()
+
+    def clock(self, now):
+        return now - self.t0
+
+    def notify(self):
+        """Call after STATE changes; followers get it on the next packet, sent right away."""
+        self.rev += 1
+        self._changed.set()
+
+    def send(self):
+        self.seq += 1
+        message = {"seq": self.seq, "t": self.clock(time.time()), "rev": self.rev, "state": self.snapshot()}
+        try:
+            self.sock.sendto(MAGIC + json.dumps(message).encode(), self.address)
+        except OSError as exc:
+            print(f"Sync send failed: {exc}")
+
+    def start(self):
+        def loop():
+            while True:
+                self._changed.wait(self.interval)
+                self._changed.clear()
+                self.send()
+
+        threading.Thread(target=loop, name="sync-master", daemon=True).start()
+        print(f"Sync master broadcasting to {self.address[0]}:{self.address[1]}")
+        return self
+
+
+class SyncFollower(object):
+
+    def __init__(self, listen, apply_state):
+        self.listen = _split_address(listen)
+        self.apply_state = apply_state
+        self.arrivals = deque()  # (arrived_at, arrival - master t)
+        self.target = None       # local time - master time, from the fastest recent packet
+        self.offset = None       # what clock() currently uses, slewed towards target
+        self.last_clock = None
+        self.last_packet = 0.0
+        self.rev = None
+        self.stats = {"received": 0, "steps": 0, "bad": 0}
+        self._lock = threading.Lock()
+
+    def receive(self, data, arrived_at=None):
+        """Apply one datagram; raises ValueError if it isn't a sync message."""
+        arrived_at = time.time() if arrived_at is None else arrived_at
+        message = parse_message(data)
+        with self._lock:
+            self.stats["received"] += 1
+            self.last_packet = arrived_at
+            self.arrivals.append((arrived_at, arrived_at - message["t"]))
+            while self.arrivals[0][0] < arrived_at - OFFSET_WINDOW:
+                self.arrivals.popleft()
+            self.target = min(d for _, d in self.arrivals)
+            if self.offset is not None and abs(self.target - self.offset) > STEP_THRESHOLD:
+                # Master restarted (or we were far out): forget the old path estimates.
+                self.arrivals.clear()
+                self.arrivals.append((arrived_at, arrived_at - message["t"]))
+                self.target = self.arrivals[0][1]
+                self.rev = None
+        if message.get("rev") != self.rev:
+            self.rev = message.get("rev")
+            self.apply_state(message.get("state"))
+
+    def clock(self, now):
+        """Master effect time for local time now, or None until the first packet."""
+        with self._lock:
+            if self.target is None:
+                return None
+            if self.offset is None or abs(self.target - self.offset) > STEP_THRESHOLD:
+                if self.offset is not None:
+                    self.stats["steps"] += 1
+                self.offset = self.target
+            else:
+                dt = 0.0 if self.last_clock is None else max(0.0, now - self.last_clock)
+                limit = MAX_SLEW * dt
+                self.offset += min(limit, max(-limit, self.target - self.offset))
+            self.last_clock = now
+            return now - self.offset
+
+    def lost(self, now=None):
+        now = time.time() if now is None else now
+        return now - self.last_packet > LOST_AFTER
+
+    def report(self):
+        with self._lock:
+            error = 0.0 if self.target is None or self.offset is None else self.offset - self.target
+            return (f"sync: {self.stats['received']} packets ({self.stats['bad']} bad), "
+                    f"clock error {error * 1e3:+.1f} ms, "
+                    f"{self.stats['steps']} steps{', master lost' if self.lost() else ''}")
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(self.listen)
+        sock.settimeout(LOST_AFTER)
+
+        def loop():
+            next_report = time.time() + REPORT_EVERY
+            was_lost = False
+            while True:
+                try:
+                    data, addr = sock.recvfrom(65535)
+                    self.receive(data)
+                except socket.timeout:
+                    pass
+                except ValueError as exc:
+                    self.stats["bad"] += 1
+                    print(f"Bad sync packet from {addr[0]}: {exc}")
+                except Exception as exc:
+                    # Applying the state failed; keep following the clock.
+                    self.stats["bad"] += 1
+                    print(f"Sync state from {addr[0]} failed: {exc}")
+                now = time.time()
+                if now >= next_report or self.lost(now) != was_lost:
+                    next_report = now + REPORT_EVERY
+                    was_lost = self.lost(now)
+                    print(self.report())
+
+        threading.Thread(target=loop, name="sync-follower", daemon=True).start()
+        print(f"Sync follower listening on :{self.listen[1]}")
+        return self
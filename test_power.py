@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+import power
+
+STRIPS = [{"logical_start": 64 * i, "logical_count": 64, "length": 64} for i in range(8)]
+
+
+def test_estimate_follows_fcserver_gamma():
+    limiter = power.PowerLimiter(STRIPS, 20.0, gamma=2.5)
+    amps = limiter.estimate(np.full((512, 3), 200.0)).sum()
+    assert amps == pytest.approx(512 * 3 * 0.020 * (200 / 255) ** 2.5 + 0.512)
+    assert amps == pytest.approx(17.3, abs=0.1)
+    out = limiter.apply(np.full((512, 3), 200.0))
+    assert np.all(out == 200.0)  # within budget: untouched
+
+
+def test_full_white_is_scaled_to_the_budget():
+    limiter = power.PowerLimiter(STRIPS, 20.0, gamma=2.5)
+    out = limiter.apply(np.full((512, 3), 255.0))
+    scale = (20.0 - 0.512) / (512 * 3 * 0.020)
+    assert out[0, 0] == pytest.approx(255 * scale ** (1 / 2.5))
+    assert out[0, 0] == pytest.approx(212.6, abs=0.1)
+    assert 19.8 < limiter.estimate(out).sum() <= 20.0
@@ -0,0 +1,35 @@
+import numpy as np
+
+import color_correction
+import topology
+
+DESCRIPTION = {
+    "color_order": "GRB",
+    "controllers": [{"opc_channel": 0, "strips": [{"output": 0, "length": 64}, {"output": 1, "length": 64}]}],
+    "power": {"budget_amps": 20.0, "strip_amps": 3.5},
+}
+
+
+def test_short_frame_is_padded_with_black():
+    tree = topology.Topology(DESCRIPTION)
+    [(channel, data)] = tree.encode(np.full((100, 3), 40.0))
+    assert channel == 0
+    assert len(data) == 128 * 3
+    assert data[:100 * 3] == bytes([40]) * 300
+    assert data[100 * 3:] == bytes(28 * 3)
+
+
+def test_long_and_list_frames():
+    tree = topology.Topology(DESCRIPTION)
+    assert tree.encode(np.full((200, 3), 40.0)) == tree.encode(np.full((128, 3), 40.0))
+    assert tree.encode([(40, 40, 40)] * 10)[0][1][:30] == bytes([40]) * 30
+
+
+def test_short_frame_with_color_correction():
+    tree = topology.Topology(DESCRIPTION)
+    gain = np.ones((128, 3))
+    gain[:, 1] = 0.5
+    tree.correction = color_correction.ColorCorrection(gain)
+    [(_, data)] = tree.encode(np.full((100, 3), 200.0))
+    assert data[:3] == bytes([100, 200, 200])  # GRB on the wire
+    assert data[-3:] == bytes(3)
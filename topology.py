@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+"""
+LED topology: which strips exist, how long they are, which Fadecandy output
+they hang off and which OPC channel feeds them.
+
+topology.json is the single description everything reads:
+
+    {
+        "color_order": "GRB",
+        "controllers": [
+            {
+                "type": "fadecandy",
+                "serial": null,          # or the board serial when there are several
+                "opc_channel": 0,
+                "strips": [
+                    {"output": 0, "length": 64, "reversed": false, "dead": [3]},
+                    ...
+                ]
+            }
+        ]
+    }
+
+An optional "power" section sets the supply budget (see power.py), and an
+optional "color_correction" entry names a per-LED gain table measured with
+color_correction.py.
+
+Effects render one logical frame covering every live LED (strips in file
+order, dead LEDs skipped). put_pixels splits it per OPC channel and sends each
+slice through a compiled output_map.OutputMap, so the wire carries exactly the
+physical LEDs with no padding. Run this file to regenerate the fcserver
+config.json from the same description:
+
+    $ ./topology.py                       # topology.json -> config.json
+    $ ./topology.py other.json fc.json
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+import color_correction
+import output_map
+import power
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TOPOLOGY_JSON = os.path.join(HERE, "topology.json")
+FCSERVER_JSON = os.path.join(HERE, "config.json")
+FADECANDY_OUTPUT_PIXELS = 64  # each Fadecandy output addresses 64 pixels
+
+
+class Topology(object):
+
+    def __init__(self, description):
+        self.description = description
+        self.color_order = description.get("color_order", output_map.DEFAULT_COLOR_ORDER)
+        self.controllers = description["controllers"]
+
+        # Walk the strips once, assigning each a slot in its OPC channel's stream
+        # and a range of logical pixels.
+        self.strips = []
+        opc_offsets = {}
+        logical = 0
+        for ci, controller in enumerate(self.controllers):
+            channel = controller.get("opc_channel", 0)
+            for strip in controller["strips"]:
+                length = strip["length"]
+                if length > FADECANDY_OUTPUT_PIXELS and controller.get("type", "fadecandy") == "fadecandy":
+                    raise ValueError(f"strip on output {strip['output']} is longer than {FADECANDY_OUTPUT_PIXELS}")
+                live = length - len(set(strip.get("dead", ())))
+                self.strips.append({
+                    "controller": ci,
+                    "output": strip["output"],
+                    "length": length,
+                    "reversed": strip.get("reversed", False),
+                    "dead": sorted(set(strip.get("dead", ()))),
+                    "opc_channel": channel,
+                    "opc_offset": opc_offsets.get(channel, 0),
+                    "logical_start": logical,
+                    "logical_count": live,
+                })
+                opc_offsets[channel] = opc_offsets.get(channel, 0) + length
+                logical += live
+        self.led_count = logical
+        self.physical_count = sum(s["length"] for s in self.strips)
+        self.channels = self._compile_channels()
+        self.power = power.PowerLimiter.from_description(self.strips, description.get("power"))
+        self.correction = None
+        if description.get("color_correction"):
+            path = os.path.join(HERE, description["color_correction"])
+            self.correction = color_correction.ColorCorrection.load(path, self.led_count)
+
+    def _compile_channels(self):
+        # One (channel, logical_start, logical_stop, OutputMap) per OPC channel.
+        # Strips sharing a channel must be contiguous in logical order.
+        channels = []
+        by_channel = {}
+        for strip in self.strips:
+            by_channel.setdefault(strip["opc_channel"], []).append(strip)
+        for channel, strips in sorted(by_channel.items()):
+            start = strips[0]["logical_start"]
+            stop = strips[-1]["logical_start"] + strips[-1]["logical_count"]
+            if stop - start != sum(s["logical_count"] for s in strips):
+                raise ValueError(f"strips on OPC channel {channel} are not contiguous in the topology")
+            dead = [s["opc_offset"] + d for s in strips for d in s["dead"]]
+            out = output_map.OutputMap(
+                sum(s["length"] for s in strips),
+                color_order=self.color_order,
+                strips=[(s["length"], s["reversed"]) for s in strips],
+                dead=dead,
+            )
+            channels.append((channel, start, stop, out))
+        return channels
+
+    def put_pixels(self, client, pixels, tap=None):
+        """Send a logical frame (N x 3 array or list of RGB tuples) to every OPC channel.
+
+        tap, if given, is called with (channel, data) for each channel's wire bytes
+        right after they are sent (the same bytes object, no copy).
+        Return True if every channel was sent, like opc.Client.put_pixels.
+        """
+        ok = True
+        for channel, data in self.encode(pixels):
+            ok = client.put_pixel_bytes(data, channel=channel) and ok
+            if tap is not None:
+                tap(channel, data)
+        return ok
+
+    def encode(self, pixels, smooth=True):
+        """Map a logical frame to [(channel, wire bytes), ...] without sending it.
+
+        Frames are colour corrected and then go through the power limiter when
+        topology.json has those sections; smooth=False limits without easing
+        (see power.py).
+        """
+        frame = self._fit(np.asarray(pixels))
+        if self.correction is not None:
+            frame = self.correction.apply(frame)
+        if self.power is not None:
+            frame = self.power.apply(frame, smooth)
+        return [(channel, out.apply(frame[start:stop])) for channel, start, stop, out in self.channels]
+
+    def _fit(self, frame):
+        # Pad short frames with black and drop extra pixels, as the output maps
+        # would, so the limiter and colour correction always see (led_count, 3).
+        if frame.shape == (self.led_count, 3):
+            return frame
+        flat = frame.reshape(-1)[:self.led_count * 3]
+        fitted = np.zeros(self.led_count * 3, dtype=flat.dtype if flat.size else float)
+        fitted[:len(flat)] = flat
+        return fitted.reshape(self.led_count, 3)
+
+    def physical_positions(self, xyz):
+        """Position of every physical LED in wire order (channels in order), None for dead LEDs.
+
+        xyz is the (led_count, 3) logical position array, e.g. geometry.load_xyz(n=led_count).
+        """
+        positions = []
+        for channel, start, stop, out in self.channels:
+            for src in out.source:
+                positions.append(None if src < 0 else [round(float(v), 4) for v in xyz[start + src]])
+        return positions
+
+    def fcserver_devices(self):
+        """The "devices" list for an fcserver config.json."""
+        devices = []
+        for ci, controller in enumerate(self.controllers):
+            device = {"type": controller.get("type", "fadecandy")}
+            if controller.get("serial"):
+                device["serial"] = controller["serial"]
+            entries = []
+            for strip in self.strips:
+                if strip["controller"] != ci:
+                    continue
+                entry = [strip["opc_channel"], strip["opc_offset"],
+                         strip["output"] * FADECANDY_OUTPUT_PIXELS, strip["length"]]
+                prev = entries[-1] if entries else None
+                # Merge runs that are contiguous on both sides, e.g. full 64-LED strips.
+                if (prev and prev[0] == entry[0] and prev[1] + prev[3] == entry[1]
+                        and prev[2] + prev[3] == entry[2]):
+                    prev[3] += entry[3]
+                else:
+                    entries.append(entry)
+            device["map"] = entries
+            devices.append(device)
+        return devices
+
+    def fcserver_config(self, base=None):
+        """A full fcserver config, keeping listen/color/etc. from base if given."""
+        config = dict(base or {"listen": [None, 7890], "verbose": True})
+        config["devices"] = self.fcserver_devices()
+        return config
+
+
+def load(path=TOPOLOGY_JSON):
+    with open(path) as f:
+        return Topology(json.load(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate an fcserver config.json from topology.json")
+    parser.add_argument("topology", nargs="?", default=TOPOLOGY_JSON)
+    parser.add_argument("config", nargs="?", default=FCSERVER_JSON)
+    args = parser.parse_args()
+
+    topology = load(args.topology)
+    base = None
+    if os.path.exists(args.config):
+        with open(args.config) as f:
+            base = json.load(f)
+    with open(args.config, "w") as f:
+        json.dump(topology.fcserver_config(base), f, indent=4)
+        f.write("\n")
+    print(f"Wrote {args.config}: {topology.led_count} LEDs on {len(topology.strips)} strips, "
+          f"{len(topology.controllers)} controller(s)")
+
+
+if __name__ == "__main__":
+    main()
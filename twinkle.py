@@ -0,0 +1,86 @@
+"""
+Per-LED twinkle/sparkle state kept in numpy arrays.
+
+Every LED runs its own little lifecycle: it waits dark for a random time,
+then plays one envelope (fade in/out for twinkle, flash-and-decay for
+sparkle) at its own rate and peak, then goes back to waiting. State lives in
+a handful of arrays and each frame is a few vectorized ops plus RNG draws
+only for the LEDs whose cycle just finished, so cost per frame stays flat.
+"""
+
+import numpy as np
+
+MAX_DT = 0.1  # don't let a stalled frame jump every LED through its cycle
+
+
+def smooth_envelope(phase):
+    # Soft fade in and out; phase is 0..1 through the cycle.
+    return np.sin(np.pi * phase) ** 2
+
+
+def flash_envelope(phase):
+    # Instant on, quick decay.
+    return (1.0 - phase) ** 3
+
+
+class TwinkleField(object):
+
+    def __init__(self, n, envelope=smooth_envelope, peak_range=(0.3, 1.0), rate_spread=0.5, seed=None):
+        """n LEDs, each twinkling independently.
+
+        peak_range: per-cycle peak brightness is drawn uniformly from this range.
+        rate_spread: per-cycle rate is the requested rate times 1 +/- rate_spread.
+        """
+        self.n = n
+        self.envelope = envelope
+        self.peak_range = peak_range
+        self.rate_spread = rate_spread
+        self.rng = np.random.default_rng(seed)
+        # phase < 0 means waiting dark; 0..1 means mid-envelope. -inf means
+        # idle with no gap drawn yet (at start, or while density is zero).
+        self.phase = np.full(n, -np.inf)
+        self.rate = np.ones(n)
+        self.peak = np.ones(n)
+        self.level = np.zeros(n)
+        self._last_t = None
+
+    def advance(self, t, density, rate):
+        """Step every LED to time t and return the per-LED level array (0..1).
+
+        density: rough fraction of LEDs lit at once (0..1).
+        rate: envelope cycles per second.
+        """
+        dt = 0.0 if self._last_t is None else min(MAX_DT, max(0.0, t - self._last_t))
+        self._last_t = t
+        density = min(1.0, max(0.0, density))
+
+        if density > 0.0:
+            idle = np.flatnonzero(np.isneginf(self.phase))
+            if len(idle):
+                self.phase[idle] = -self._gap(len(idle), density)
+        else:
+            # Nothing new lights; LEDs mid-envelope finish their cycle.
+            self.phase[self.phase < 0.0] = -np.inf
+        self.phase += self.rate * dt
+        done = np.flatnonzero(self.phase >= 1.0)
+        if len(done):
+            self._restart(done, density, rate)
+
+        lit = self.phase >= 0.0
+        self.level.fill(0.0)
+        self.level[lit] = self.peak[lit] * self.envelope(self.phase[lit])
+        return self.level
+
+    def _restart(self, idx, density, rate):
+        k = len(idx)
+        rng = self.rng
+        lo, hi = self.peak_range
+        self.rate[idx] = rate * (1.0 + self.rate_spread * (2.0 * rng.random(k) - 1.0))
+        self.peak[idx] = lo + (hi - lo) * rng.random(k)
+        self.phase[idx] = -self._gap(k, density) if density > 0.0 else -np.inf
+
+    def _gap(self, k, density):
+        # Exponential dark gap, measured in cycles, sized so the lit duty
+        # cycle averages out to density. Being memoryless, the same draw
+        # also spreads idle LEDs out when they (re)start.
+        return self.rng.exponential((1.0 - density) / density, k)
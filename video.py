@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+"""
+Play video files onto the tree.
+
+Each LED's calibrated position (geometry.load_xyz) is projected onto the
+video frame once: "front" uses x/height, "side" y/height, and "wrap" unrolls
+the angle around the trunk across the frame width. The projection is fitted
+to the frame. BilinearSampler turns those points into one (N, 4) index array
+and matching weights, so colouring the tree from a decoded frame is a single
+gather plus a weighted sum over 4 neighbours. The full frame is never
+resized or converted.
+
+A background thread decodes with OpenCV (optional: pip install
+opencv-python-headless) and samples each frame there, so the queue only holds
+tiny (N, 3) arrays. The render loop asks for the frame at its own time
+(sample(t)), and decoding stays locked to that clock:
+
+  * frames already behind the clock, or closer to the last queued frame than
+    the render loop's own step, are grab()bed but not decoded;
+  * if decoding falls more than SEEK_AFTER behind it seeks instead;
+  * queued frames the clock has passed are dropped;
+  * the queue is bounded, so decoding never runs far ahead.
+
+    player = video.VideoPlayer("clip.mp4", LED_XYZ).start()
+    colors = player.sample(t)    # (N, 3) float RGB, or None before the first frame
+
+    $ ./video.py clip.mp4 --view wrap
+"""
+
+import argparse
+import math
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import geometry
+import opc
+import topology
+
+try:
+    import cv2
+except ImportError:  # only needed to decode video
+    cv2 = None
+
+VIEWS = ("front", "side", "wrap")
+QUEUE_FRAMES = 6
+SEEK_AFTER = 1.0   # seconds behind the clock before seeking rather than grabbing
+STALE_AHEAD = 1.0  # queued frames this far ahead of the clock are left over from a seek/loop
+MARGIN = 0.02      # fraction of the frame left around the projected tree
+
+
+def project(xyz, view="front", margin=MARGIN):
+    """Map (N, 3) LED positions to (N, 2) normalized (u, v) frame coordinates, v down."""
+    xyz = np.asarray(xyz, dtype=float)
+    if view == "wrap":
+        u = (np.arctan2(xyz[:, 1], xyz[:, 0]) / math.tau) % 1.0
+    else:
+        u = xyz[:, 0] if view == "front" else xyz[:, 1]
+        u = _fit(u, margin)
+    v = 1.0 - _fit(xyz[:, 2], margin)
+    return np.stack([u, v], axis=1)
+
+
+def _fit(values, margin):
+    lo, hi = values.min(), values.max()
+    if hi - lo <= 0:
+        return np.full(len(values), 0.5)
+    return margin + (1.0 - 2 * margin) * (values - lo) / (hi - lo)
+
+
+class BilinearSampler(object):
+    """Precomputed bilinear taps of (N, 2) normalized points in a (height, width) frame."""
+
+    def __init__(self, uv, width, height):
+        x = np.clip(uv[:, 0], 0.0, 1.0) * (width - 1)
+        y = np.clip(uv[:, 1], 0.0, 1.0) * (height - 1)
+        x0 = np.floor(x).astype(np.intp)
+        y0 = np.floor(y).astype(np.intp)
+        x1 = np.minimum(x0 + 1, width - 1)
+        y1 = np.minimum(y0 + 1, height - 1)
+        fx = (x - x0)[:, None]
+        fy = (y - y0)[:, None]
+        self.index = np.stack([y0 * width + x0, y0 * width + x1, y1 * width + x0, y1 * width + x1], axis=1)
+        self.weights = np.hstack([(1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy]).astype(np.float32)
+        self.shape = (height, width)
+
+    def sample(self, frame):
+        """(N, channels) float colours from an (height, width, channels) frame."""
+        flat = frame.reshape(-1, frame.shape[-1])
+        return np.einsum("nk,nkc->nc", self.weights, flat[self.index], dtype=np.float32)
+
+
+class VideoPlayer(object):
+
+    def __init__(self, path, xyz, view="front", loop=True, speed=1.0, queue_frames=QUEUE_FRAMES):
+        if cv2 is None:
+            raise RuntimeError("video playback needs OpenCV (pip install opencv-python-headless)")
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"could not open video {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        frames = self.cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        self.duration = frames / self.fps if frames > 0 else None
+        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.sampler = BilinearSampler(project(xyz, view), width, height)
+        self.loop = loop
+        self.speed = speed
+        self.queue_frames = queue_frames
+        self.queue = deque()     # (video time, (N, 3) RGB)
+        self.current = None
+        self.wanted = 0.0        # video time the render loop last asked for
+        self.step = 0.0          # video time between its requests, smoothed
+        self.stats = {"decoded": 0, "skipped": 0, "dropped": 0, "seeks": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._decode, name="video", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def video_time(self, t):
+        t *= self.speed
+        if self.loop and self.duration:
+            t %= self.duration
+        return t
+
+    def sample(self, t):
+        """RGB colours per LED for render time t (seconds), or None before the first frame."""
+        target = self.video_time(t)
+        with self._lock:
+            if 0 < target - self.wanted < SEEK_AFTER:
+                self.step += 0.1 * (target - self.wanted - self.step)
+            self.wanted = target
+            while self.queue and self.queue[0][0] > target + STALE_AHEAD:
+                self.queue.popleft()  # left over from before a loop or seek
+                self.stats["dropped"] += 1
+            shown = 0
+            while self.queue and self.queue[0][0] <= target:
+                self.current = self.queue.popleft()
+                shown += 1
+            self.stats["dropped"] += max(0, shown - 1)  # decoded but overtaken before display
+        return None if self.current is None else self.current[1]
+
+    def _decode(self):
+        period = 1.0 / self.fps
+        cap = self.cap
+        last = None  # video time of the last frame decoded
+        while not self._stop.is_set():
+            with self._lock:
+                target = self.wanted
+                step = self.step
+                queued = len(self.queue)
+            pos = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if pos < target - SEEK_AFTER or pos > target + STALE_AHEAD + self.queue_frames * period:
+                cap.set(cv2.CAP_PROP_POS_MSEC, target * 1000.0)
+                self.stats["seeks"] += 1
+                continue
+            if queued >= self.queue_frames:
+                time.sleep(period / 2)
+                continue
+            if not cap.grab():
+                if self.loop:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                break
+            pos = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0  # timestamp of the frame just grabbed
+            if pos < target - period or (last is not None and 0 <= pos - last < 0.9 * step):
+                self.stats["skipped"] += 1  # late, or would never be shown: don't pay for decoding it
+                continue
+            last = pos
+            ok, image = cap.retrieve()
+            if not ok:
+                continue
+            colors = self.sampler.sample(image)[:, ::-1]  # OpenCV frames are BGR
+            self.stats["decoded"] += 1
+            with self._lock:
+                self.queue.append((pos, colors))
+
+    def report(self):
+        s = self.stats
+        return (f"video: decoded {s['decoded']}, skipped {s['skipped']}, dropped {s['dropped']}, "
+                f"seeks {s['seeks']}, queued {len(self.queue)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a video file onto the tree")
+    parser.add_argument("path")
+    parser.add_argument("--view", choices=VIEWS, default="front", help="how LED positions map onto the frame")
+    parser.add_argument("--opc", default="treeled.local:7890")
+    parser.add_argument("--fps", type=float, default=50)
+    parser.add_argument("--brightness", type=float, default=1.0)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--once", action="store_true", help="stop at the end instead of looping")
+    args = parser.parse_args()
+
+    tree = topology.load()
+    client = opc.Client(args.opc)
+    player = VideoPlayer(args.path, geometry.load_xyz(n=tree.led_count), view=args.view,
+                         loop=not args.once, speed=args.speed).start()
+    print(f"Playing {args.path} ({player.fps:g} fps) to {args.opc} for {tree.led_count} LEDs")
+    period = 1.0 / args.fps
+    t0 = time.time()
+    next_report = t0 + 10.0
+    try:
+        while True:
+            now = time.time()
+            colors = player.sample(now - t0)
+            if colors is not None:
+                tree.put_pixels(client, colors * args.brightness)
+            if args.once and player.duration and now - t0 > player.duration / args.speed:
+                break
+            if now >= next_report:
+                next_report = now + 10.0
+                print(player.report())
+            time.sleep(max(0.0, period - (time.time() - now)))
+    except KeyboardInterrupt:
+        pass
+    print(player.report())
+
+
+if __name__ == "__main__":
+    main()